@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "IGO.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 환자 위치 좌표 스트리밍 (users/stream/...) 은 SSE / WebSocket 으로 직접 처리하고 나머지는 Django 로
+from users.streaming import stream_application  # noqa: E402
+
+application = stream_application(django_application)
@@ -56,6 +56,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # REQUEST_PROFILING["ENABLED"] 가 꺼져 있으면 빠진다
+    "users.middleware.ProfilingMiddleware",
+    "users.middleware.MetricsMiddleware",
+    # 200 bytes 이상 응답은 Accept-Encoding 에 gzip 이 있으면 압축 (환자 목록 등)
+    "django.middleware.gzip.GZipMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -63,7 +68,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # whitenoise.middleware.WhiteNoiseMiddleware 의 async 지원 버전
+    "users.middleware.StaticFilesMiddleware",
 ]
 
 ROOT_URLCONF = "IGO.urls"
@@ -117,8 +123,191 @@ AUTH_PASSWORD_VALIDATORS = [
 # 프로젝트 인증 방식으로 토큰 방식을 사용한다
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ]
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    # Accept / Content-Type 으로 JSON (orjson) 또는 MessagePack 선택
+    'DEFAULT_RENDERER_CLASSES': [
+        'users.renderers.FastJSONRenderer',
+        'users.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'users.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# 토큰 -> 유저 조회 캐시 (users.authentication.CachedTokenAuthentication)
+TOKEN_AUTH_CACHE = {
+    # 최대 토큰 수 (넘으면 가장 오래 안 쓴 토큰부터 지움)
+    "MAXSIZE": 10000,
+    # 유지 시간 (초), 다른 프로세스에서 지운 토큰 / 비활성화한 유저는 이 시간 안에 반영된다
+    "TTL": 300,
+}
+
+# 기지국 거리 값을 디버그용으로 환자 테이블(real_distance1~3)에도 저장할지 여부
+# 삼변측량에 필요한 거리 값은 메모리(users.ranging)에서 모으므로 평소에는 꺼둔다
+RANGING_STORE_DEBUG_DISTANCES = False
+
+# 기지국 거리 값을 측정 시각 기준으로 묶는 설정 (users.ranging.RangingAccumulator)
+# 거리 값은 프로세스 메모리에 모으므로 웹 서버는 worker 1개로 실행한다 (Procfile, README 의 운영 참고)
+RANGING_EPOCH = {
+    # 같은 위치 계산에 쓰는 거리 값들의 측정 시각 차이 최대값 (초), 더 오래된 거리 값은 버린다
+    "WINDOW": 1.0,
+    # 기지국 순번이 이만큼보다 적게 줄어들면 늦게 도착한 거리 값으로 보고 버리고,
+    # 더 많이 줄어들면 기지국이 다시 시작된 것 (또는 순번이 한 바퀴 돈 것) 으로 보고 받는다
+    "REORDER_LIMIT": 1000,
+}
+
+# FCM 푸시 메시지 백그라운드 발송기 (users.fcm.FCMDispatcher)
+# 네트워크 없이 실행할 때는 TRANSPORT 를 "users.fcm.StubTransport" 로 바꾼다
+FCM_DISPATCHER = {
+    "TRANSPORT": "users.fcm.FirebaseTransport",
+    # 큐를 비우는 워커 스레드 수
+    "WORKERS": 2,
+    # 한 번에 묶어서 보낼 최대 메시지 수 (FCM 제한 500)
+    "BATCH_SIZE": 500,
+    # 실패한 메시지의 최대 재시도 횟수, 첫 재시도까지의 대기 시간 (초, 재시도마다 2배)
+    "MAX_RETRIES": 3,
+    "RETRY_BACKOFF": 0.5,
+    # 묶어서 보내기 위해 다음 메시지를 기다리는 시간 (초)
+    "LINGER": 0.01,
+}
+
+# 환자 호출 합치기 (users.call_debounce), 호출을 연 뒤 WINDOW 초 안에 같은 환자가 다시 호출하면
+# FCM push 를 다시 보내지 않고 진행 중인 호출에 합친다 (위치 좌표 갱신, 호출 수 + 1), 0 이면 합치지 않음
+CALL_DEBOUNCE = {
+    "WINDOW": 30,
+    # 진행 중인 호출을 기억할 최대 환자 수
+    "MAX_PATIENTS": 100000,
+}
+
+# async 호출 API (call/async/...) 가 FCM 발송 결과를 기다리는 최대 시간 (초)
+# 넘으면 결과를 기다리지 않고 응답하고 (pending), 발송은 백그라운드 발송기가 계속한다
+CALL_FCM_TIMEOUT = 5.0
+# async view 의 ORM 코드를 실행하는 스레드 수 (users.async_db), 동시에 열리는 DB 연결 수도 이만큼으로 제한된다
+ASYNC_DB_WORKERS = 8
+
+# 환자 단말기 (아두이노) 부저 / LED / 진동 요청 (users.terminal)
+TERMINAL_ACTUATION = {
+    # 연결, 응답 timeout (초)
+    "CONNECT_TIMEOUT": 0.5,
+    "READ_TIMEOUT": 1.0,
+    # 요청을 보내는 워커 스레드 수 (동시에 동작시킬 수 있는 단말기 수)
+    "WORKERS": 16,
+    # keep-alive 연결을 유지할 최대 단말기 수
+    "MAX_TERMINALS": 1000,
+    # 환자 여러 명 호출 결과를 보관하는 최대 호출 수, 시간 (초)
+    "MAX_TASKS": 10000,
+    "RESULT_TTL": 300,
+    # 동작 이름 -> 단말기 URL 경로
+    "ACTIONS": {
+        "buzzer": "/gpio1/1",
+        "led": "/gpio2/1",
+        "vibration": "/gpio3/1",
+    },
+    # 의료진이 환자 1명을 호출할 때의 동작
+    "DEFAULT_ACTION": "buzzer",
+    # 단말기가 있는 병원 내부망, 환자가 보낸 ip 주소가 이 밖이면 (서버 자신, 클라우드 metadata 등) 요청하지 않음
+    "ALLOWED_NETWORKS": os.environ.get("terminal_networks", "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16").split(","),
+}
+
+# 환자 위치 좌표 스트리밍 (SSE / WebSocket) 연결 유지 메시지 간격 (초)
+POSITION_STREAM_KEEPALIVE = 15
+# 다른 프로세스 (run_ranging_ingest, 다른 worker) 가 계산한 환자 위치 좌표를 DB 에서 다시 읽는 간격 (초), 0 이면 읽지 않음
+POSITION_STREAM_POLL_INTERVAL = 1.0
+
+# 가까운 의료진 찾기 (users.staff_locator), 의료진 배지 위치로 환자 호출을 받을 의료진을 고른다
+STAFF_LOCATOR = {
+    # 격자 칸 크기 (도면 좌표)
+    "CELL_SIZE": 50,
+    # 이 시간 (초) 동안 배지 위치가 갱신되지 않은 의료진은 찾지 않음
+    "MAX_AGE": 60,
+    # 환자 호출을 받을 가까운 의료진 수 (담당 의료진은 항상 받음)
+    "NEAREST": 3,
+}
+
+# 기지국 거리 값 binary ingest 서버 (manage.py run_ranging_ingest, users.ingest)
+RANGING_INGEST = {
+    "HOST": "0.0.0.0",
+    # 0 이면 받지 않음
+    "UDP_PORT": 9400,
+    "TCP_PORT": 9401,
+    # 모아둔 거리 값을 반영하는 간격 (초), 이만큼 모이면 간격을 기다리지 않고 반영
+    "FLUSH_INTERVAL": 0.05,
+    "FLUSH_SIZE": 1000,
+    # ingest 프로세스의 지표 (GET /metrics) port, 0 이면 내보내지 않음
+    "METRICS_PORT": 9402,
+}
+
+# 구역 출입 검사 (users.geofence), 위치 좌표가 계산될 때마다 실행
+GEOFENCE = {
+    "ENABLED": True,
+    # 구역 격자 칸 크기 (도면 좌표)
+    "CELL_SIZE": 50,
+}
+
+# 병원 조회 응답 캐시 유지 시간 (초, users.hospital_cache)
+# 같은 프로세스에서 병원을 수정하면 바로 지워지고, 다른 프로세스에서 수정한 내용은 이 시간 안에 반영된다
+HOSPITAL_RESPONSE_CACHE_TTL = 300
+
+# 환자 파일 가져오기 한 번에 INSERT 할 환자 수, 내보내기 한 번에 읽을 환자 수 (users.patient_io)
+PATIENT_IMPORT_CHUNK_SIZE = 500
+
+# 환자 전체 조회 페이지네이션 (users.pagination.PatientCursorPagination)
+PATIENT_LIST = {
+    # ?page_size 가 없을 때 페이지 크기, ?page_size 최대값
+    "PAGE_SIZE": 50,
+    "MAX_PAGE_SIZE": 500,
+}
+
+# 환자 위치 이력 (users.history)
+POSITION_HISTORY = {
+    # 위치 이력 저장 여부
+    "ENABLED": True,
+    # PositionChunk 1행이 담는 시간 구간 (초)
+    "BUCKET_SECONDS": 60,
+    # 이만큼 좌표가 모이면 바로 저장, 적어도 FLUSH_INTERVAL 초마다 저장
+    "FLUSH_SIZE": 1000,
+    "FLUSH_INTERVAL": 1.0,
+    # 조회 1번에 돌려주는 최대 좌표 수
+    "MAX_POINTS": 2000,
+    # 보관 기간 (일), manage.py prune_position_history 로 지난 구간을 지운다
+    "RETENTION_DAYS": 30,
+}
+
+# 로그 (한 줄 JSON), 요청이 많은 경로는 HOT_PATH_LOG_SAMPLE_RATE 비율만 남긴다
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "users.logs.JSONFormatter"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "loggers": {
+        "users": {"handlers": ["console"], "level": os.environ.get("log_level", "INFO"), "propagate": False},
+    },
+}
+HOT_PATH_LOG_SAMPLE_RATE = 0.01
+
+# 요청 프로파일링 (users.middleware.ProfilingMiddleware), manage.py profile_report 로 요약
+REQUEST_PROFILING = {
+    "ENABLED": os.environ.get("request_profiling", "") == "1",
+    # 요청 header 값이 TOKEN 과 같으면 프로파일링 (TOKEN 이 없으면 header 는 무시)
+    "HEADER": "X-Profile",
+    "TOKEN": os.environ.get("request_profiling_token", ""),
+    # 무작위로 프로파일링할 요청 비율 (0 ~ 1)
+    "SAMPLE_RATE": float(os.environ.get("request_profiling_sample_rate", "0")),
+    # 프로파일링한 요청의 cProfile 결과 (.prof) 도 저장할지 여부, 프로세스당 최대 MAX_DUMPS 개
+    "CPROFILE": True,
+    "MAX_DUMPS": 500,
+    # 요청 기록에 남길 반복된 SQL 문 수
+    "TOP_QUERIES": 5,
+    "DIRECTORY": os.environ.get("request_profiling_dir", os.path.join(BASE_DIR, "profiles")),
 }
 
 # Internationalization
@@ -16,7 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from users.views import MetricsAPIView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("users/", include("users.urls")),
+    # 서버 지표 (Prometheus)
+    path("metrics", MetricsAPIView.as_view()),
 ]
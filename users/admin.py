@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Hospital, Profile, Patient
+from .models import Hospital, Station, Zone, Profile, Patient
 
 
 class ProfileInline(admin.StackedInline):
@@ -15,7 +15,21 @@ class UserAdmin(BaseUserAdmin):
     inlines = (ProfileInline, )
 
 
-admin.site.register(Hospital)
+class StationInline(admin.TabularInline):
+    model = Station
+    extra = 0
+
+
+class ZoneInline(admin.StackedInline):
+    model = Zone
+    extra = 0
+
+
+class HospitalAdmin(admin.ModelAdmin):
+    inlines = (StationInline, ZoneInline)
+
+
+admin.site.register(Hospital, HospitalAdmin)
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 admin.site.register(Patient)
@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    async view 의 ORM 코드를 실행하는 프로세스당 하나의 스레드 풀 (스레드 settings.ASYNC_DB_WORKERS 개)
+    Django 4.1 의 async ORM (aget, afirst 등) 은 요청마다 스레드를 새로 만들어 실행하므로,
+    동시에 처리 중인 요청이 많아도 DB 를 쓰는 스레드 (와 DB 연결) 수가 늘지 않도록 여기서 실행한다
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_WORKERS, thread_name_prefix="async-db")
+    return _executor
+
+
+async def run_db(function, *args, **kwargs):
+    """
+    동기 ORM 코드를 이벤트 루프를 막지 않고 실행하는 함수
+    :param function: 실행할 함수
+    :return: function 의 반환값
+    """
+    loop = asyncio.get_running_loop()
+    # asyncio.to_thread 처럼 contextvars 를 넘겨서 요청별 값 (쿼리 수 등) 이 DB 스레드에서도 보이게 한다
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_db_executor(), context.run, functools.partial(_call, function, args, kwargs))
+
+
+def call_db(function, *args, **kwargs):
+    """
+    이벤트 루프 스레드의 동기 코드에서 ORM 코드를 DB 스레드 풀에서 실행하고 끝날 때까지 기다리는 함수
+    Django 4.1 의 ASGI handler 는 StreamingHttpResponse 의 (동기) iterator 를 이벤트 루프 스레드에서 돌리므로,
+    그 안에서는 ORM 을 직접 부를 수 없다 (SynchronousOnlyOperation)
+    :param function: 실행할 함수
+    :return: function 의 반환값
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # 이벤트 루프 밖 (WSGI, ASGI 의 동기 view 스레드) 에서는 그대로 실행
+        return function(*args, **kwargs)
+    return get_db_executor().submit(_call, function, args, kwargs).result()
+
+
+def _call(function, args, kwargs):
+    # 오래 실행되는 스레드이므로 요청 처리 때처럼 끊어진 / 오래된 DB 연결을 정리
+    close_old_connections()
+    return function(*args, **kwargs)
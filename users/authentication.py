@@ -0,0 +1,83 @@
+# users/authentication.py
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from rest_framework.authentication import TokenAuthentication
+
+from .metrics import REGISTRY
+
+TOKEN_CACHE_LOOKUPS = REGISTRY.counter(
+    "igo_auth_token_cache_total", "Token authentication cache lookups", labelnames=("result",),
+)
+
+
+class TokenUserCache:
+    """
+    토큰 -> (유저, 토큰) 을 저장하는 LRU + TTL 캐시 (프로세스 메모리)
+    토큰이 지워지거나 바뀌면, 유저가 바뀌면 (비활성화 등) signals 에서 해당 항목을 지운다
+    다른 프로세스에서 바뀐 토큰 / 유저는 settings.TOKEN_AUTH_CACHE["TTL"] 초 안에 반영된다
+    """
+    def __init__(self, maxsize, ttl):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :param key: 토큰 값
+        :return: (유저, 토큰), 캐시에 없으면 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        TOKEN_CACHE_LOOKUPS.inc(result="miss" if entry is None else "hit")
+        return entry
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (user, token)
+
+    def invalidate_token(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (user, _) in self._entries.items() if user.pk == user_id]:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+token_user_cache = TokenUserCache(
+    maxsize=settings.TOKEN_AUTH_CACHE["MAXSIZE"],
+    ttl=settings.TOKEN_AUTH_CACHE["TTL"],
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication 과 같지만 토큰 -> 유저 조회 결과를 token_user_cache 에 저장
+    캐시에 있으면 쿼리 0번, 없으면 Token JOIN User 쿼리 1번 (TokenAuthentication 과 같음)
+    """
+    def authenticate_credentials(self, key):
+        entry = token_user_cache.get(key)
+        if entry is not None:
+            user, token = entry
+            # 요청마다 유저 객체를 따로 쓰도록 복사 (다른 스레드의 요청과 공유하지 않음)
+            return copy.copy(user), token
+        # 없는 토큰, 비활성화된 유저는 AuthenticationFailed (캐시하지 않음)
+        user, token = super().authenticate_credentials(key)
+        token_user_cache.set(key, user, token)
+        return copy.copy(user), token
@@ -0,0 +1,242 @@
+import logging
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .models import Hospital, Patient, Profile
+from .multilateration import MultilaterationSolver
+
+logger = logging.getLogger(__name__)
+
+
+# 병원 도면 / 실제 크기 필드
+HOSPITAL_FIELDS = ("drawing_x", "drawing_y", "real_x", "real_y",
+                   "real_station1_x", "real_station1_y",
+                   "real_station2_x", "real_station2_y",
+                   "real_station3_x", "real_station3_y")
+# 기지국 필드
+STATION_FIELDS = ("id", "name", "real_x", "real_y")
+
+
+@dataclass(frozen=True)
+class HospitalGeometry:
+    """
+    위치 계산에 필요한 병원 정보만 모아둔 변하지 않는 객체
+    """
+    hospital_id: int
+    # 병원 도면 사진 크기
+    drawing_x: int
+    drawing_y: int
+    # 병원 실제 크기
+    real_x: int
+    real_y: int
+    # 병원 기지국 배치로 미리 계산해둔 solver
+    solver: MultilaterationSolver
+
+    @property
+    def station_names(self) -> tuple:
+        return self.solver.station_names
+
+    def drawing_position(self, real_distance) -> tuple:
+        """
+        :param real_distance: station_names 순서대로의 환자와 기지국 사이의 거리값
+        :return: 도면 상에서 환자의 좌표
+        """
+        real_patient_x, real_patient_y = self.solver.solve(real_distance)
+        # 병원 도면에서 환자의 위치 (비례식)
+        try:
+            drawing_patient_x = (self.drawing_x * real_patient_x) / self.real_x
+            drawing_patient_y = (self.drawing_y * real_patient_y) / self.real_y
+        except ZeroDivisionError:
+            logger.warning("hospital %s has no real size", self.hospital_id)
+            drawing_patient_x, drawing_patient_y = 0, 0
+        return drawing_patient_x, drawing_patient_y
+
+    def drawing_positions(self, real_distances) -> np.ndarray:
+        """
+        :param real_distances: 환자 M명의 station_names 순서대로의 거리값, (M, N) 모양
+        :return: 도면 상에서 환자 M명의 좌표, (M, 2) 모양
+        """
+        real_patients = self.solver.solve_batch(real_distances)
+        # 병원 도면에서 환자의 위치 (비례식)
+        if self.real_x == 0 or self.real_y == 0:
+            logger.warning("hospital %s has no real size", self.hospital_id)
+            return np.zeros_like(real_patients)
+        return real_patients * np.array([self.drawing_x / self.real_x, self.drawing_y / self.real_y])
+
+
+def build_hospital_geometry(hospital_id, hospital: dict, stations: list) -> HospitalGeometry:
+    """
+    :param hospital_id: 병원 ID
+    :param hospital: HOSPITAL_FIELDS 값
+    :param stations: 병원의 기지국들의 STATION_FIELDS 값
+    :return: HospitalGeometry
+    """
+    anchors = {station["name"]: (station["real_x"], station["real_y"])
+               for station in sorted(stations, key=lambda station: station["id"])}
+    if len(anchors) < 3:
+        # 기지국 모델이 없는 병원은 병원 모델의 기지국 1, 2, 3 좌표를 사용
+        anchors = {
+            "A": (hospital["real_station1_x"], hospital["real_station1_y"]),
+            "B": (hospital["real_station2_x"], hospital["real_station2_y"]),
+            "C": (hospital["real_station3_x"], hospital["real_station3_y"]),
+        }
+    return HospitalGeometry(
+        hospital_id=hospital_id,
+        drawing_x=hospital["drawing_x"],
+        drawing_y=hospital["drawing_y"],
+        real_x=hospital["real_x"],
+        real_y=hospital["real_y"],
+        solver=MultilaterationSolver(anchors),
+    )
+
+
+class CalibrationCache:
+    """
+    병원 ID -> HospitalGeometry, 환자 ID -> 의료진 ID -> 병원 ID 를 저장하는 캐시 (프로세스 메모리)
+    (의료진 배지의 위치도 같은 방법으로 계산하므로 의료진 ID -> 병원 ID 도 사용)
+    캐시에 있으면 쿼리 0번, 없으면 환자 -> 의료진 -> 병원 -> 기지국을 JOIN 한 쿼리 1번
+    Hospital, Station, Profile, Patient 가 바뀌면 signals 에서 해당 항목을 지운다
+    """
+    def __init__(self):
+        self._geometries = {}  # 병원 ID -> HospitalGeometry
+        self._profile_hospitals = {}  # 의료진 ID -> 병원 ID
+        self._patient_profiles = {}  # 환자 ID -> 의료진 ID
+        self._lock = threading.Lock()
+
+    def for_hospital(self, hospital_id):
+        """
+        :param hospital_id: 병원 ID
+        :return: 병원의 HospitalGeometry, 병원이 없으면 None
+        """
+        geometry = self._geometries.get(hospital_id)
+        if geometry is not None:
+            return geometry
+        rows = list(Hospital.objects.filter(pk=hospital_id).values(
+            *HOSPITAL_FIELDS, *(f"stations__{field}" for field in STATION_FIELDS)
+        ))
+        if not rows:
+            return None
+        return self._store_geometry(hospital_id, rows, prefix="")
+
+    def for_patient(self, patient_id):
+        """
+        :param patient_id: 환자 ID
+        :return: 환자의 의료진의 병원의 HospitalGeometry, 환자가 없으면 None
+        """
+        return self.for_patients((patient_id,)).get(patient_id)
+
+    def for_patients(self, patient_ids) -> dict:
+        """
+        :param patient_ids: 환자 ID 들
+        :return: 환자 ID -> HospitalGeometry (없는 환자는 빠짐)
+        """
+        geometries, missing = {}, []
+        for patient_id in patient_ids:
+            geometry = self._cached_for_patient(patient_id)
+            if geometry is None:
+                missing.append(patient_id)
+            else:
+                geometries[patient_id] = geometry
+        if not missing:
+            return geometries
+
+        prefix = "profile__hospital__"
+        rows = Patient.objects.filter(pk__in=missing).values(
+            "pk", "profile_id", "profile__hospital_id",
+            *(prefix + field for field in HOSPITAL_FIELDS),
+            *(f"{prefix}stations__{field}" for field in STATION_FIELDS),
+        )
+        rows_by_hospital = {}
+        with self._lock:
+            for row in rows:
+                self._patient_profiles[row["pk"]] = row["profile_id"]
+                self._profile_hospitals[row["profile_id"]] = row["profile__hospital_id"]
+                rows_by_hospital.setdefault(row["profile__hospital_id"], []).append(row)
+        for hospital_id, hospital_rows in rows_by_hospital.items():
+            geometry = self._geometries.get(hospital_id)
+            if geometry is None:
+                geometry = self._store_geometry(hospital_id, hospital_rows, prefix=prefix)
+            for row in hospital_rows:
+                geometries[row["pk"]] = geometry
+        return geometries
+
+    def for_profile(self, profile_id):
+        """
+        :param profile_id: 의료진 ID
+        :return: 의료진의 병원의 HospitalGeometry, 의료진이 없으면 None
+        """
+        geometry = self._geometries.get(self._profile_hospitals.get(profile_id))
+        if geometry is not None:
+            return geometry
+        prefix = "hospital__"
+        rows = list(Profile.objects.filter(pk=profile_id).values(
+            "hospital_id",
+            *(prefix + field for field in HOSPITAL_FIELDS),
+            *(f"{prefix}stations__{field}" for field in STATION_FIELDS),
+        ))
+        if not rows:
+            return None
+        hospital_id = rows[0]["hospital_id"]
+        with self._lock:
+            self._profile_hospitals[profile_id] = hospital_id
+        return self._geometries.get(hospital_id) or self._store_geometry(hospital_id, rows, prefix=prefix)
+
+    def hospital_id_for_patient(self, patient_id):
+        """
+        :param patient_id: 환자 ID
+        :return: 환자의 의료진의 병원 ID, 환자가 없으면 None
+        """
+        geometry = self.for_patient(patient_id)
+        return None if geometry is None else geometry.hospital_id
+
+    def profile_id_for_patient(self, patient_id):
+        """
+        :param patient_id: 환자 ID
+        :return: 환자의 담당 의료진 ID, 환자가 없으면 None
+        """
+        if patient_id not in self._patient_profiles:
+            self.for_patient(patient_id)
+        return self._patient_profiles.get(patient_id)
+
+    def _cached_for_patient(self, patient_id):
+        profile_id = self._patient_profiles.get(patient_id)
+        hospital_id = self._profile_hospitals.get(profile_id)
+        return self._geometries.get(hospital_id)
+
+    def _store_geometry(self, hospital_id, rows: list, prefix: str) -> HospitalGeometry:
+        # 기지국 JOIN 때문에 기지국 수만큼 행이 있으므로 병원 값은 첫 행에서 읽는다
+        hospital = {field: rows[0][prefix + field] for field in HOSPITAL_FIELDS}
+        stations, seen = [], set()
+        for row in rows:
+            station_id = row[f"{prefix}stations__id"]
+            if station_id is None or station_id in seen:
+                continue
+            seen.add(station_id)
+            stations.append({field: row[f"{prefix}stations__{field}"] for field in STATION_FIELDS})
+        geometry = build_hospital_geometry(hospital_id, hospital, stations)
+        with self._lock:
+            self._geometries[hospital_id] = geometry
+        return geometry
+
+    def invalidate_hospital(self, hospital_id):
+        with self._lock:
+            self._geometries.pop(hospital_id, None)
+
+    def invalidate_profile(self, profile_id):
+        with self._lock:
+            self._profile_hospitals.pop(profile_id, None)
+
+    def invalidate_patient(self, patient_id):
+        with self._lock:
+            self._patient_profiles.pop(patient_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._geometries.clear()
+            self._profile_hospitals.clear()
+            self._patient_profiles.clear()
+
+
+calibration_cache = CalibrationCache()
@@ -0,0 +1,83 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from .metrics import REGISTRY
+
+PATIENT_CALLS = REGISTRY.counter(
+    "igo_patient_calls_total", "Patient calls by debouncing result", labelnames=("call",),
+)
+
+# 호출 처리 결과
+OPENED = "opened"
+MERGED = "merged"
+
+
+@dataclass
+class PatientCall:
+    """
+    환자 1명의 진행 중인 호출
+    """
+    opened_at: float  # 호출을 연 시각 (unix time, 초)
+    count: int  # 창 안에서 받은 호출 수 (처음 호출 포함)
+    drawing_patient_x: float  # 마지막 호출 때 도면 상에서 환자의 x좌표
+    drawing_patient_y: float  # 마지막 호출 때 도면 상에서 환자의 y좌표
+
+
+class CallDebouncer:
+    """
+    환자 ID -> 진행 중인 호출 (프로세스 메모리)
+    호출을 연 뒤 window 초 안에 같은 환자가 다시 호출하면 새 호출을 열지 않고 진행 중인 호출에 합친다
+    (위치 좌표 갱신, 호출 수 + 1), FCM push 는 호출을 열 때만 보내므로 환자 1명당 window 초에 1번
+    """
+    def __init__(self, window, maxsize, timer=time.monotonic):
+        """
+        :param window: 호출을 합치는 시간 (초), 0 이면 합치지 않음
+        :param maxsize: 기억할 최대 환자 수
+        :param timer: 경과 시간을 재는 함수 (테스트용)
+        """
+        self.window = window
+        self._calls = TTLCache(maxsize=maxsize, ttl=window or 1, timer=timer)
+        self._lock = threading.Lock()
+
+    def register(self, patient_id, drawing_patient_x, drawing_patient_y) -> tuple:
+        """
+        환자의 호출 1번을 기록하는 함수
+        :param patient_id: 환자 ID
+        :param drawing_patient_x: 도면 상에서 환자의 x좌표
+        :param drawing_patient_y: 도면 상에서 환자의 y좌표
+        :return: (OPENED 또는 MERGED, PatientCall 복사본)
+        """
+        with self._lock:
+            call = self._calls.get(patient_id) if self.window > 0 else None
+            if call is None:
+                # 창이 끝난 호출은 TTLCache 에서 지워지므로 새 호출을 연다 (다시 넣을 때만 창이 시작됨)
+                call = PatientCall(time.time(), 1, drawing_patient_x, drawing_patient_y)
+                if self.window > 0:
+                    self._calls[patient_id] = call
+                result = OPENED
+            else:
+                # 값만 바꾸고 다시 넣지 않으므로 창은 처음 호출부터 window 초
+                call.count += 1
+                call.drawing_patient_x = drawing_patient_x
+                call.drawing_patient_y = drawing_patient_y
+                result = MERGED
+            PATIENT_CALLS.inc(call=result)
+            return result, PatientCall(call.opened_at, call.count, call.drawing_patient_x, call.drawing_patient_y)
+
+    def discard(self, patient_id):
+        with self._lock:
+            self._calls.pop(patient_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._calls.clear()
+
+
+call_debouncer = CallDebouncer(
+    window=settings.CALL_DEBOUNCE["WINDOW"],
+    maxsize=settings.CALL_DEBOUNCE["MAX_PATIENTS"],
+)
@@ -0,0 +1,137 @@
+from django.db import close_old_connections
+from django.db.models import Q
+from firebase_admin import messaging
+
+from django.conf import settings
+
+from .calibration import calibration_cache
+from .fcm import get_fcm_dispatcher
+from .models import Patient, Profile
+from .staff_locator import staff_locator
+
+# FCM multicast 요청 1번에 보낼 수 있는 최대 토큰 수
+MULTICAST_TOKEN_LIMIT = 500
+
+
+def get_care_team_tokens(patient: Patient) -> list:
+    """
+    환자의 호출을 받을 의료진의 토큰을 쿼리 1번으로 조회하는 함수
+    담당 의료진과, 담당 의료진과 같은 병원에서 근무 중인 의료진 전체
+    :param patient: 환자
+    :return: 중복 없는 토큰 목록
+    """
+    tokens = (
+        Profile.objects
+        .filter(Q(hospital__profile=patient.profile_id, on_duty=True) | Q(pk=patient.profile_id))
+        .exclude(token="")
+        .values_list("token", flat=True)
+    )
+    return list(dict.fromkeys(tokens))
+
+
+def get_nearest_staff_tokens(patient: Patient, drawing_patient_x, drawing_patient_y):
+    """
+    환자의 호출을 받을 의료진의 토큰을 조회하는 함수
+    담당 의료진과, 같은 병원에서 근무 중이고 배지 위치가 최근에 갱신된 의료진 중 환자와 가장 가까운 STAFF_LOCATOR["NEAREST"]명
+    :param patient: 환자
+    :param drawing_patient_x: 도면 상에서 환자의 x좌표
+    :param drawing_patient_y: 도면 상에서 환자의 y좌표
+    :return: 중복 없는 토큰 목록 (담당 의료진, 가까운 순서), 위치를 아는 의료진이 없으면 None
+    """
+    count = settings.STAFF_LOCATOR["NEAREST"]
+    hospital_id = calibration_cache.hospital_id_for_patient(patient.pk)
+    # 다른 프로세스에서 근무를 마친 의료진이 남아 있을 수 있으므로 넉넉하게 찾고 on_duty 로 거른다
+    nearest = staff_locator.nearest(hospital_id, drawing_patient_x, drawing_patient_y, count * 2)
+    if not nearest:
+        return None
+    staff = {
+        profile_id: (token, on_duty)
+        for profile_id, token, on_duty in Profile.objects
+        .filter(pk__in=[patient.profile_id, *nearest])
+        .values_list("pk", "token", "on_duty")
+    }
+    available = [profile_id for profile_id in nearest if profile_id in staff and staff[profile_id][1]][:count]
+    if not available:
+        return None
+    tokens = (staff[profile_id][0] for profile_id in [patient.profile_id, *available] if profile_id in staff)
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+def get_call_tokens(patient: Patient, drawing_patient_x, drawing_patient_y) -> list:
+    """
+    환자 -> 의료진 호출을 받을 토큰을 조회하는 함수
+    배지 위치를 아는 의료진이 있으면 담당 의료진과 가장 가까운 의료진, 없으면 근무 중인 의료진 전체
+    :param patient: 환자
+    :param drawing_patient_x: 도면 상에서 환자의 x좌표
+    :param drawing_patient_y: 도면 상에서 환자의 y좌표
+    :return: 중복 없는 토큰 목록
+    """
+    tokens = get_nearest_staff_tokens(patient, drawing_patient_x, drawing_patient_y)
+    if tokens is None:
+        tokens = get_care_team_tokens(patient)
+    return tokens
+
+
+def enqueue_care_team_call(patient: Patient, tokens: list, drawing_patient_x, drawing_patient_y) -> list:
+    """
+    토큰 500개마다 notification, data multicast 요청을 1번씩 발송 큐에 넣고 바로 반환하는 함수
+    :param patient: 환자
+    :param tokens: get_call_tokens() 로 조회한 토큰 목록
+    :param drawing_patient_x: 도면 상에서 환자의 x좌표
+    :param drawing_patient_y: 도면 상에서 환자의 y좌표
+    :return: 발송 결과가 담길 Future 목록
+    """
+    dispatcher = get_fcm_dispatcher()
+    futures = []
+    for start in range(0, len(tokens), MULTICAST_TOKEN_LIMIT):
+        chunk = tokens[start:start + MULTICAST_TOKEN_LIMIT]
+        # notification push
+        futures.append(dispatcher.enqueue_multicast(messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title='환자의 호출',
+                body=f'{patient.name} 환자가 호출했습니다',
+            ),
+            tokens=chunk,
+        ), on_result=prune_unregistered_tokens))
+        # data push
+        futures.append(dispatcher.enqueue_multicast(messaging.MulticastMessage(
+            data={
+                "id": f"{patient.id}",
+                "name": f"{patient.name}",
+                "image": f"{patient.image}",
+                "x": f"{drawing_patient_x}",
+                "y": f"{drawing_patient_y}"
+            },
+            tokens=chunk,
+        ), on_result=prune_unregistered_tokens))
+    return futures
+
+
+def send_from_patient_to_care_team_by_fcm(patient: Patient, drawing_patient_x, drawing_patient_y):
+    """
+    환자 -> 의료진 호출을 보내는 함수
+    배지 위치를 아는 의료진이 있으면 담당 의료진과 가장 가까운 의료진에게, 없으면 근무 중인 의료진 전체에게
+    토큰 500개마다 notification, data multicast 요청을 1번씩 발송 큐에 넣고 바로 반환
+    :param patient: 환자
+    :param drawing_patient_x: 도면 상에서 환자의 x좌표
+    :param drawing_patient_y: 도면 상에서 환자의 y좌표
+    :return: 호출을 받을 토큰 수
+    """
+    tokens = get_call_tokens(patient, drawing_patient_x, drawing_patient_y)
+    enqueue_care_team_call(patient, tokens, drawing_patient_x, drawing_patient_y)
+    return len(tokens)
+
+
+def prune_unregistered_tokens(results: dict):
+    """
+    FCM 이 더 이상 등록되지 않은 기기라고 알려준 토큰을 지우는 함수 (발송기 워커 스레드에서 호출)
+    다음 호출부터는 해당 토큰에게 보내지 않는다
+    :param results: 토큰 -> SendResult
+    :return: none
+    """
+    unregistered = [token for token, result in results.items()
+                    if isinstance(result.exception, messaging.UnregisteredError)]
+    if unregistered:
+        # 오래 실행되는 워커 스레드이므로 요청 처리 때처럼 끊어진 / 오래된 DB 연결을 정리
+        close_old_connections()
+        Profile.objects.filter(token__in=unregistered).update(token="")
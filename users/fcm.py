@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from firebase_admin import exceptions, messaging
+
+from .metrics import REGISTRY, FCM_SEND_LATENCY, FCM_MESSAGES, FCM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 메시지 1개를 보낸 결과 (firebase_admin 의 SendResponse 와 같은 속성)
+SendResult = namedtuple("SendResult", ("success", "message_id", "exception"))
+
+# 잠시 뒤에 다시 보내면 성공할 수 있는 FCM 오류
+RETRYABLE_ERRORS = (
+    exceptions.UnavailableError,
+    exceptions.InternalError,
+    exceptions.DeadlineExceededError,
+    exceptions.ResourceExhaustedError,  # messaging.QuotaExceededError 포함
+    exceptions.UnknownError,
+)
+
+
+def is_retryable(error) -> bool:
+    """
+    :param error: 메시지를 보내다 발생한 오류
+    :return: 다시 보낼 만한 오류인지 여부 (FCM 오류가 아닌 네트워크 오류 등은 다시 보낸다)
+    """
+    if isinstance(error, exceptions.FirebaseError):
+        return isinstance(error, RETRYABLE_ERRORS)
+    return True
+
+
+class FirebaseTransport:
+    """
+    firebase_admin 으로 FCM 서버에 메시지를 묶어서 보내는 transport
+    """
+    def send_each(self, messages: list) -> list:
+        """
+        :param messages: messaging.Message 목록 (최대 500개)
+        :return: 메시지별 SendResult 목록
+        """
+        response = messaging.send_each(messages)
+        return [SendResult(result.success, result.message_id, result.exception) for result in response.responses]
+
+    def send_each_for_multicast(self, multicast) -> list:
+        """
+        :param multicast: messaging.MulticastMessage (토큰 최대 500개)
+        :return: 토큰별 SendResult 목록
+        """
+        response = messaging.send_each_for_multicast(multicast)
+        return [SendResult(result.success, result.message_id, result.exception) for result in response.responses]
+
+
+class StubTransport:
+    """
+    네트워크 없이 보낸 메시지를 메모리에 저장하는 transport (테스트, 벤치마크용)
+    """
+    def __init__(self, latency=0.0):
+        """
+        :param latency: FCM 서버 왕복 시간 흉내 (초)
+        """
+        self.latency = latency
+        self.sent = []
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def send_each(self, messages: list) -> list:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.batches += 1
+            start = len(self.sent)
+            self.sent.extend(messages)
+        return [SendResult(True, f"stub/{start + index}", None) for index in range(len(messages))]
+
+    def send_each_for_multicast(self, multicast) -> list:
+        return self.send_each([
+            messaging.Message(data=multicast.data, notification=multicast.notification, token=token)
+            for token in multicast.tokens
+        ])
+
+
+class _Job:
+    __slots__ = ("message", "on_result", "attempt", "future")
+
+    def __init__(self, message, on_result):
+        self.message = message
+        self.on_result = on_result
+        self.attempt = 0
+        self.future = Future()
+
+
+class _MulticastJob(_Job):
+    __slots__ = ("tokens", "results")
+
+    def __init__(self, message, on_result):
+        super().__init__(message, on_result)
+        self.tokens = tuple(message.tokens)
+        self.results = {}  # 토큰 -> 최종 SendResult
+
+
+_STOP = object()
+
+
+class FCMDispatcher:
+    """
+    FCM 메시지를 큐에 넣고 바로 반환하는 백그라운드 발송기
+    워커 스레드가 큐에 쌓인 메시지를 최대 batch_size 개씩 묶어서 한 번에 보내고 (multicast 는 각각 요청 1번),
+    실패한 메시지는 backoff 를 두 배씩 늘려가며 max_retries 번까지 다시 보낸다
+    """
+    def __init__(self, transport, workers=2, batch_size=500, max_retries=3, retry_backoff=0.5, linger=0.01):
+        """
+        :param transport: send_each(messages), send_each_for_multicast(multicast) -> [SendResult] 를 제공하는 객체
+        :param workers: 워커 스레드 수
+        :param batch_size: 한 번에 보낼 최대 메시지 수 (FCM 제한 500)
+        :param max_retries: 최대 재시도 횟수
+        :param retry_backoff: 첫 재시도까지 기다리는 시간 (초)
+        :param linger: 묶어서 보내기 위해 다음 메시지를 기다리는 시간 (초)
+        """
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.linger = linger
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pending = 0  # 큐에 넣었지만 아직 결과가 나오지 않은 메시지 수
+        self._condition = threading.Condition()
+
+    def enqueue(self, message, on_result=None):
+        """
+        :param message: messaging.Message
+        :param on_result: 최종 결과(SendResult)를 받을 함수, 워커 스레드에서 호출된다
+        :return: 최종 결과(SendResult)가 담길 Future
+        """
+        self._start()
+        with self._condition:
+            self._pending += 1
+        job = _Job(message, on_result)
+        self._queue.put(job)
+        return job.future
+
+    def enqueue_multicast(self, multicast, on_result=None):
+        """
+        :param multicast: messaging.MulticastMessage (토큰 최대 500개), 다른 메시지와 묶지 않고 요청 1번으로 보낸다
+        :param on_result: 토큰 -> 최종 SendResult dict 를 받을 함수, 워커 스레드에서 호출된다
+        :return: 토큰 -> 최종 SendResult dict 가 담길 Future
+        """
+        self._start()
+        with self._condition:
+            self._pending += 1
+        job = _MulticastJob(multicast, on_result)
+        self._queue.put(job)
+        return job.future
+
+    def flush(self, timeout=None) -> bool:
+        """
+        큐에 넣은 메시지의 결과가 모두 나올 때까지 기다리는 함수
+        :param timeout: 최대 대기 시간 (초)
+        :return: 모두 끝났으면 True
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def stop(self, timeout=None):
+        self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._condition:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"fcm-dispatcher-{index}", daemon=True)
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            batch = [job]
+            # linger 동안 들어오는 메시지를 batch_size 까지 묶는다
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                batch.append(job)
+            self._send(batch)
+
+    def _send(self, batch: list):
+        singles = []
+        for job in batch:
+            if isinstance(job, _MulticastJob):
+                self._send_multicast(job)
+            else:
+                singles.append(job)
+        if singles:
+            self._send_each(singles)
+
+    def _send_each(self, batch: list):
+        try:
+            with FCM_SEND_LATENCY.time(kind="batch"):
+                results = self.transport.send_each([job.message for job in batch])
+        except Exception as error:  # 묶음 전체가 실패 (네트워크 오류 등)
+            logger.warning("FCM batch send failed: %r", error)
+            results = [SendResult(False, None, error)] * len(batch)
+
+        for job, result in zip(batch, results):
+            if result.success or job.attempt >= self.max_retries or not is_retryable(result.exception):
+                self._finish(job, result)
+                continue
+            self._retry(job)
+
+    def _send_multicast(self, job: _MulticastJob):
+        tokens = job.message.tokens
+        try:
+            with FCM_SEND_LATENCY.time(kind="multicast"):
+                results = self.transport.send_each_for_multicast(job.message)
+        except Exception as error:  # 요청 전체가 실패 (네트워크 오류 등)
+            logger.warning("FCM multicast send failed: %r", error)
+            results = [SendResult(False, None, error)] * len(tokens)
+
+        retry_tokens = []
+        for token, result in zip(tokens, results):
+            if result.success or job.attempt >= self.max_retries or not is_retryable(result.exception):
+                job.results[token] = result
+            else:
+                retry_tokens.append(token)
+        if not retry_tokens:
+            self._finish(job, job.results)
+            return
+        # 실패한 토큰에게만 다시 보낸다
+        message = job.message
+        job.message = messaging.MulticastMessage(
+            tokens=retry_tokens, data=message.data, notification=message.notification,
+            android=message.android, webpush=message.webpush, apns=message.apns, fcm_options=message.fcm_options,
+        )
+        self._retry(job)
+
+    def _retry(self, job: _Job):
+        FCM_RETRIES.inc()
+        job.attempt += 1
+        delay = self.retry_backoff * (2 ** (job.attempt - 1))
+        timer = threading.Timer(delay, self._queue.put, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, job: _Job, result):
+        if isinstance(job, _MulticastJob):
+            failed = sum(not token_result.success for token_result in result.values())
+            FCM_MESSAGES.inc(len(result) - failed, result="success")
+            FCM_MESSAGES.inc(failed, result="failure")
+            if failed:
+                logger.warning("FCM multicast: %d of %d token(s) failed", failed, len(job.tokens))
+        else:
+            FCM_MESSAGES.inc(result="success" if result.success else "failure")
+        if not isinstance(job, _MulticastJob) and not result.success:
+            logger.warning("FCM message dropped after %d attempt(s): %r", job.attempt + 1, result.exception)
+        if job.on_result is not None:
+            try:
+                job.on_result(result)
+            except Exception:
+                logger.exception("FCM result callback failed")
+        job.future.set_result(result)
+        with self._condition:
+            self._pending -= 1
+            if self._pending == 0:
+                self._condition.notify_all()
+
+
+async def wait_for_results(futures, timeout) -> dict:
+    """
+    enqueue(), enqueue_multicast() 가 돌려준 Future 들을 이벤트 루프를 막지 않고 함께 기다리는 함수
+    :param futures: Future 목록
+    :param timeout: 최대 대기 시간 (초), 그때까지 결과가 나오지 않은 메시지는 pending 으로 센다
+    :return: {"success": 성공한 토큰 수, "failure": 실패한 토큰 수, "pending": 결과를 기다리다 만 메시지 수}
+    """
+    counts = {"success": 0, "failure": 0, "pending": 0}
+    if not futures:
+        return counts
+    done, not_done = await asyncio.wait([asyncio.wrap_future(future) for future in futures], timeout=timeout)
+    for task in done:
+        result = task.result()
+        for token_result in (result.values() if isinstance(result, dict) else (result,)):
+            counts["success" if token_result.success else "failure"] += 1
+    counts["pending"] = len(not_done)
+    return counts
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_fcm_dispatcher() -> FCMDispatcher:
+    """
+    settings.FCM_DISPATCHER 설정으로 만든 프로세스당 하나의 발송기
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                options = dict(settings.FCM_DISPATCHER)
+                transport = import_string(options.pop("TRANSPORT"))()
+                _dispatcher = FCMDispatcher(transport, **{key.lower(): value for key, value in options.items()})
+    return _dispatcher
+
+
+REGISTRY.gauge(
+    "igo_fcm_pending_messages", "FCM messages queued or being retried",
+    callback=lambda: 0 if _dispatcher is None else _dispatcher._pending,
+)
+
+
+def reset_fcm_dispatcher():
+    """
+    발송기를 멈추고 지워서 다음 호출 때 설정을 다시 읽게 하는 함수 (테스트용)
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop(timeout=5)
+        _dispatcher = None
@@ -0,0 +1,237 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from firebase_admin import messaging
+
+from .calibration import calibration_cache
+from .care_team import MULTICAST_TOKEN_LIMIT, get_care_team_tokens, prune_unregistered_tokens
+from .fcm import get_fcm_dispatcher
+from .logs import log_event
+from .metrics import REGISTRY
+from .models import Patient, Zone
+
+logger = logging.getLogger(__name__)
+
+GEOFENCE_EVENTS = REGISTRY.counter(
+    "igo_geofence_events_total", "Zone enter/exit transitions", labelnames=("event", "alerted"),
+)
+
+ENTER = "enter"
+EXIT = "exit"
+
+
+@dataclass(frozen=True)
+class CompiledZone:
+    """
+    구역 검사에 필요한 값만 모아둔 변하지 않는 객체
+    """
+    id: int
+    name: str
+    alert_on_enter: bool
+    alert_on_exit: bool
+    vertices: tuple  # ((x, y), ...)
+    bounds: tuple  # (min x, min y, max x, max y)
+
+    def contains(self, x, y) -> bool:
+        """
+        :return: 점 (x, y) 가 구역 안에 있는지 (bounding box 검사 후 ray casting)
+        """
+        min_x, min_y, max_x, max_y = self.bounds
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+        inside = False
+        previous_x, previous_y = self.vertices[-1]
+        for vertex_x, vertex_y in self.vertices:
+            if (vertex_y > y) != (previous_y > y):
+                crossing_x = (previous_x - vertex_x) * (y - vertex_y) / (previous_y - vertex_y) + vertex_x
+                if x < crossing_x:
+                    inside = not inside
+            previous_x, previous_y = vertex_x, vertex_y
+        return inside
+
+
+def compile_zone(zone_id, name, polygon, alert_on_enter, alert_on_exit) -> CompiledZone:
+    """
+    :raise ValueError: polygon 이 꼭짓점 [x, y] 3개 이상의 목록이 아님 (Zone.clean 을 거치지 않고 저장된 구역)
+    """
+    try:
+        vertices = tuple((float(x), float(y)) for x, y in polygon)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"invalid polygon: {polygon!r}") from error
+    if len(vertices) < 3 or not all(math.isfinite(value) for vertex in vertices for value in vertex):
+        raise ValueError(f"invalid polygon: {polygon!r}")
+    xs = [x for x, _ in vertices]
+    ys = [y for _, y in vertices]
+    return CompiledZone(
+        id=zone_id, name=name, alert_on_enter=alert_on_enter, alert_on_exit=alert_on_exit,
+        vertices=vertices, bounds=(min(xs), min(ys), max(xs), max(ys)),
+    )
+
+
+class ZoneIndex:
+    """
+    병원 1곳의 구역들을 담는 격자 (도면 좌표, 칸 크기 cell_size)
+    칸마다 bounding box 가 겹치는 구역만 저장해두므로, 점 1개를 검사할 때 그 칸의 구역만 다각형 검사
+    """
+    def __init__(self, zones, cell_size):
+        self.cell_size = cell_size
+        self.zones = {zone.id: zone for zone in zones}
+        self._cells = {}  # (칸 x, 칸 y) -> 구역 tuple
+        for zone in zones:
+            min_x, min_y, max_x, max_y = zone.bounds
+            for cell_x in range(math.floor(min_x / cell_size), math.floor(max_x / cell_size) + 1):
+                for cell_y in range(math.floor(min_y / cell_size), math.floor(max_y / cell_size) + 1):
+                    self._cells[cell_x, cell_y] = self._cells.get((cell_x, cell_y), ()) + (zone,)
+
+    def zones_at(self, x, y) -> frozenset:
+        """
+        :return: 점 (x, y) 를 포함하는 구역 ID 들
+        """
+        candidates = self._cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)), ())
+        return frozenset(zone.id for zone in candidates if zone.contains(x, y))
+
+
+class GeofenceEngine:
+    """
+    위치 좌표가 계산될 때마다 환자가 들어가거나 나온 구역을 찾고, 낙상 위험 환자면 의료진에게 알리는 엔진
+    병원 ID -> ZoneIndex, 환자 ID -> 마지막으로 있던 구역들, 환자 ID -> 낙상 위험 여부 (프로세스 메모리)
+    구역이나 환자가 바뀌면 signals 에서 해당 항목을 지운다
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._indexes = {}  # 병원 ID -> ZoneIndex
+        self._states = {}  # 환자 ID -> 구역 ID frozenset
+        self._fall_risk = {}  # 환자 ID -> 낙상 위험 여부
+        self._lock = threading.Lock()
+
+    def index_for_hospital(self, hospital_id) -> ZoneIndex:
+        """
+        :param hospital_id: 병원 ID
+        :return: 병원의 ZoneIndex (캐시에 없으면 쿼리 1번)
+        """
+        index = self._indexes.get(hospital_id)
+        if index is not None:
+            return index
+        zones = []
+        for row in Zone.objects.filter(hospital_id=hospital_id).values_list(
+                "id", "name", "polygon", "alert_on_enter", "alert_on_exit"):
+            try:
+                zones.append(compile_zone(*row))
+            except ValueError as error:
+                # bulk / raw SQL 등으로 잘못 저장된 구역은 위치 계산을 막지 않도록 건너뛴다
+                log_event(logger, logging.WARNING, "invalid zone skipped", hospital_id=hospital_id, zone_id=row[0],
+                          error=str(error))
+        index = ZoneIndex(zones, self.cell_size)
+        with self._lock:
+            self._indexes[hospital_id] = index
+        return index
+
+    def process(self, positions: dict) -> list:
+        """
+        새로 계산된 위치 좌표로 구역 출입을 확인하는 함수
+        처음 위치가 계산된 환자는 지금 있는 구역만 기억하고 알리지 않는다
+        :param positions: 환자 ID -> (도면 상에서 환자의 x좌표, y좌표)
+        :return: [(환자 ID, CompiledZone, ENTER 또는 EXIT), ...]
+        """
+        transitions = []
+        for patient_id, (drawing_patient_x, drawing_patient_y) in positions.items():
+            # 위치 좌표를 계산하면서 캐시에 들어간 값이므로 쿼리가 발생하지 않는다
+            hospital_id = calibration_cache.hospital_id_for_patient(patient_id)
+            if hospital_id is None:
+                continue
+            index = self.index_for_hospital(hospital_id)
+            current = index.zones_at(drawing_patient_x, drawing_patient_y)
+            with self._lock:
+                previous = self._states.get(patient_id)
+                self._states[patient_id] = current
+            if previous is None or previous == current:
+                continue
+            transitions += [(patient_id, index.zones[zone_id], ENTER) for zone_id in current - previous]
+            # 그 사이에 지워진 구역에서는 나온 것으로 보지 않는다
+            transitions += [(patient_id, index.zones[zone_id], EXIT)
+                            for zone_id in previous - current if zone_id in index.zones]
+        if transitions:
+            self._alert(transitions, positions)
+        return transitions
+
+    def _alert(self, transitions, positions):
+        alerting = [
+            (patient_id, zone, event) for patient_id, zone, event in transitions
+            if (zone.alert_on_enter if event == ENTER else zone.alert_on_exit)
+        ]
+        fall_risk = self.fall_risk_for_patients({patient_id for patient_id, _, _ in alerting})
+        for patient_id, zone, event in transitions:
+            alerted = (patient_id, zone, event) in alerting and fall_risk.get(patient_id, False)
+            GEOFENCE_EVENTS.inc(event=event, alerted="true" if alerted else "false")
+            log_event(logger, logging.INFO, "zone " + event, patient_id=patient_id, zone_id=zone.id, alerted=alerted)
+            if alerted:
+                drawing_patient_x, drawing_patient_y = positions[patient_id]
+                send_zone_alert_by_fcm(patient_id, zone, event, drawing_patient_x, drawing_patient_y)
+
+    def fall_risk_for_patients(self, patient_ids) -> dict:
+        """
+        :param patient_ids: 환자 ID 들
+        :return: 환자 ID -> 낙상 위험 여부 (캐시에 없는 환자만 쿼리 1번)
+        """
+        missing = [patient_id for patient_id in patient_ids if patient_id not in self._fall_risk]
+        if missing:
+            rows = Patient.objects.filter(pk__in=missing).values_list("pk", "fall_risk")
+            with self._lock:
+                self._fall_risk.update(rows)
+        return {patient_id: self._fall_risk.get(patient_id, False) for patient_id in patient_ids}
+
+    def invalidate_hospital(self, hospital_id):
+        with self._lock:
+            self._indexes.pop(hospital_id, None)
+
+    def invalidate_patient(self, patient_id):
+        with self._lock:
+            self._fall_risk.pop(patient_id, None)
+
+    def forget_patient(self, patient_id):
+        with self._lock:
+            self._fall_risk.pop(patient_id, None)
+            self._states.pop(patient_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._states.clear()
+            self._fall_risk.clear()
+
+
+def send_zone_alert_by_fcm(patient_id, zone: CompiledZone, event, drawing_patient_x, drawing_patient_y):
+    """
+    낙상 위험 환자의 구역 출입을 담당 의료진과 같은 병원의 근무 중인 의료진에게 알리는 함수
+    :param patient_id: 환자 ID
+    :param zone: 들어가거나 나온 구역
+    :param event: ENTER 또는 EXIT
+    :param drawing_patient_x: 도면 상에서 환자의 x좌표
+    :param drawing_patient_y: 도면 상에서 환자의 y좌표
+    :return: none
+    """
+    patient = Patient.objects.only("id", "name", "profile_id").filter(pk=patient_id).first()
+    if patient is None:
+        return
+    tokens = get_care_team_tokens(patient)
+    body = f'{patient.name} 환자가 {zone.name}에 들어갔습니다' if event == ENTER \
+        else f'{patient.name} 환자가 {zone.name}에서 나왔습니다'
+    dispatcher = get_fcm_dispatcher()
+    for start in range(0, len(tokens), MULTICAST_TOKEN_LIMIT):
+        dispatcher.enqueue_multicast(messaging.MulticastMessage(
+            notification=messaging.Notification(title='낙상 위험 환자 구역 알림', body=body),
+            data={
+                "id": f"{patient.id}",
+                "zone": f"{zone.id}",
+                "event": event,
+                "x": f"{drawing_patient_x}",
+                "y": f"{drawing_patient_y}",
+            },
+            tokens=tokens[start:start + MULTICAST_TOKEN_LIMIT],
+        ), on_result=prune_unregistered_tokens)
+
+
+geofence_engine = GeofenceEngine(cell_size=settings.GEOFENCE["CELL_SIZE"])
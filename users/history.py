@@ -0,0 +1,215 @@
+import atexit
+import logging
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .models import Patient, PositionChunk
+
+logger = logging.getLogger(__name__)
+
+# 좌표 1개 = (구간 시작부터 지난 시간 ms, 도면 상 x좌표, 도면 상 y좌표), 12 bytes
+POINT = struct.Struct("<Iff")
+POINT_DTYPE = np.dtype([("offset", "<u4"), ("x", "<f4"), ("y", "<f4")])
+
+
+def bucket_of(timestamp: float, bucket_seconds: int) -> int:
+    """
+    :param timestamp: unix time (초)
+    :param bucket_seconds: 구간 길이 (초)
+    :return: timestamp 가 속한 구간의 시작 시각 (unix time, 초)
+    """
+    return int(timestamp // bucket_seconds) * bucket_seconds
+
+
+class PositionHistoryWriter:
+    """
+    위치 좌표를 메모리에 모아두었다가 백그라운드 스레드에서 묶어서 저장하는 기록기
+    (환자, 구간) 마다 PositionChunk 1행에 좌표를 이어붙이므로, 한 번 저장할 때 쿼리 수는 좌표 수와 상관없다
+    """
+    def __init__(self, bucket_seconds=60, flush_size=1000, flush_interval=1.0):
+        """
+        :param bucket_seconds: PositionChunk 1행이 담는 구간 길이 (초)
+        :param flush_size: 이만큼 좌표가 모이면 바로 저장
+        :param flush_interval: 좌표가 적어도 이 시간마다 저장 (초)
+        """
+        self.bucket_seconds = bucket_seconds
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._buffer = {}  # (환자 ID, 구간 시작 시각) -> bytearray
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def append(self, positions: dict, timestamp=None):
+        """
+        :param positions: 환자 ID -> (도면 상에서 환자의 x좌표, y좌표)
+        :param timestamp: 좌표를 계산한 시각 (unix time, 초), 없으면 지금
+        :return: none
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        bucket_start = bucket_of(timestamp, self.bucket_seconds)
+        point_offset = int((timestamp - bucket_start) * 1000)
+        with self._lock:
+            for patient_id, (drawing_patient_x, drawing_patient_y) in positions.items():
+                chunk = self._buffer.setdefault((patient_id, bucket_start), bytearray())
+                chunk += POINT.pack(point_offset, drawing_patient_x, drawing_patient_y)
+            self._buffered += len(positions)
+            buffered = self._buffered
+        self._start()
+        if buffered >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        모아둔 좌표를 저장하는 함수
+        이미 있는 구간은 data 를 이어붙여 bulk_update 1번, 새 구간은 bulk_create 1번
+        """
+        with self._lock:
+            buffer, self._buffer, self._buffered = self._buffer, {}, 0
+        if not buffer:
+            return
+
+        try:
+            try:
+                self._save(buffer)
+            except IntegrityError:
+                # 조회한 뒤에 다른 프로세스가 같은 (환자, 구간) 을 먼저 만들었다 (transaction 은 취소됨)
+                # 이제는 있는 구간이므로 다시 저장하면 이어붙인다
+                self._save(buffer)
+        except Exception:
+            # 저장하지 못한 좌표는 버리지 않고 다음 저장 때 다시 시도 (DB 연결이 끊긴 경우 등)
+            self._rebuffer(buffer)
+            raise
+
+    def _save(self, buffer: dict):
+        patient_ids = {patient_id for patient_id, _ in buffer}
+        bucket_starts = {bucket_start for _, bucket_start in buffer}
+        with transaction.atomic():
+            existing = {
+                (chunk.patient_id, int(chunk.bucket_start.timestamp())): chunk
+                for chunk in PositionChunk.objects.select_for_update().filter(
+                    patient_id__in=patient_ids,
+                    bucket_start__in=[datetime.fromtimestamp(start, tz=timezone.utc) for start in bucket_starts],
+                )
+            }
+            updated, created = [], []
+            for (patient_id, bucket_start), data in buffer.items():
+                chunk = existing.get((patient_id, bucket_start))
+                if chunk is None:
+                    created.append(PositionChunk(
+                        patient_id=patient_id,
+                        bucket_start=datetime.fromtimestamp(bucket_start, tz=timezone.utc),
+                        count=len(data) // POINT.size,
+                        data=bytes(data),
+                    ))
+                else:
+                    chunk.data = bytes(chunk.data) + data
+                    chunk.count += len(data) // POINT.size
+                    updated.append(chunk)
+            if updated:
+                PositionChunk.objects.bulk_update(updated, fields=["data", "count"])
+            if created:
+                # 그 사이에 삭제된 환자의 좌표는 버린다
+                alive = set(Patient.objects.filter(
+                    pk__in={chunk.patient_id for chunk in created}
+                ).values_list("pk", flat=True))
+                PositionChunk.objects.bulk_create([chunk for chunk in created if chunk.patient_id in alive])
+
+    def _rebuffer(self, buffer: dict):
+        # 저장하지 못한 좌표를 그 사이에 모인 좌표 앞에 다시 넣는다
+        with self._lock:
+            for key, data in buffer.items():
+                self._buffer[key] = data + self._buffer.get(key, bytearray())
+                self._buffered += len(data) // POINT.size
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="position-history-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                # 오래 실행되는 스레드이므로 요청 처리 때처럼 끊어진 / 오래된 DB 연결을 정리
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("position history flush failed")
+
+
+def get_position_history(patient_id, start: float, end: float, max_points: int) -> list:
+    """
+    환자의 위치 이력을 조회하는 함수
+    좌표가 max_points 개보다 많으면 시간 순서대로 max_points 개의 묶음으로 나누어 평균을 낸다
+    :param patient_id: 환자 ID
+    :param start: 조회 시작 시각 (unix time, 초)
+    :param end: 조회 끝 시각 (unix time, 초)
+    :param max_points: 최대 좌표 수
+    :return: [{"timestamp": , "x": , "y": }, ...]
+    """
+    bucket_seconds = settings.POSITION_HISTORY["BUCKET_SECONDS"]
+    chunks = PositionChunk.objects.filter(
+        patient_id=patient_id,
+        bucket_start__gte=datetime.fromtimestamp(bucket_of(start, bucket_seconds), tz=timezone.utc),
+        bucket_start__lt=datetime.fromtimestamp(end, tz=timezone.utc),
+    ).order_by("bucket_start").values_list("bucket_start", "data")
+
+    timestamps, xs, ys = [], [], []
+    for bucket_start, data in chunks:
+        points = np.frombuffer(bytes(data), dtype=POINT_DTYPE)
+        timestamps.append(bucket_start.timestamp() + points["offset"] / 1000.0)
+        xs.append(points["x"])
+        ys.append(points["y"])
+    if not timestamps:
+        return []
+    timestamps, xs, ys = np.concatenate(timestamps), np.concatenate(xs), np.concatenate(ys)
+    # 한 구간 안에서도 여러 프로세스가 이어붙였을 수 있으므로 시간 순서로 정렬
+    order = np.argsort(timestamps, kind="stable")
+    timestamps, xs, ys = timestamps[order], xs[order].astype(np.float64), ys[order].astype(np.float64)
+    selected = (timestamps >= start) & (timestamps <= end)
+    timestamps, xs, ys = timestamps[selected], xs[selected], ys[selected]
+
+    if len(timestamps) > max_points > 0:
+        # 서버에서 다운샘플링 (묶음별 평균)
+        boundaries = np.linspace(0, len(timestamps), max_points + 1).astype(np.int64)[:-1]
+        sizes = np.diff(np.append(boundaries, len(timestamps)))
+        timestamps = np.add.reduceat(timestamps, boundaries) / sizes
+        xs = np.add.reduceat(xs, boundaries) / sizes
+        ys = np.add.reduceat(ys, boundaries) / sizes
+
+    return [{"timestamp": t, "x": x, "y": y} for t, x, y in zip(timestamps.tolist(), xs.tolist(), ys.tolist())]
+
+
+def prune_position_history(retention_days=None) -> int:
+    """
+    보관 기간이 지난 위치 이력 구간을 지우는 함수 (bucket_start 인덱스로 DELETE 1번)
+    :param retention_days: 보관 기간 (일), 없으면 settings.POSITION_HISTORY["RETENTION_DAYS"]
+    :return: 지운 구간 수
+    """
+    if retention_days is None:
+        retention_days = settings.POSITION_HISTORY["RETENTION_DAYS"]
+    cutoff = datetime.now(tz=timezone.utc) - timedelta(days=retention_days)
+    deleted, _ = PositionChunk.objects.filter(bucket_start__lt=cutoff).delete()
+    return deleted
+
+
+position_history = PositionHistoryWriter(
+    bucket_seconds=settings.POSITION_HISTORY["BUCKET_SECONDS"],
+    flush_size=settings.POSITION_HISTORY["FLUSH_SIZE"],
+    flush_interval=settings.POSITION_HISTORY["FLUSH_INTERVAL"],
+)
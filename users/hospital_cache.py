@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+
+from rest_framework.response import Response
+
+from .models import Hospital
+from .serializers import HospitalREADAllSerializer, HospitalREADOneSerializer
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """
+    직렬화까지 끝낸 응답 데이터와, 응답 형식 (JSON, MessagePack) 별로 만들어둔 본문
+    """
+    data: object
+    last_modified: datetime  # 없으면 None
+    expires: float  # time.monotonic() 기준 만료 시각
+    bodies: dict = field(default_factory=dict, compare=False)  # media type -> (본문, 본문의 sha1 strong ETag)
+
+    def rendered(self, renderer) -> tuple:
+        """
+        :param renderer: 요청과 협상된 DRF renderer
+        :return: (본문, ETag), 형식마다 처음 한 번만 만든다
+        """
+        rendered = self.bodies.get(renderer.media_type)
+        if rendered is None:
+            body = renderer.render(self.data)
+            rendered = self.bodies[renderer.media_type] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        return rendered
+
+    def response(self, request):
+        """
+        :param request: If-None-Match / If-Modified-Since 가 있을 수 있는 요청 (DRF Request)
+        :return: 바뀌지 않았으면 본문 없는 304, 아니면 200
+        """
+        renderer = request.accepted_renderer
+        if renderer.format == "api":
+            # browsable API 는 캐시하지 않고 그대로 보여줌
+            return Response(self.data)
+        body, etag = self.rendered(renderer)
+        if self.not_modified(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type if not renderer.charset \
+                else f"{renderer.media_type}; charset={renderer.charset}"
+            response = HttpResponse(body, content_type=content_type)
+        response["ETag"] = etag
+        response["Vary"] = "Accept"
+        if self.last_modified is not None:
+            response["Last-Modified"] = http_date(self.last_modified.timestamp())
+        # 매번 서버에 확인 (조건부 요청) 하되, 바뀌지 않았으면 본문을 다시 받지 않는다
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def not_modified(self, request, etag) -> bool:
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # GZipMiddleware 가 strong ETag 를 W/ 로 바꿔 보내므로 weak 비교
+            etags = [candidate.removeprefix("W/") for candidate in parse_etags(if_none_match)]
+            return "*" in etags or etag in etags
+        if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return (if_modified_since is not None and self.last_modified is not None
+                and int(self.last_modified.timestamp()) <= if_modified_since)
+
+
+class HospitalResponseCache:
+    """
+    병원 전체 조회 / 병원 1개 조회 응답을 저장하는 캐시 (프로세스 메모리)
+    캐시에 있으면 쿼리 0번, 직렬화 0번
+    Hospital 이 바뀌면 signals 에서 해당 병원과 병원 전체 조회 항목을 지운다
+    다른 프로세스에서 바뀐 병원은 settings.HOSPITAL_RESPONSE_CACHE_TTL 초 안에 반영된다
+    """
+    ALL = "all"
+
+    def __init__(self):
+        self._responses = {}  # 병원 ID 또는 ALL -> CachedResponse
+        self._lock = threading.Lock()
+
+    def for_all(self) -> CachedResponse:
+        """
+        :return: 병원 전체 조회 응답
+        """
+        cached = self._get(self.ALL)
+        if cached is not None:
+            return cached
+        hospitals = list(Hospital.objects.only("id", "name"))
+        data = HospitalREADAllSerializer(hospitals, many=True).data
+        # 병원을 지우거나 updated_at 이 없는 병원은 max(updated_at) 을 바꾸지 않으므로 Last-Modified 없이 ETag 만 사용
+        return self._store(self.ALL, data, last_modified=None)
+
+    def for_hospital(self, hospital_id):
+        """
+        :param hospital_id: 병원 ID
+        :return: 병원 1개 조회 응답, 병원이 없으면 None
+        """
+        cached = self._get(hospital_id)
+        if cached is not None:
+            return cached
+        hospital = Hospital.objects.filter(pk=hospital_id).first()
+        if hospital is None:
+            return None
+        return self._store(hospital_id, HospitalREADOneSerializer(hospital).data, hospital.updated_at)
+
+    def _get(self, key):
+        cached = self._responses.get(key)
+        if cached is None or cached.expires < time.monotonic():
+            return None
+        return cached
+
+    def _store(self, key, data, last_modified) -> CachedResponse:
+        cached = CachedResponse(
+            data=data,
+            last_modified=last_modified,
+            expires=time.monotonic() + settings.HOSPITAL_RESPONSE_CACHE_TTL,
+        )
+        with self._lock:
+            self._responses[key] = cached
+        return cached
+
+    def invalidate_hospital(self, hospital_id):
+        with self._lock:
+            self._responses.pop(hospital_id, None)
+            self._responses.pop(self.ALL, None)
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+
+
+hospital_response_cache = HospitalResponseCache()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import math
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .logs import log_event, log_sampled
+from .metrics import REGISTRY
+from .ranging import process_readings
+
+logger = logging.getLogger(__name__)
+
+# 기지국 -> 서버 거리 값 1개 (network byte order, 24 bytes)
+# 기지국 이름 (ASCII, 4 bytes, 남는 자리는 \0), 환자 ID, 거리 값 (m), 기지국별 순번, 측정 시각 (unix time, ms)
+FRAME = struct.Struct("!4sIfIQ")
+
+INGEST_DROPPED = REGISTRY.counter(
+    "igo_ingest_dropped_total", "Binary ingest frames dropped before ranging", labelnames=("reason",),
+)
+INGEST_FLUSHES = REGISTRY.histogram(
+    "igo_ingest_flush_duration_seconds", "Time spent applying one batch of binary ingest readings",
+)
+
+
+def encode_frame(station: str, patient_id: int, real_distance: float, sequence: int, timestamp_ms: int) -> bytes:
+    """
+    :return: 기지국 펌웨어가 보내는 것과 같은 frame (테스트, 벤치마크용)
+    """
+    return FRAME.pack(station.encode("ascii"), patient_id, real_distance, sequence, timestamp_ms)
+
+
+def decode_frames(data: bytes) -> list:
+    """
+    :param data: frame 여러 개를 이어붙인 bytes (길이가 FRAME.size 의 배수)
+    :return: process_readings() 에 넘길 거리 값 목록 (잘못된 frame 은 버림)
+    """
+    readings = []
+    for station, patient_id, real_distance, sequence, timestamp_ms in FRAME.iter_unpack(data):
+        station = station.rstrip(b"\0").decode("ascii", errors="replace")
+        # 음수, NaN, inf 거리 값이나 이름이 없거나 출력할 수 없는 문자인 기지국 (어긋나게 읽은 frame 등) 은 버림
+        if not (station and station.isascii() and station.isprintable()) \
+                or not (math.isfinite(real_distance) and real_distance >= 0.0):
+            INGEST_DROPPED.inc(reason="invalid")
+            continue
+        readings.append({
+            "patient_id": patient_id,
+            "station": station,
+            "real_distance": real_distance,
+            "sequence": sequence,
+            "timestamp": timestamp_ms / 1000.0,
+        })
+    return readings
+
+
+class RangingIngestServer:
+    """
+    기지국이 UDP datagram 또는 TCP stream 으로 보내는 binary frame 을 받아서 위치 계산에 넘기는 asyncio 서버
+    받은 거리 값은 모아두었다가 flush_interval 초마다 (또는 flush_size 개가 모이면) 전용 스레드에서
+    process_readings() 로 한 번에 반영하므로, 저장은 묶음마다 UPDATE 1번이다
+    """
+    def __init__(self, flush_interval=0.05, flush_size=1000, max_pending=100000):
+        """
+        :param flush_interval: 모아둔 거리 값을 반영하는 간격 (초)
+        :param flush_size: 이만큼 모이면 간격을 기다리지 않고 반영
+        :param max_pending: 반영이 밀려서 이만큼 쌓이면 새로 받은 거리 값은 버림
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+
+        self._pending = {"udp": [], "tcp": []}  # 경로 -> 거리 값 목록
+        self._flush_requested = None
+        # ORM 은 동기 코드이므로 스레드 1개에서 순서대로 반영
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ranging-ingest")
+
+    def submit(self, data: bytes, transport: str):
+        """
+        :param data: 받은 frame 들 (이벤트 루프 스레드에서 호출)
+        :param transport: "udp" 또는 "tcp"
+        """
+        if len(data) % FRAME.size:
+            INGEST_DROPPED.inc(reason="malformed")
+            log_sampled(logger, logging.WARNING, "malformed ingest datagram", transport=transport, size=len(data))
+            return
+        readings = decode_frames(data)
+        pending = self._pending[transport]
+        if len(pending) + len(readings) > self.max_pending:
+            INGEST_DROPPED.inc(len(readings), reason="backlog")
+            return
+        pending.extend(readings)
+        if len(pending) >= self.flush_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    async def serve(self, host, udp_port=None, tcp_port=None):
+        """
+        flush 루프를 돌리면서 UDP / TCP 로 frame 을 받는 함수 (취소될 때까지 실행)
+        """
+        loop = asyncio.get_running_loop()
+        self._flush_requested = asyncio.Event()
+        closers = []
+        if udp_port is not None:
+            udp_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(host, udp_port),
+            )
+            closers.append(udp_transport.close)
+            log_event(logger, logging.INFO, "ranging ingest listening", transport="udp", host=host, port=udp_port)
+        if tcp_port is not None:
+            tcp_server = await asyncio.start_server(self._handle_stream, host, tcp_port)
+            closers.append(tcp_server.close)
+            log_event(logger, logging.INFO, "ranging ingest listening", transport="tcp", host=host, port=tcp_port)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_requested.clear()
+                await self.flush()
+        finally:
+            for close in closers:
+                close()
+            await self.flush()
+            self._executor.shutdown(wait=True)
+
+    async def flush(self):
+        """
+        모아둔 거리 값을 전용 스레드에서 반영하는 함수
+        """
+        loop = asyncio.get_running_loop()
+        for transport, pending in self._pending.items():
+            if not pending:
+                continue
+            self._pending[transport] = []
+            try:
+                await loop.run_in_executor(self._executor, self._apply, pending, transport)
+            except Exception:
+                logger.exception("ranging ingest flush failed")
+
+    @staticmethod
+    def _apply(readings, transport):
+        # 오래 실행되는 스레드이므로 요청 처리 때처럼 끊어진 / 오래된 DB 연결을 정리
+        close_old_connections()
+        with INGEST_FLUSHES.time():
+            results = process_readings(readings, source=transport)
+        not_found = sum(result["status"] == "not_found" for result in results)
+        if not_found:
+            INGEST_DROPPED.inc(not_found, reason="not_found")
+
+    async def _handle_stream(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        buffer = b""
+        try:
+            while True:
+                # frame 단위로 끊어 넘기고, 끝에 남은 조각은 다음에 읽은 데이터와 이어붙임
+                data = await reader.read(FRAME.size * 256)
+                if not data:
+                    break
+                buffer += data
+                complete = len(buffer) - len(buffer) % FRAME.size
+                if complete:
+                    self.submit(buffer[:complete], "tcp")
+                    buffer = buffer[complete:]
+        except ConnectionError:
+            pass
+        finally:
+            # 연결이 끊겨서 남은 조각은 버림
+            if buffer:
+                INGEST_DROPPED.inc(reason="malformed")
+            writer.close()
+            log_sampled(logger, logging.INFO, "ranging ingest connection closed", peer=str(peer))
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: RangingIngestServer):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.submit(data, "udp")
@@ -0,0 +1,52 @@
+import json
+import logging
+import random
+
+from django.conf import settings
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    로그 1개를 JSON 한 줄로 남기는 formatter
+    log_event / log_sampled 로 넘긴 필드가 그대로 JSON 키가 된다
+    """
+    def format(self, record):
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def log_event(logger, level, message, **fields):
+    """
+    구조화된 로그를 남기는 함수
+    :param logger: logging.Logger
+    :param level: 로그 레벨
+    :param message: 메시지
+    :param fields: JSON 으로 함께 남길 값
+    :return: none
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def log_sampled(logger, level, message, **fields):
+    """
+    요청이 많은 경로(hot path)용 로그, settings.HOT_PATH_LOG_SAMPLE_RATE 비율만 남긴다 (WARNING 이상은 항상)
+    :param logger: logging.Logger
+    :param level: 로그 레벨
+    :param message: 메시지
+    :param fields: JSON 으로 함께 남길 값
+    :return: none
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING and random.random() >= settings.HOT_PATH_LOG_SAMPLE_RATE:
+        return
+    logger.log(level, message, extra={"fields": fields})
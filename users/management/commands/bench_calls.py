@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from users.calibration import calibration_cache
+from users.call_debounce import call_debouncer
+from users.fcm import get_fcm_dispatcher, reset_fcm_dispatcher
+from users.management.commands.bench_load import Command as LoadBenchmark
+
+# (종류, 동기 view 경로, async view 경로)
+CALLS = (
+    ("call_patient", "/users/call/patient/{}/", "/users/call/async/patient/{}/"),
+    ("call_doctor", "/users/call/doctor/patient/{}/", "/users/call/async/doctor/patient/{}/"),
+)
+
+
+class Command(BaseCommand):
+    help = ("테스트 데이터베이스와 FCM stub 으로 같은 호출 N개를 동기 view (WSGI, 워커 스레드 W개), "
+            "동기 view (ASGI), async view (ASGI) 로 보내고 (ASGI 는 이벤트 루프 1개, 동시에 C개), "
+            "모든 FCM 메시지가 발송될 때까지의 시간, p50/p95/p99 지연 시간, 최대 스레드 수를 비교하는 벤치마크")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospitals", type=int, default=2, help="병원 수")
+        parser.add_argument("--patients", type=int, default=50, help="병원당 환자 수")
+        parser.add_argument("--calls", type=int, default=1000, help="보낼 호출 수 (환자 호출, 의료진 호출 반반)")
+        parser.add_argument("--workers", type=int, default=8, help="WSGI 동기 워커 수 (gunicorn sync worker 흉내)")
+        parser.add_argument("--concurrency", type=int, default=200, help="ASGI 에서 동시에 처리 중인 최대 호출 수")
+        parser.add_argument("--fcm-latency", type=float, default=0.05, help="FCM stub 의 왕복 시간 (초)")
+        parser.add_argument("--fcm-workers", type=int, default=16, help="FCM 발송기 워커 스레드 수")
+        parser.add_argument("--conn-max-age", type=int, default=500, help="DB 연결 유지 시간 (초, settings 의 DATABASE_URL 설정과 같게)")
+        parser.add_argument("--debounce", action="store_true",
+                            help="같은 환자의 호출을 합치는 창을 그대로 둠 (기본은 끄고 모든 호출을 보냄)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default=None, help="결과를 저장할 JSON 파일")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        temp_dir = None
+        if connection.vendor == "sqlite":
+            # 메모리 SQLite 는 스레드끼리 테이블 잠금이 바로 실패하므로 파일로 만든다
+            temp_dir = tempfile.mkdtemp(prefix="bench_calls")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(temp_dir, "bench.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # 배포 환경 (DATABASE_URL) 처럼 DB 연결을 요청마다 닫지 않고 재사용
+        connections.settings[connection.alias]["CONN_MAX_AGE"] = options["conn_max_age"]
+        debounce_window = call_debouncer.window
+        if not options["debounce"]:
+            call_debouncer.window = 0
+        try:
+            with override_settings(FCM_DISPATCHER=dict(
+                TRANSPORT="users.fcm.StubTransport", WORKERS=options["fcm_workers"], BATCH_SIZE=500,
+                MAX_RETRIES=0, RETRY_BACKOFF=0.0, LINGER=0.01,
+            )):
+                rng = random.Random(options["seed"])
+                patients = LoadBenchmark._populate(rng, options["hospitals"], options["patients"], 3)
+                calls = [(CALLS[index % len(CALLS)], rng.choice(patients)[0]) for index in range(options["calls"])]
+                results = {
+                    "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+                    "commit": LoadBenchmark._commit(),
+                    "python": platform.python_version(),
+                    "database": connection.vendor,
+                    "config": {key: options[key] for key in (
+                        "hospitals", "patients", "calls", "workers", "concurrency", "fcm_latency", "fcm_workers", "conn_max_age", "debounce", "seed",
+                    )},
+                    "modes": {
+                        "wsgi": self._measure(self._run_wsgi, calls, options),
+                        "asgi_sync": self._measure(self._run_asgi, calls, options, asynchronous=False),
+                        "asgi": self._measure(self._run_asgi, calls, options, asynchronous=True),
+                    },
+                }
+        finally:
+            call_debouncer.window = debounce_window
+            call_debouncer.clear()
+            reset_fcm_dispatcher()
+            calibration_cache.clear()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"saved {options['output']}")
+
+    def _measure(self, run, calls, options, **kwargs) -> dict:
+        """
+        :param run: 호출을 모두 보내고 [(종류, 지연 시간, 쿼리 수, 성공 여부), ...] 를 돌려주는 함수
+        :param kwargs: run 에 넘길 값
+        :return: 모든 FCM 메시지가 발송될 때까지의 시간, 최대 스레드 수, 종류별 지연 시간
+        """
+        reset_fcm_dispatcher()
+        calibration_cache.clear()
+        call_debouncer.clear()
+        transport = get_fcm_dispatcher().transport
+        transport.latency = options["fcm_latency"]
+
+        # 실행 중인 스레드 수를 주기적으로 기록하고, 새로 연 DB 연결 수를 센다
+        peak_threads = threading.active_count()
+        sampling = threading.Event()
+        db_connections = 0
+
+        def count_connection(**kwargs):
+            nonlocal db_connections
+            db_connections += 1
+
+        def sample_threads():
+            nonlocal peak_threads
+            while not sampling.wait(0.005):
+                peak_threads = max(peak_threads, threading.active_count())
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        connection_created.connect(count_connection)
+        started = time.perf_counter()
+        try:
+            samples = run(calls, options, **kwargs)
+            responded = time.perf_counter() - started
+            get_fcm_dispatcher().flush()
+            delivered = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+            sampling.set()
+            sampler.join()
+
+        return {
+            "responded_elapsed": responded,
+            "delivered_elapsed": delivered,
+            "delivered_calls_per_second": len(calls) / delivered,
+            # 벤치마크 스레드 (메인, 기록용) 는 빼고 센다
+            "peak_threads": peak_threads - 1,
+            "db_connections": db_connections,
+            "fcm": {"sent": len(transport.sent), "batches": transport.batches},
+            "endpoints": {
+                kind: LoadBenchmark._summarize([sample for sample in samples if kind in ("all", sample[0])], responded)
+                for kind in ("all", *(kind for kind, _, _ in CALLS))
+            },
+        }
+
+    @staticmethod
+    def _run_wsgi(calls, options) -> list:
+        # 동기 view 는 FCM 발송 큐에 넣고 바로 응답하므로, 발송이 끝난 시각은 발송기 flush 로 잰다
+        local = threading.local()
+
+        def request(call):
+            (kind, path, _), patient_id = call
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(raise_request_exception=False)
+            sent = time.perf_counter()
+            response = client.get(path.format(patient_id))
+            return kind, time.perf_counter() - sent, 0, response.status_code < 400
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            return list(executor.map(request, calls))
+
+    @staticmethod
+    def _run_asgi(calls, options, asynchronous) -> list:
+        # IGO/asgi.py 의 application 에 ASGI 요청을 직접 보낸다 (uvicorn 없이)
+        from IGO.asgi import application
+
+        async def request(semaphore, call):
+            (kind, sync_path, async_path), patient_id = call
+            path = (async_path if asynchronous else sync_path).format(patient_id)
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+            }
+            status = 500
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+
+            async with semaphore:
+                sent = time.perf_counter()
+                await application(scope, receive, send)
+                return kind, time.perf_counter() - sent, 0, status < 400
+
+        async def run():
+            semaphore = asyncio.Semaphore(options["concurrency"])
+            return await asyncio.gather(*(request(semaphore, call) for call in calls))
+
+        return asyncio.run(run())
+
+    def _report(self, results):
+        config = results["config"]
+        self.stdout.write(
+            f"{config['calls']} call(s), {config['hospitals']} hospital(s) x {config['patients']} patient(s), "
+            f"WSGI {config['workers']} worker(s), ASGI concurrency {config['concurrency']}, "
+            f"FCM latency {config['fcm_latency']}s, commit {results['commit']}"
+        )
+        self.stdout.write(f"{'mode':<11}{'endpoint':<14}{'calls':>7}{'errors':>8}"
+                          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'delivered/s':>13}{'threads':>9}{'db conns':>10}")
+        for mode, measured in results["modes"].items():
+            for kind, summary in measured["endpoints"].items():
+                if not summary["requests"]:
+                    continue
+                latency = summary["latency_ms"]
+                extra = (f"{measured['delivered_calls_per_second']:>13.1f}{measured['peak_threads']:>9}"
+                         f"{measured['db_connections']:>10}" if kind == "all" else "")
+                self.stdout.write(
+                    f"{mode:<11}{kind:<14}{summary['requests']:>7}{summary['errors']:>8}"
+                    f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}{extra}"
+                )
+        self.stdout.write("all FCM messages sent after: " + ", ".join(
+            f"{mode} {measured['delivered_elapsed']:.2f}s ({measured['fcm']['sent']} message(s))"
+            for mode, measured in results["modes"].items()
+        ))
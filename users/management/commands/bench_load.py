@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from users.calibration import calibration_cache
+from users.call_debounce import call_debouncer
+from users.fcm import get_fcm_dispatcher, reset_fcm_dispatcher
+from users.history import position_history
+from users.models import Hospital, Patient, Station
+from users.ranging import ranging_accumulator
+
+# 실제 병원 크기 (0.1mm 단위, 100m x 50m), 도면 크기 (px)
+REAL_X, REAL_Y = 1000000, 500000
+DRAWING_X, DRAWING_Y = 1000, 500
+# 환자가 1초에 움직이는 최대 거리 (m)
+WALK_SPEED = 1.0
+
+
+class Command(BaseCommand):
+    help = ("테스트 데이터베이스와 FCM stub 으로 M개 병원 x N명 환자 x K개 기지국의 거리 값 전송과 "
+            "환자 / 의료진 호출을 섞어 보내고 처리량, p50/p95/p99 지연 시간, 요청당 쿼리 수를 JSON 으로 남기는 부하 벤치마크")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospitals", type=int, default=2, help="병원 수 (M)")
+        parser.add_argument("--patients", type=int, default=50, help="병원당 환자 수 (N)")
+        parser.add_argument("--anchors", type=int, default=3, help="병원당 기지국 수 (K)")
+        parser.add_argument("--rate", type=float, default=1.0, help="기지국 1개가 환자 1명의 거리 값을 보내는 빈도 (Hz)")
+        parser.add_argument("--calls", type=float, default=1.0, help="초당 호출 수 (환자 호출, 의료진 호출 반반)")
+        parser.add_argument("--duration", type=float, default=10.0, help="부하 시간 (초)")
+        parser.add_argument("--concurrency", type=int, default=1, help="요청을 보내는 스레드 수")
+        parser.add_argument("--unpaced", action="store_true", help="일정을 무시하고 최대한 빨리 보냄 (최대 처리량 측정)")
+        parser.add_argument("--fcm-latency", type=float, default=0.05, help="FCM stub 의 왕복 시간 (초)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default=None, help="결과를 저장할 JSON 파일")
+        parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON 파일")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        temp_dir = None
+        if connection.vendor == "sqlite":
+            # 메모리 SQLite 는 스레드끼리 테이블 잠금이 바로 실패하므로 파일로 만든다
+            temp_dir = tempfile.mkdtemp(prefix="bench_load")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(temp_dir, "bench.sqlite3")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(FCM_DISPATCHER=dict(
+                TRANSPORT="users.fcm.StubTransport", WORKERS=2, BATCH_SIZE=500,
+                MAX_RETRIES=0, RETRY_BACKOFF=0.0, LINGER=0.01,
+            )):
+                reset_fcm_dispatcher()
+                get_fcm_dispatcher().transport.latency = options["fcm_latency"]
+                calibration_cache.clear()
+                ranging_accumulator.clear()
+                call_debouncer.clear()
+                results = self._run(options)
+                get_fcm_dispatcher().flush()
+                position_history.flush()
+                results["fcm"] = {"sent": len(get_fcm_dispatcher().transport.sent),
+                                  "batches": get_fcm_dispatcher().transport.batches}
+                reset_fcm_dispatcher()
+        finally:
+            calibration_cache.clear()
+            ranging_accumulator.clear()
+            call_debouncer.clear()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self._report(results)
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                self._compare(json.load(file), results)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"saved {options['output']}")
+
+    def _run(self, options) -> dict:
+        rng = random.Random(options["seed"])
+        patients = self._populate(rng, options["hospitals"], options["patients"], options["anchors"])
+        schedule = self._schedule(rng, patients, options)
+
+        samples = []
+        samples_lock = threading.Lock()
+        local = threading.local()
+        started = time.perf_counter()
+
+        def request(job):
+            scheduled, kind, path, data = job
+            if not options["unpaced"]:
+                delay = started + scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(raise_request_exception=False)
+            queries = 0
+
+            def count_queries(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            sent = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                if data is None:
+                    response = client.get(path)
+                else:
+                    response = client.post(path, data, content_type="application/json")
+            latency = time.perf_counter() - sent
+            with samples_lock:
+                samples.append((kind, latency, queries, response.status_code < 400))
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for _ in executor.map(request, schedule):
+                pass
+        elapsed = time.perf_counter() - started
+
+        return {
+            "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+            "commit": self._commit(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "config": {key: options[key] for key in (
+                "hospitals", "patients", "anchors", "rate", "calls", "duration",
+                "concurrency", "unpaced", "fcm_latency", "seed",
+            )},
+            "elapsed": elapsed,
+            "endpoints": {
+                kind: self._summarize([sample for sample in samples if kind in ("all", sample[0])], elapsed)
+                for kind in ("all", "station", "call_patient", "call_doctor")
+            },
+        }
+
+    @staticmethod
+    def _populate(rng, hospitals, patients_per_hospital, anchors) -> list:
+        """
+        :return: [(환자 ID, [(기지국 이름, 실제 x좌표, 실제 y좌표), ...]), ...]
+        """
+        patients = []
+        for hospital_index in range(hospitals):
+            hospital = Hospital.objects.create(
+                name=f"bench hospital {hospital_index}",
+                drawing_x=DRAWING_X, drawing_y=DRAWING_Y, real_x=REAL_X, real_y=REAL_Y,
+            )
+            # 기지국은 병원 테두리를 따라 고르게 배치
+            stations = []
+            for anchor_index in range(anchors):
+                angle = 2 * math.pi * anchor_index / anchors
+                stations.append(Station(
+                    hospital=hospital, name=f"S{anchor_index}",
+                    real_x=int(REAL_X / 2 * (1 + math.cos(angle))), real_y=int(REAL_Y / 2 * (1 + math.sin(angle))),
+                ))
+            Station.objects.bulk_create(stations)
+            user = User.objects.create_user(f"bench{hospital_index}", f"bench{hospital_index}@igo.test", "bench")
+            profile = user.profile
+            profile.hospital = hospital
+            profile.name = f"bench doctor {hospital_index}"
+            profile.token = f"bench-token-{hospital_index}"
+            profile.save()
+            Patient.objects.bulk_create([
+                Patient(profile=profile, name=f"bench patient {hospital_index}-{index}")
+                for index in range(patients_per_hospital)
+            ])
+            anchors_of_hospital = [(station.name, station.real_x, station.real_y) for station in stations]
+            patients += [(patient_id, anchors_of_hospital)
+                         for patient_id in profile.patient_set.values_list("pk", flat=True)]
+        return patients
+
+    @staticmethod
+    def _schedule(rng, patients, options) -> list:
+        """
+        :return: 보낼 시각 순서의 [(시작부터 지난 시간, 종류, 경로, 본문), ...]
+        """
+        duration, rate = options["duration"], options["rate"]
+        schedule = []
+        if rate > 0:
+            for patient_id, anchors in patients:
+                # 환자는 병원 안을 무작위로 걷고, 기지국마다 조금씩 다른 시각에 거리 값을 보낸다
+                x, y = rng.uniform(0, REAL_X), rng.uniform(0, REAL_Y)
+                tick = rng.uniform(0, 1 / rate)
+                while tick < duration:
+                    step = WALK_SPEED * 10000 / rate
+                    x = min(max(x + rng.uniform(-step, step), 0), REAL_X)
+                    y = min(max(y + rng.uniform(-step, step), 0), REAL_Y)
+                    for name, anchor_x, anchor_y in anchors:
+                        distance = math.hypot(x - anchor_x, y - anchor_y) / 10000.0
+                        schedule.append((tick + rng.uniform(0, 0.1 / rate), "station",
+                                         f"/users/send/station/{patient_id}/",
+                                         {"station": name, "real_distance": distance}))
+                    tick += 1 / rate
+        for index in range(int(options["calls"] * duration)):
+            patient_id, _ = rng.choice(patients)
+            if index % 2 == 0:
+                schedule.append((rng.uniform(0, duration), "call_patient", f"/users/call/patient/{patient_id}/", None))
+            else:
+                schedule.append((rng.uniform(0, duration), "call_doctor",
+                                 f"/users/call/doctor/patient/{patient_id}/", None))
+        schedule.sort(key=lambda job: job[0])
+        return schedule
+
+    @staticmethod
+    def _summarize(samples, elapsed) -> dict:
+        if not samples:
+            return {"requests": 0}
+        latencies = sorted(latency for _, latency, _, _ in samples)
+        queries = [count for _, _, count, _ in samples]
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(math.ceil(p / 100 * len(latencies))) - 1)] * 1000
+
+        return {
+            "requests": len(samples),
+            "errors": sum(not ok for _, _, _, ok in samples),
+            "throughput": len(samples) / elapsed,
+            "latency_ms": {
+                "mean": sum(latencies) / len(latencies) * 1000,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": latencies[-1] * 1000,
+            },
+            "queries_per_request": {"mean": sum(queries) / len(queries), "max": max(queries)},
+        }
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _report(self, results):
+        config = results["config"]
+        self.stdout.write(
+            f"{config['hospitals']} hospital(s) x {config['patients']} patient(s) x {config['anchors']} anchor(s), "
+            f"{config['rate']} Hz, {config['calls']} call(s)/s, {results['elapsed']:.1f}s, commit {results['commit']}"
+        )
+        self.stdout.write(f"{'endpoint':<14}{'requests':>10}{'errors':>8}{'req/s':>10}"
+                          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for kind, summary in results["endpoints"].items():
+            if not summary["requests"]:
+                continue
+            latency = summary["latency_ms"]
+            self.stdout.write(
+                f"{kind:<14}{summary['requests']:>10}{summary['errors']:>8}{summary['throughput']:>10.1f}"
+                f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+                f"{summary['queries_per_request']['mean']:>9.2f}"
+            )
+        self.stdout.write(f"fcm: {results['fcm']['sent']} message(s) in {results['fcm']['batches']} batch(es)")
+
+    def _compare(self, baseline, results):
+        self.stdout.write(f"compared with commit {baseline.get('commit')}:")
+        for kind, summary in results["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(kind, {})
+            if not summary["requests"] or not before.get("requests"):
+                continue
+            changes = [f"{name} {self._change(before['latency_ms'][name], summary['latency_ms'][name])}"
+                       for name in ("p50", "p95", "p99")]
+            changes.append("queries " + self._change(before["queries_per_request"]["mean"],
+                                                     summary["queries_per_request"]["mean"]))
+            self.stdout.write(f"  {kind:<14}" + ", ".join(changes))
+
+    @staticmethod
+    def _change(before, after) -> str:
+        if not before:
+            return f"{before:.2f} -> {after:.2f}"
+        return f"{(after - before) / before * 100:+.1f}%"
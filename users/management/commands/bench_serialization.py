@@ -0,0 +1,65 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from users.models import Hospital, Patient
+from users.renderers import FastJSONRenderer, MessagePackRenderer, orjson
+from users.serializers import HospitalREADOneSerializer, PatientREADSerializer
+
+
+class Command(BaseCommand):
+    help = ("병원 1개 조회 / 환자 목록 응답의 직렬화 시간과 크기를 JSON (DRF 기본), JSON (orjson), MessagePack, "
+            "gzip 압축별로 비교하는 마이크로 벤치마크 (데이터베이스 사용 안 함)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=500, help="환자 목록의 환자 수")
+        parser.add_argument("--repeat", type=int, default=20, help="반복 횟수 (가장 빠른 결과를 사용)")
+
+    def handle(self, *args, **options):
+        hospital = Hospital(
+            id=1, name="IGO 병원", drawing="https://example.com/drawing.png", drawing_x=1920, drawing_y=1080,
+            drawing_station1_x=100, drawing_station1_y=100, drawing_station2_x=1800, drawing_station2_y=100,
+            drawing_station3_x=100, drawing_station3_y=1000, real_x=1000000, real_y=500000,
+            real_station1_x=0, real_station1_y=0, real_station2_x=1000000, real_station2_y=0,
+            real_station3_x=0, real_station3_y=500000,
+        )
+        patients = [
+            Patient(id=index + 1, name=f"환자 {index}", gender=index % 2 == 0, age=20 + index % 70,
+                    blood_type=index % 4, blood_rh=index % 5 != 0, disease="고혈압, 당뇨 " * 5,
+                    extra="야간 낙상 주의, 보호자 연락처 010-0000-0000 " * 3, image=1 + index % 5,
+                    ip_address=f"10.0.{index // 256}.{index % 256}")
+            for index in range(options["patients"])
+        ]
+        cases = (
+            ("hospital", lambda: HospitalREADOneSerializer(hospital).data),
+            (f"patients x{len(patients)}", lambda: PatientREADSerializer(patients, many=True).data),
+            (f"patients x{len(patients)} id,name,image",
+             lambda: PatientREADSerializer(patients, many=True, fields=("id", "name", "image")).data),
+        )
+        renderers = (
+            ("json (drf)", JSONRenderer()),
+            ("json (orjson)" if orjson is not None else "json (fast, no orjson)", FastJSONRenderer()),
+            ("msgpack", MessagePackRenderer()),
+        )
+
+        repeat = options["repeat"]
+        self.stdout.write(f"{'payload':<34}{'format':<24}{'serialize ms':>13}{'render ms':>11}"
+                          f"{'bytes':>10}{'gzip bytes':>12}")
+        for name, serialize in cases:
+            serialize_time = min(self._measure(serialize) for _ in range(repeat))
+            data = serialize()
+            for renderer_name, renderer in renderers:
+                render_time = min(self._measure(lambda: renderer.render(data)) for _ in range(repeat))
+                body = renderer.render(data)
+                self.stdout.write(
+                    f"{name:<34}{renderer_name:<24}{serialize_time * 1000:>13.3f}{render_time * 1000:>11.3f}"
+                    f"{len(body):>10,}{len(gzip.compress(body)):>12,}"
+                )
+
+    @staticmethod
+    def _measure(function):
+        started = time.perf_counter()
+        function()
+        return time.perf_counter() - started
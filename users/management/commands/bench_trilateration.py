@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from users.multilateration import MultilaterationSolver
+from users.utils import polypoint
+
+
+class Command(BaseCommand):
+    help = "삼변측량 스칼라(polypoint) / 최소제곱 다변측량 (스칼라, 배치) 처리량 비교 마이크로 벤치마크"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=10000, help="한 번에 계산할 환자 수")
+        parser.add_argument("--repeat", type=int, default=5, help="반복 횟수 (가장 빠른 결과를 사용)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        patients, repeat = options["patients"], options["repeat"]
+        rng = np.random.default_rng(options["seed"])
+
+        # 실제 병원 크기 100m x 50m, 기지국 3개 (단위는 views 와 같이 0.1mm)
+        stations = ((0, 0), (1000000, 0), (0, 500000))
+        real_patients = rng.uniform((0, 0), (1000000, 500000), size=(patients, 2))
+        real_distances = np.linalg.norm(real_patients[:, None, :] - np.array(stations)[None, :, :], axis=2)
+        real_distance_tuples = [tuple(row) for row in real_distances.tolist()]
+
+        scalar = min(self._measure(lambda: [
+            polypoint(0, 0, real_distance, *stations) for real_distance in real_distance_tuples
+        ]) for _ in range(repeat))
+        solver = MultilaterationSolver(dict(zip("ABC", stations)))
+        solver_scalar = min(self._measure(lambda: [
+            solver.solve(real_distance) for real_distance in real_distance_tuples
+        ]) for _ in range(repeat))
+        solver_batch = min(self._measure(lambda: solver.solve_batch(real_distances)) for _ in range(repeat))
+
+        error = np.abs(solver.solve_batch(real_distances) - real_patients).max()
+        self.stdout.write(f"patients: {patients}, repeat: {repeat}, max error: {error:.3e}")
+        self.stdout.write(f"polypoint          : {scalar * 1000:10.3f} ms  ({patients / scalar:14,.0f} fixes/s)")
+        self.stdout.write(f"solver.solve       : {solver_scalar * 1000:10.3f} ms  ({patients / solver_scalar:14,.0f} fixes/s)")
+        self.stdout.write(f"solver.solve_batch : {solver_batch * 1000:10.3f} ms  ({patients / solver_batch:14,.0f} fixes/s)")
+        self.stdout.write(f"batch speedup      : {scalar / solver_batch:10.1f}x")
+
+    @staticmethod
+    def _measure(function):
+        started = time.perf_counter()
+        function()
+        return time.perf_counter() - started
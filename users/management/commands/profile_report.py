@@ -0,0 +1,140 @@
+import io
+import os
+import pstats
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.profiling import read_records
+
+# --sort 값 -> 요청 기록에서 더할 값
+SORT_KEYS = {
+    "wall": "wall_ms",
+    "cpu": "cpu_ms",
+    "queries": "queries",
+    "sql": "sql_ms",
+    "duplicates": "duplicate_queries",
+}
+
+
+class Command(BaseCommand):
+    help = ("ProfilingMiddleware 가 남긴 요청 기록을 URL route 별로 모아 오래 걸린 / 쿼리가 많은 route, "
+            "반복된 SQL 문, route 별 cProfile 상위 함수를 보여준다")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--directory", default=None,
+                            help="기록이 저장된 폴더, 기본값은 settings.REQUEST_PROFILING['DIRECTORY']")
+        parser.add_argument("--hours", type=float, default=None, help="최근 이 시간 (시간) 동안의 기록만")
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="wall",
+                            help="route 를 정렬할 기준 (요청들의 합계)")
+        parser.add_argument("--limit", type=int, default=10, help="보여줄 route 수")
+        parser.add_argument("--sql", type=int, default=5, help="보여줄 반복된 SQL 문 수")
+        parser.add_argument("--functions", type=int, default=10,
+                            help="route 별로 보여줄 cProfile 상위 함수 수 (0 이면 보여주지 않음)")
+
+    def handle(self, *args, **options):
+        directory = options["directory"] or settings.REQUEST_PROFILING["DIRECTORY"]
+        since = None if options["hours"] is None else time.time() - options["hours"] * 3600
+        records = read_records(directory, since=since)
+        if not records:
+            self.stdout.write(f"no request profiles in {directory}")
+            return
+
+        routes = self._summarize_routes(records)
+        key = SORT_KEYS[options["sort"]]
+        routes.sort(key=lambda route: route["total"][key], reverse=True)
+        routes = routes[:options["limit"]]
+
+        self.stdout.write(f"{len(records)} profiled request(s) in {directory}, top {len(routes)} route(s) by "
+                          f"total {options['sort']}")
+        self.stdout.write(f"{'method':<7}{'route':<60}{'requests':>9}{'wall p50':>10}{'wall p95':>10}"
+                          f"{'cpu avg':>9}{'queries':>9}{'max':>6}{'sql avg':>9}{'dup avg':>9}")
+        for route in routes:
+            self.stdout.write(
+                f"{route['method']:<7}{route['route'][:59]:<60}{route['requests']:>9}"
+                f"{route['wall_p50']:>10.2f}{route['wall_p95']:>10.2f}{self._format(route['cpu_avg']):>9}"
+                f"{self._format(route['queries_avg'], 1):>9}{self._format(route['queries_max'], 0):>6}"
+                f"{self._format(route['sql_avg']):>9}{self._format(route['duplicates_avg'], 1):>9}"
+            )
+
+        if options["sql"]:
+            self._report_sql(records, options["sql"])
+        if options["functions"]:
+            for route in routes:
+                self._report_functions(directory, route, options["functions"])
+
+    @staticmethod
+    def _summarize_routes(records) -> list:
+        """
+        :return: (method, route) 별 요청 수, wall 시간 p50/p95, 평균 CPU 시간 / 쿼리 수 / SQL 시간 / 중복 쿼리 수
+        """
+        groups = {}
+        for record in records:
+            groups.setdefault((record["method"], record["route"]), []).append(record)
+
+        routes = []
+        for (method, route), group in groups.items():
+            wall = sorted(record["wall_ms"] for record in group)
+
+            def values(field):
+                return [record[field] for record in group if record[field] is not None]
+
+            def average(field):
+                measured = values(field)
+                return sum(measured) / len(measured) if measured else None
+
+            routes.append({
+                "method": method,
+                "route": route,
+                "requests": len(group),
+                "wall_p50": wall[int(0.50 * (len(wall) - 1))],
+                "wall_p95": wall[int(0.95 * (len(wall) - 1))],
+                "cpu_avg": average("cpu_ms"),
+                "queries_avg": average("queries"),
+                "queries_max": max(values("queries"), default=None),
+                "sql_avg": average("sql_ms"),
+                "duplicates_avg": average("duplicate_queries"),
+                "total": {field: sum(values(field)) for field in SORT_KEYS.values()},
+                "profiles": [record["profile"] for record in group if record["profile"]],
+            })
+        return routes
+
+    def _report_sql(self, records, limit):
+        # 요청마다 2번 이상 실행된 SQL 문을 모든 요청에 걸쳐 합친다 (N+1 쿼리, 중복 쿼리 찾기)
+        statements = {}
+        for record in records:
+            for repeated in record["repeated_sql"]:
+                statement = statements.setdefault(repeated["sql"], {
+                    "count": 0, "duplicates": 0, "ms": 0.0, "requests": 0, "routes": set(),
+                })
+                statement["count"] += repeated["count"]
+                statement["duplicates"] += repeated["duplicates"]
+                statement["ms"] += repeated["ms"]
+                statement["requests"] += 1
+                statement["routes"].add(f"{record['method']} {record['route']}")
+        if not statements:
+            return
+        self.stdout.write("")
+        self.stdout.write("SQL executed more than once per request (count / identical duplicates / ms / requests)")
+        for sql, statement in sorted(statements.items(), key=lambda item: item[1]["count"], reverse=True)[:limit]:
+            self.stdout.write(f"{statement['count']:>7}{statement['duplicates']:>7}{statement['ms']:>10.2f}"
+                              f"{statement['requests']:>7}  {sql}")
+            self.stdout.write(f"{'':>31}  in {', '.join(sorted(statement['routes']))}")
+
+    def _report_functions(self, directory, route, limit):
+        # route 의 cProfile 결과를 모두 합쳐 누적 시간이 긴 함수를 보여준다
+        paths = [os.path.join(directory, name) for name in route["profiles"]
+                 if os.path.exists(os.path.join(directory, name))]
+        if not paths:
+            return
+        output = io.StringIO()
+        stats = pstats.Stats(*paths, stream=output)
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        self.stdout.write("")
+        self.stdout.write(f"{route['method']} {route['route']} ({len(paths)} cProfile dump(s))")
+        self.stdout.write(output.getvalue().strip())
+
+    @staticmethod
+    def _format(value, digits=2) -> str:
+        return "-" if value is None else f"{value:.{digits}f}"
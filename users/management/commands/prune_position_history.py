@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.history import prune_position_history
+
+
+class Command(BaseCommand):
+    help = "보관 기간이 지난 환자 위치 이력을 지운다 (주기적으로 실행, 예: Heroku Scheduler)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="보관 기간 (일), 기본값은 settings.POSITION_HISTORY['RETENTION_DAYS']")
+
+    def handle(self, *args, **options):
+        deleted = prune_position_history(retention_days=options["days"])
+        self.stdout.write(f"deleted {deleted} position chunk(s)")
@@ -0,0 +1,40 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.ingest import FRAME, RangingIngestServer
+from users.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = (f"기지국 거리 값 binary frame ({FRAME.size} bytes, struct '{FRAME.format}') 을 UDP / TCP 로 받아서 "
+            "HTTP 를 거치지 않고 위치 계산에 넘기는 ingest 서버")
+
+    def add_arguments(self, parser):
+        options = settings.RANGING_INGEST
+        parser.add_argument("--host", default=options["HOST"])
+        parser.add_argument("--udp-port", type=int, default=options["UDP_PORT"], help="0 이면 UDP 를 받지 않음")
+        parser.add_argument("--tcp-port", type=int, default=options["TCP_PORT"], help="0 이면 TCP 를 받지 않음")
+        parser.add_argument("--flush-interval", type=float, default=options["FLUSH_INTERVAL"],
+                            help="모아둔 거리 값을 반영하는 간격 (초)")
+        parser.add_argument("--flush-size", type=int, default=options["FLUSH_SIZE"],
+                            help="이만큼 모이면 간격을 기다리지 않고 반영")
+        parser.add_argument("--metrics-port", type=int, default=options["METRICS_PORT"],
+                            help="지표 (GET /metrics) 를 내보낼 port, 0 이면 내보내지 않음")
+
+    def handle(self, *args, **options):
+        server = RangingIngestServer(flush_interval=options["flush_interval"], flush_size=options["flush_size"])
+        # 웹 프로세스의 /metrics 와 따로, 이 프로세스의 ingest / 위치 계산 지표를 내보낸다
+        if options["metrics_port"]:
+            serve_metrics(options["host"], options["metrics_port"])
+        self.stdout.write(f"ranging ingest on {options['host']} udp:{options['udp_port'] or '-'} "
+                          f"tcp:{options['tcp_port'] or '-'} metrics:{options['metrics_port'] or '-'}")
+        try:
+            asyncio.run(server.serve(
+                options["host"],
+                udp_port=options["udp_port"] or None,
+                tcp_port=options["tcp_port"] or None,
+            ))
+        except KeyboardInterrupt:
+            pass
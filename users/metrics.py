@@ -0,0 +1,235 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 기본 구간 (초), 요청 지연 시간 / FCM 발송 시간용
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 계산 시간용 (초)
+COMPUTE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1)
+# 요청당 쿼리 수용
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _format_labels(labelnames: tuple, labelvalues: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    계속 증가하기만 하는 값 (프로세스 메모리)
+    """
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    늘거나 줄 수 있는 값, callback 이 있으면 내보낼 때마다 callback() 값을 사용
+    """
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            yield f"{self.name} {_format_value(self.callback())}"
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    """
+    관측 값의 분포 (구간별 누적 개수, 합, 개수)
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [구간별 개수..., +Inf 개수, 합]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        values = self._values.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return 0 if values is None else sum(values[:-1])
+
+    def sum(self, **labels):
+        values = self._values.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return 0 if values is None else values[-1]
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(values)) for key, values in self._values.items())
+        for key, values in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(values[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        :return: Prometheus text exposition format (0.0.4)
+        """
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda metric: metric.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(host, port, registry=None) -> ThreadingHTTPServer:
+    """
+    Django 의 /metrics 를 쓸 수 없는 프로세스 (manage.py run_ranging_ingest 등) 에서 지표를 내보내는 HTTP 서버
+    daemon 스레드에서 GET /metrics 에 registry.render() 로 응답한다
+    :param host: 받을 주소
+    :param port: 받을 port (0 이면 아무 port)
+    :param registry: 내보낼 Registry, 없으면 REGISTRY
+    :return: 실행 중인 서버 (server_address 로 port 확인, shutdown() 으로 종료)
+    """
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+REGISTRY = Registry()
+
+# 요청
+REQUEST_LATENCY = REGISTRY.histogram(
+    "igo_http_request_duration_seconds", "HTTP request latency by URL route",
+    labelnames=("route", "method", "status"),
+)
+REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "igo_http_request_db_queries", "Database queries executed per HTTP request",
+    labelnames=("route",), buckets=COUNT_BUCKETS,
+)
+# 위치 계산
+TRILATERATION_LATENCY = REGISTRY.histogram(
+    "igo_trilateration_duration_seconds", "Time spent computing patient positions",
+    labelnames=("mode",), buckets=COMPUTE_BUCKETS,
+)
+RANGING_READINGS = REGISTRY.counter(
+    "igo_ranging_readings_total", "Station distance readings received", labelnames=("source",),
+)
+RANGING_DROPPED = REGISTRY.counter(
+    "igo_ranging_dropped_total", "Station distance readings dropped before trilateration",
+    labelnames=("station", "reason"),
+)
+POSITION_FIXES = REGISTRY.counter(
+    "igo_position_fixes_total", "Patient positions computed",
+)
+# FCM
+FCM_SEND_LATENCY = REGISTRY.histogram(
+    "igo_fcm_send_duration_seconds", "FCM send request latency", labelnames=("kind",),
+)
+FCM_MESSAGES = REGISTRY.counter(
+    "igo_fcm_messages_total", "FCM messages by final result", labelnames=("result",),
+)
+FCM_RETRIES = REGISTRY.counter(
+    "igo_fcm_retries_total", "FCM messages scheduled for retry",
+)
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import REQUEST_LATENCY, REQUEST_DB_QUERIES
+from .profiling import QueryRecorder, request_profiler, server_timing
+
+
+# ASGI 에서 처리 중인 요청 1개의 쿼리 수 ([쿼리 수]), 동기 view 를 실행하는 스레드와 run_db 스레드에도 복사된다
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+def count_request_queries(execute, sql, params, many, context):
+    """
+    모든 DB 연결에 붙여두는 execute wrapper, ASGI 요청 처리 중일 때만 쿼리 수를 센다
+    """
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_request_query_counter(sender, connection, **kwargs):
+    # 다시 연결해도 같은 DatabaseWrapper 이므로 한 번만 붙인다
+    # connection.execute_wrapper() 는 마지막 wrapper 를 pop 하므로, 그 안에서 연결되어도 빠지지 않게 맨 앞에 넣는다
+    if count_request_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_request_queries)
+
+
+class MetricsMiddleware:
+    """
+    요청마다 URL route 별 지연 시간과 쿼리 수를 기록하는 middleware
+    ASGI 에서는 스레드를 쓰지 않도록 async 로 처리하고, 쿼리 수는 요청의 contextvar 로 센다
+    (동기 view 는 요청별 스레드에서, async view 는 users.async_db.run_db 스레드에서 실행되는 쿼리)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # django.utils.deprecation.MiddlewareMixin 과 같은 방식으로 async 여부를 알림
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            connection_created.connect(install_request_query_counter, dispatch_uid="users.request_query_counter")
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        self._observe(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self._observe(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    @staticmethod
+    def _observe(request, response, elapsed, queries):
+        route = request.resolver_match.route if request.resolver_match is not None else "unmatched"
+        REQUEST_LATENCY.observe(elapsed, route=route, method=request.method, status=response.status_code)
+        if queries is not None:
+            REQUEST_DB_QUERIES.observe(queries, route=route)
+
+
+class ProfilingMiddleware:
+    """
+    고른 요청 (header 또는 sampling) 의 쿼리 수, SQL 시간, 중복 쿼리, wall / CPU 시간을 기록하고
+    cProfile 결과를 저장하는 middleware (users.profiling, manage.py profile_report 로 요약)
+    settings.REQUEST_PROFILING["ENABLED"] 가 꺼져 있으면 middleware 목록에서 빠지므로 비용이 없다
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        if not request_profiler.selected(request):
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    @staticmethod
+    def _profile(request, get_response):
+        queries = QueryRecorder()
+        profiler = request_profiler.start_cprofile()
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            with connection.execute_wrapper(queries):
+                response = get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        wall, cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+        if request.resolver_match is not None and asyncio.iscoroutinefunction(request.resolver_match.func):
+            # async view 는 이벤트 루프와 run_db 스레드에서 실행되어 이 스레드에서 잰 값은 의미가 없으므로 wall 시간만 남긴다
+            cpu, queries, profiler = None, None, None
+        record = request_profiler.finish(request, response, wall, cpu, queries, profiler)
+        response["Server-Timing"] = server_timing(record)
+        return response
+
+    async def __acall__(self, request):
+        if not request_profiler.selected(request):
+            return await self.get_response(request)
+        # 고른 요청만 스레드 1개에서 처리한다: 동기 view 는 thread_sensitive 로 이 스레드로 돌아와 실행되므로
+        # 쿼리 (이 스레드의 DB 연결), CPU 시간, cProfile 을 WSGI 와 같게 잴 수 있다
+        return await sync_to_async(self._profile, thread_sensitive=True)(request, async_to_sync(self.get_response))
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    whitenoise 정적 파일 middleware 의 async 지원 버전
+    whitenoise 6.2 는 동기 middleware 뿐이라, 그대로 두면 ASGI 에서 async view 도 요청마다 스레드 1개를 붙잡는다
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # 정적 파일 조회는 시작할 때 만든 메모리 목록에서 찾는다
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Station",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20)),
+                ("drawing_x", models.IntegerField(default=0)),
+                ("drawing_y", models.IntegerField(default=0)),
+                ("real_x", models.IntegerField(default=0)),
+                ("real_y", models.IntegerField(default=0)),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stations",
+                        to="users.hospital",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="station",
+            constraint=models.UniqueConstraint(
+                fields=("hospital", "name"), name="unique_station_name_per_hospital"
+            ),
+        ),
+    ]
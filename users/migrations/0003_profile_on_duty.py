@@ -0,0 +1,18 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_station"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="on_duty",
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_profile_on_duty"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PositionChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("count", models.IntegerField(default=0)),
+                ("data", models.BinaryField(default=b"")),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="position_chunks",
+                        to="users.patient",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="positionchunk",
+            index=models.Index(
+                fields=["bucket_start"], name="position_chunk_bucket_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="positionchunk",
+            constraint=models.UniqueConstraint(
+                fields=("patient", "bucket_start"),
+                name="unique_position_chunk_per_bucket",
+            ),
+        ),
+    ]
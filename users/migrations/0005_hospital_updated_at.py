@@ -0,0 +1,18 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_positionchunk"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hospital",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.1 on 2026-10-18 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_hospital_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="fall_risk",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="Zone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("polygon", models.JSONField(default=list)),
+                ("alert_on_enter", models.BooleanField(default=False)),
+                ("alert_on_exit", models.BooleanField(default=False)),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zones",
+                        to="users.hospital",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
 # users/models.py
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
@@ -39,10 +40,60 @@ class Hospital(models.Model):
     real_station3_x = models.IntegerField(default=0)
     real_station3_y = models.IntegerField(default=0)
 
+    # 마지막 수정 시각 (병원 조회 응답의 Last-Modified)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
     def __str__(self):
         return f'병원 이름 : {self.name}'
 
 
+# 기지국 모델 (병원마다 3개 이상)
+# 병원에 기지국이 3개 미만으로 등록되어 있으면 병원 모델의 기지국 1, 2, 3 좌표를 사용
+class Station(models.Model):
+    # 소속 병원
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="stations")
+    # 기지국 이름 (기지국이 거리 값을 보낼 때 사용하는 이름, 예: "A")
+    name = models.CharField(max_length=20)
+    # 병원 도면 사진 위에서 기지국의 위치
+    drawing_x = models.IntegerField(default=0)
+    drawing_y = models.IntegerField(default=0)
+    # 병원 실제 기지국의 위치
+    real_x = models.IntegerField(default=0)
+    real_y = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hospital", "name"], name="unique_station_name_per_hospital"),
+        ]
+
+    def __str__(self):
+        return f'기지국 이름 : {self.name} / 소속 병원 : {self.hospital_id}'
+
+
+# 구역 모델 (병원 도면 위의 다각형, 예: 병동, 계단)
+# 낙상 위험 환자가 들어가거나 나오면 의료진에게 알림
+class Zone(models.Model):
+    # 소속 병원
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name="zones")
+    # 구역 이름
+    name = models.CharField(max_length=100)
+    # 병원 도면 사진 위에서 구역의 꼭짓점 [[x, y], [x, y], ...] (3개 이상)
+    polygon = models.JSONField(default=list)
+    # 들어가면 알림 (예: 계단)
+    alert_on_enter = models.BooleanField(default=False)
+    # 나오면 알림 (예: 병동)
+    alert_on_exit = models.BooleanField(default=False)
+
+    def clean(self):
+        if (not isinstance(self.polygon, list) or len(self.polygon) < 3
+                or not all(isinstance(point, (list, tuple)) and len(point) == 2
+                           and all(isinstance(value, (int, float)) for value in point) for point in self.polygon)):
+            raise ValidationError({"polygon": "꼭짓점 [x, y] 3개 이상의 목록이어야 합니다."})
+
+    def __str__(self):
+        return f'구역 이름 : {self.name} / 소속 병원 : {self.hospital_id}'
+
+
 # 의료진 프로필 모델
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
@@ -54,6 +105,8 @@ class Profile(models.Model):
     subjects = models.CharField(max_length=100, default="")
     # 토큰
     token = models.TextField(default='')
+    # 근무 중 여부 (근무 중인 의료진에게만 환자의 호출을 보냄)
+    on_duty = models.BooleanField(default=True)
 
     def __str__(self):
         return f'의료진 이름 : {self.name} / 전공 : {self.subjects} / 소속 병원 : {self.hospital.name}'
@@ -90,9 +143,14 @@ class Patient(models.Model):
     # 환자 사진 (1부터 5까지의 정수 중 하나)
     image = models.IntegerField(default=0)
 
+    # 낙상 위험 환자 (구역에 들어가거나 나오면 의료진에게 알림)
+    fall_risk = models.BooleanField(default=False)
+
     # 환자 아두이노 wifi ip 주소
     ip_address = models.CharField(max_length=50, default="")
 
+    # 기지국과의 거리 값은 메모리(users.ranging)에서 모아서 삼변측량에 사용하고,
+    # 이 필드들은 RANGING_STORE_DEBUG_DISTANCES 설정이 켜져 있을 때만 저장되는 디버그용 값
     # 기지국 1과의 거리 값
     real_distance1 = models.FloatField(default=0.0)
     # 기지국 2와의 거리 값
@@ -106,3 +164,28 @@ class Patient(models.Model):
 
     def __str__(self):
         return f'환자 이름 : {self.name} / 담당 의료진 : {self.profile.name}'
+
+
+# 환자 위치 이력 모델
+# 좌표 1개마다 행을 만들지 않고, 환자별로 시간 구간(bucket) 하나에 좌표들을 묶어서 저장
+class PositionChunk(models.Model):
+    # 환자
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="position_chunks")
+    # 구간 시작 시각
+    bucket_start = models.DateTimeField()
+    # 구간 안의 좌표 수
+    count = models.IntegerField(default=0)
+    # (구간 시작부터 지난 시간 ms: uint32, 도면 상 x좌표: float32, 도면 상 y좌표: float32) 를 이어붙인 값
+    data = models.BinaryField(default=b"")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["patient", "bucket_start"], name="unique_position_chunk_per_bucket"),
+        ]
+        indexes = [
+            # 오래된 구간을 지울 때 사용
+            models.Index(fields=["bucket_start"], name="position_chunk_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f'환자 ID : {self.patient_id} / 구간 시작 시각 : {self.bucket_start} / 좌표 수 : {self.count}'
@@ -0,0 +1,64 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MultilaterationSolver:
+    """
+    기지국 N개(N >= 3)에 대한 최소제곱 다변측량
+    기지국 i와 첫 번째 기지국의 원의 방정식을 빼면 선형 방정식 A·p = b 가 되는데,
+    A 와 b 의 상수항은 기지국 좌표로만 결정되므로 의사역행렬과 함께 생성할 때 한 번만 계산한다
+    위치 좌표 1개를 구하는 비용은 (2 x N-1) 행렬과 벡터의 곱 1번
+    """
+    def __init__(self, stations: dict):
+        """
+        :param stations: 기지국 이름 -> 실제 기지국의 좌표 (3개 이상)
+        """
+        if len(stations) < 3:
+            raise ValueError("multilateration needs at least 3 stations")
+        self.station_names = tuple(stations)
+        coordinates = np.array([stations[name] for name in self.station_names], dtype=np.float64)
+        reference = coordinates[0]
+
+        A = 2.0 * (coordinates[1:] - reference)
+        # b = r1^2 - ri^2 + (xi^2 + yi^2 - x1^2 - y1^2) 에서 기지국 좌표로만 결정되는 항
+        self._offsets = np.sum(np.square(coordinates[1:]), axis=1) - np.sum(np.square(reference))
+        # 기지국이 한 직선 위에 있으면 위치를 구할 수 없다
+        self._pseudo_inverse = np.linalg.pinv(A) if np.linalg.matrix_rank(A) == 2 else None
+
+        # 한 명씩 계산할 때 numpy 호출 비용을 줄이기 위해 float 로 풀어둔 값
+        self._scalar_offsets = tuple(self._offsets.tolist())
+        if self._pseudo_inverse is None:
+            self._scalar_rows = None
+        else:
+            self._scalar_rows = tuple(tuple(row) for row in self._pseudo_inverse.tolist())
+
+    def solve(self, real_distance) -> tuple:
+        """
+        :param real_distance: station_names 순서대로의 환자와 기지국 사이의 실제 거리값
+        :return: 실제 환자의 좌표
+        """
+        if self._scalar_rows is None:
+            logger.warning("stations are collinear: %s", self.station_names)
+            return 0, 0
+        r1_squared = real_distance[0] * real_distance[0]
+        b = [r1_squared - r * r + offset for r, offset in zip(real_distance[1:], self._scalar_offsets)]
+        row_x, row_y = self._scalar_rows
+        x = sum(coefficient * value for coefficient, value in zip(row_x, b))
+        y = sum(coefficient * value for coefficient, value in zip(row_y, b))
+        return x, y
+
+    def solve_batch(self, real_distances) -> np.ndarray:
+        """
+        :param real_distances: 환자 M명의 station_names 순서대로의 실제 거리값, (M, N) 모양
+        :return: 실제 환자 M명의 좌표, (M, 2) 모양
+        """
+        r_squared = np.square(np.asarray(real_distances, dtype=np.float64).reshape(-1, len(self.station_names)))
+        if self._pseudo_inverse is None:
+            logger.warning("stations are collinear: %s", self.station_names)
+            return np.zeros((r_squared.shape[0], 2))
+        b = r_squared[:, :1] - r_squared[:, 1:] + self._offsets
+        return b @ self._pseudo_inverse.T
+
@@ -0,0 +1,21 @@
+# users/pagination.py
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class PatientCursorPagination(CursorPagination):
+    """
+    환자 목록 keyset(cursor) 페이지네이션
+    OFFSET 없이 id > 마지막 id 조건으로 다음 페이지를 읽으므로 병동이 커져도 페이지마다 비용이 같다
+    """
+    ordering = "id"
+    page_size = settings.PATIENT_LIST["PAGE_SIZE"]
+    page_size_query_param = "page_size"
+    max_page_size = settings.PATIENT_LIST["MAX_PAGE_SIZE"]
+
+    def is_requested(self, request) -> bool:
+        """
+        :return: 요청에 cursor 또는 page_size 가 있는지 (없으면 기존처럼 전체 목록을 돌려준다)
+        """
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
@@ -0,0 +1,164 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from .async_db import call_db
+from .models import Patient
+from .serializers import PatientIMPORTSerializer, PatientREADSerializer
+
+# 가져오기 / 내보내기 파일 형식
+CSV = "csv"
+NDJSON = "ndjson"
+FILE_FORMATS = (CSV, NDJSON)
+CONTENT_TYPES = {CSV: "text/csv; charset=utf-8", NDJSON: "application/x-ndjson"}
+
+
+def guess_file_format(file_name: str):
+    """
+    :param file_name: 업로드한 파일 이름
+    :return: 확장자로 추측한 파일 형식, 모르면 None
+    """
+    extension = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+    if extension == CSV:
+        return CSV
+    if extension in (NDJSON, "jsonl"):
+        return NDJSON
+    return None
+
+
+def check_encoding(uploaded_file):
+    """
+    업로드한 파일이 UTF-8 인지 환자를 만들기 전에 한 번 읽어서 확인하는 함수 (chunk 단위, 파일 전체를 메모리에 올리지 않음)
+    묶음마다 따로 저장하므로, 중간에 디코딩이 실패하면 앞의 묶음만 저장되어 버린다
+    :param uploaded_file: UploadedFile
+    :return: UTF-8 이 아니면 오류 메시지, 아니면 None
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    offset = 0
+    try:
+        for chunk in uploaded_file.chunks():
+            decoder.decode(chunk)
+            offset += len(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError as error:
+        return f"file is not UTF-8 encoded (invalid byte at offset {offset + error.start}), save it as UTF-8 CSV"
+    finally:
+        uploaded_file.seek(0)
+    return None
+
+
+def iter_rows(uploaded_file, file_format):
+    """
+    업로드한 파일을 한 줄씩 읽는 함수 (파일 전체를 메모리에 올리지 않음, check_encoding() 으로 먼저 확인)
+    :param uploaded_file: UploadedFile
+    :param file_format: CSV 또는 NDJSON
+    :return: (행 번호, 행 dict 또는 None, 오류 또는 None) 를 차례로 돌려주는 generator
+    """
+    lines = codecs.iterdecode(uploaded_file, "utf-8-sig")
+    if file_format == CSV:
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                # NUL 문자, 너무 긴 칸 등은 그 행만 오류로 남기고 다음 행부터 계속 읽는다
+                yield reader.line_num, None, {"non_field_errors": [f"invalid CSV: {error}"]}
+                continue
+            # 빈 칸은 빠진 값으로 보고 모델 기본값을 사용
+            yield reader.line_num, {key: value for key, value in row.items() if key and value != ""}, None
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, {"non_field_errors": [f"invalid JSON: {error}"]}
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, {"non_field_errors": ["expected a JSON object"]}
+            continue
+        yield line_number, row, None
+
+
+def import_patients(profile, rows, chunk_size=None) -> dict:
+    """
+    환자 여러 명을 한 번에 생성하는 함수
+    행마다 PatientIMPORTSerializer 로 검사하고, 통과한 행은 chunk_size 개씩 bulk_create
+    잘못된 행은 건너뛰고 오류만 모아서 돌려준다
+    :param profile: 담당 의료진
+    :param rows: iter_rows() 의 결과
+    :param chunk_size: 한 번에 INSERT 할 환자 수, 없으면 settings.PATIENT_IMPORT_CHUNK_SIZE
+    :return: {"created": 생성한 환자 수, "errors": [{"row": 행 번호, "errors": 오류}, ...]}
+    """
+    chunk_size = chunk_size or settings.PATIENT_IMPORT_CHUNK_SIZE
+    created, errors, chunk = 0, [], []
+    for line_number, row, error in rows:
+        if error is None:
+            serializer = PatientIMPORTSerializer(data=row)
+            if serializer.is_valid():
+                chunk.append(Patient(profile=profile, **serializer.validated_data))
+            else:
+                error = serializer.errors
+        if error is not None:
+            errors.append({"row": line_number, "errors": error})
+        if len(chunk) >= chunk_size:
+            created += _create(chunk)
+            chunk = []
+    if chunk:
+        created += _create(chunk)
+    return {"created": created, "errors": errors}
+
+
+def _create(patients: list) -> int:
+    with transaction.atomic():
+        Patient.objects.bulk_create(patients)
+    return len(patients)
+
+
+class _Echo:
+    # csv.writer 가 쓴 한 줄을 그대로 돌려주는 가짜 파일
+    def write(self, value):
+        return value
+
+
+def export_patients(queryset, file_format, chunk_size=None):
+    """
+    환자 목록을 한 줄씩 만드는 generator (StreamingHttpResponse 용)
+    환자 ID 순서로 chunk_size 명씩 나눠 읽으므로 환자가 많아도 메모리에 한 번에 올리지 않는다
+    ASGI 에서는 이 generator 가 이벤트 루프 스레드에서 돌기 때문에, 각 묶음은 DB 스레드 풀 (users.async_db) 에서 읽는다
+    :param queryset: 내보낼 환자 queryset
+    :param file_format: CSV 또는 NDJSON
+    :param chunk_size: 한 번에 읽을 환자 수, 없으면 settings.PATIENT_IMPORT_CHUNK_SIZE
+    :return: 한 줄씩 돌려주는 generator
+    """
+    fields = PatientREADSerializer.Meta.fields
+    rows = _iter_chunks(queryset.order_by("id").values_list(*fields), chunk_size or settings.PATIENT_IMPORT_CHUNK_SIZE)
+    if file_format == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n"
+
+
+def _iter_chunks(rows, chunk_size):
+    # 마지막으로 읽은 환자 ID 다음부터 chunk_size 명씩 읽는다 (rows 의 첫 값은 환자 ID)
+    last_id = 0
+    while True:
+        chunk = call_db(_fetch_chunk, rows, last_id, chunk_size)
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1][0]
+
+
+def _fetch_chunk(rows, after_id, chunk_size) -> list:
+    return list(rows.filter(pk__gt=after_id)[:chunk_size])
@@ -0,0 +1,215 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+from .logs import log_event
+
+logger = logging.getLogger(__name__)
+
+# 요청 기록을 한 줄 JSON 으로 이어붙이는 파일 (REQUEST_PROFILING["DIRECTORY"] 안)
+RECORDS_FILE = "requests.jsonl"
+# 기록에 남기는 SQL 문의 최대 길이
+MAX_SQL_LENGTH = 500
+
+
+class QueryRecorder:
+    """
+    요청 1개에서 실행된 쿼리 수, 시간, 중복 쿼리를 기록하는 connection.execute_wrapper
+    같은 SQL 문 + 같은 값이면 중복 쿼리, 같은 SQL 문 + 다른 값이 여러 번이면 N+1 쿼리일 가능성이 높다
+    """
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self._calls = {}  # (SQL 문, 값) -> [실행 횟수, 걸린 시간 (초)]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            calls = self._calls.setdefault((sql, repr(params)), [0, 0.0])
+            calls[0] += 1
+            calls[1] += elapsed
+
+    @property
+    def duplicates(self) -> int:
+        """
+        :return: 같은 SQL 문 + 같은 값으로 다시 실행된 쿼리 수
+        """
+        return sum(count - 1 for count, _ in self._calls.values())
+
+    def repeated(self, top) -> list:
+        """
+        :param top: 돌려줄 최대 SQL 문 수
+        :return: 2번 이상 실행된 SQL 문, 실행 횟수가 많은 순서
+                 [{"sql": , "count": 실행 횟수, "duplicates": 같은 값으로 다시 실행된 횟수, "ms": 걸린 시간}, ...]
+        """
+        statements = {}
+        for (sql, _), (count, elapsed) in self._calls.items():
+            statement = statements.setdefault(sql, {"sql": sql[:MAX_SQL_LENGTH], "count": 0, "duplicates": 0, "ms": 0.0})
+            statement["count"] += count
+            statement["duplicates"] += count - 1
+            statement["ms"] += elapsed * 1000.0
+        repeated = [statement for statement in statements.values() if statement["count"] > 1]
+        repeated.sort(key=lambda statement: statement["count"], reverse=True)
+        return repeated[:top]
+
+
+class RequestProfiler:
+    """
+    프로파일링할 요청을 고르고, 요청별 기록 (SQL, wall / CPU 시간) 과 cProfile 결과를 directory 에 남기는 기록기
+    요청 header 에 token 을 보내거나, sample_rate 비율로 무작위로 고른 요청만 프로파일링한다
+    """
+    def __init__(self, directory, header, token, sample_rate, cprofile, max_dumps, top_queries):
+        """
+        :param directory: 기록과 cProfile 결과 (.prof) 를 저장할 폴더
+        :param header: 프로파일링을 요청하는 HTTP header 이름
+        :param token: header 값이 이 token 과 같을 때만 프로파일링 (없으면 header 는 무시)
+        :param sample_rate: 무작위로 프로파일링할 요청 비율 (0 ~ 1)
+        :param cprofile: 고른 요청의 cProfile 결과도 저장할지 여부
+        :param max_dumps: 프로세스 1개가 저장할 최대 cProfile 결과 수 (디스크 보호)
+        :param top_queries: 요청 기록에 남길 반복된 SQL 문 수
+        """
+        self.directory = Path(directory)
+        self.header = header
+        self.token = token
+        self.sample_rate = sample_rate
+        self.cprofile = cprofile
+        self.max_dumps = max_dumps
+        self.top_queries = top_queries
+
+        self._dumps = 0
+        self._lock = threading.Lock()
+
+    def selected(self, request) -> bool:
+        """
+        :return: 이 요청을 프로파일링할지 여부
+        """
+        if self.token:
+            value = request.headers.get(self.header)
+            if value and hmac.compare_digest(value.encode(), self.token.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start_cprofile(self):
+        """
+        :return: 실행 중인 cProfile.Profile, cProfile 을 쓰지 않거나 최대 결과 수를 넘었으면 None
+        """
+        if not self.cprofile:
+            return None
+        with self._lock:
+            if self._dumps >= self.max_dumps:
+                return None
+            self._dumps += 1
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12 부터는 프로세스에서 동시에 1개의 profiler 만 켤 수 있다
+            return None
+        return profiler
+
+    def finish(self, request, response, wall, cpu, queries, profiler) -> dict:
+        """
+        요청 1개의 기록을 저장하는 함수
+        :param wall: 걸린 시간 (초)
+        :param cpu: 요청 스레드의 CPU 시간 (초), 모르면 None
+        :param queries: QueryRecorder, 쿼리를 세지 않았으면 None
+        :param profiler: 멈춘 cProfile.Profile 또는 None
+        :return: 저장한 기록
+        """
+        record_id = uuid.uuid4().hex[:16]
+        record = {
+            "id": record_id,
+            "time": time.time(),
+            "method": request.method,
+            "route": request.resolver_match.route if request.resolver_match is not None else "unmatched",
+            "status": response.status_code,
+            "wall_ms": wall * 1000.0,
+            "cpu_ms": None if cpu is None else cpu * 1000.0,
+            "queries": None,
+            "sql_ms": None,
+            "duplicate_queries": None,
+            "repeated_sql": [],
+            "profile": None,
+        }
+        if queries is not None:
+            record.update(
+                queries=queries.count,
+                sql_ms=queries.time * 1000.0,
+                duplicate_queries=queries.duplicates,
+                repeated_sql=queries.repeated(self.top_queries),
+            )
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if profiler is not None:
+                record["profile"] = f"{record_id}.prof"
+                profiler.dump_stats(self.directory / record["profile"])
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            with self._lock, open(self.directory / RECORDS_FILE, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as error:
+            log_event(logger, logging.WARNING, "request profile not saved", error=repr(error))
+        # "time" 은 로그 줄의 시각 필드를 덮어쓰므로 빼고, 걸린 시간은 wall_ms 로 남긴다
+        log_event(logger, logging.INFO, "request profile", **{
+            key: value for key, value in record.items() if key not in ("time", "repeated_sql")
+        })
+        return record
+
+
+def server_timing(record) -> str:
+    """
+    :param record: RequestProfiler.finish() 의 기록
+    :return: 브라우저 개발자 도구에서 볼 수 있는 Server-Timing header 값
+    """
+    timings = [f'total;dur={record["wall_ms"]:.2f}']
+    if record["cpu_ms"] is not None:
+        timings.append(f'cpu;dur={record["cpu_ms"]:.2f}')
+    if record["queries"] is not None:
+        timings.append(f'db;dur={record["sql_ms"]:.2f};desc="{record["queries"]} queries, '
+                       f'{record["duplicate_queries"]} duplicate"')
+    return ", ".join(timings)
+
+
+def read_records(directory, since=None) -> list:
+    """
+    :param directory: 기록이 저장된 폴더
+    :param since: 이 시각 (unix time, 초) 이후의 기록만
+    :return: 저장된 요청 기록 목록 (깨진 줄은 건너뜀)
+    """
+    path = os.path.join(directory, RECORDS_FILE)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or record["time"] >= since:
+                records.append(record)
+    return records
+
+
+request_profiler = RequestProfiler(
+    directory=settings.REQUEST_PROFILING["DIRECTORY"],
+    header=settings.REQUEST_PROFILING["HEADER"],
+    token=settings.REQUEST_PROFILING["TOKEN"],
+    sample_rate=settings.REQUEST_PROFILING["SAMPLE_RATE"],
+    cprofile=settings.REQUEST_PROFILING["CPROFILE"],
+    max_dumps=settings.REQUEST_PROFILING["MAX_DUMPS"],
+    top_queries=settings.REQUEST_PROFILING["TOP_QUERIES"],
+)
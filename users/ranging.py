@@ -0,0 +1,252 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .calibration import calibration_cache
+from .geofence import geofence_engine
+from .history import position_history
+from .metrics import POSITION_FIXES, RANGING_DROPPED, RANGING_READINGS, TRILATERATION_LATENCY
+from .models import Patient
+from .streaming import position_broker
+
+
+# 기지국 이름 -> 환자 모델에서 해당 기지국과의 거리 값 필드 (디버그용)
+STATION_DISTANCE_FIELDS = {
+    "A": "real_distance1",
+    "B": "real_distance2",
+    "C": "real_distance3",
+}
+
+
+class RangingAccumulator:
+    """
+    환자별로 각 기지국의 최신 거리 값을 모아두는 저장소 (프로세스 메모리)
+    병원의 모든 기지국의 거리 값이 모이기 전까지는 데이터베이스에 접근하지 않는다
+    측정 시각이 window 초 안에 있는 거리 값끼리만 위치 계산에 쓰고 (더 오래된 거리 값은 버림),
+    기지국 순번으로 중복되거나 늦게 도착한 거리 값을 버린다
+    프로세스마다 따로 모으므로, 한 환자의 거리 값은 모두 같은 프로세스로 와야 한다
+    (웹 서버는 worker 1개로 실행하거나, 기지국 요청을 환자 단위로 같은 worker 에 보내야 함)
+    """
+    # 위치를 구하는 데 필요한 최소 기지국 수
+    MIN_STATIONS = 3
+    # 기지국 순번의 범위 (binary frame 의 unsigned 32bit)
+    SEQUENCE_MODULO = 2 ** 32
+
+    def __init__(self, window, reorder_limit, timer=time.time):
+        """
+        :param window: 같은 위치 계산에 쓰는 거리 값들의 측정 시각 차이 최대값 (초)
+        :param reorder_limit: 기지국 순번이 이만큼보다 적게 줄어들면 늦게 도착한 거리 값으로 보고 버림
+        :param timer: 측정 시각이 없는 거리 값에 쓸 받은 시각 (unix time, 초)
+        """
+        self.window = window
+        self.reorder_limit = reorder_limit
+        self.timer = timer
+        self._readings = {}  # key -> 기지국 이름 -> (거리 값, 측정 시각)
+        self._last = {}  # key -> 기지국 이름 -> 마지막으로 받은 (순번, 측정 시각) (위치를 계산한 뒤에도 유지)
+        self._lock = threading.Lock()
+
+    def add(self, key, station, distance, sequence=None, timestamp=None) -> int:
+        """
+        :param key: 환자 ID (의료진 배지는 ("staff", 의료진 ID))
+        :param station: 기지국 이름
+        :param distance: 기지국과의 거리 값
+        :param sequence: 기지국별 순번 (없으면 검사하지 않음)
+        :param timestamp: 기지국에서 측정한 시각 (unix time, 초, 없으면 받은 시각)
+        :return: 측정 시각이 window 초 안에 있는 거리 값을 보낸 기지국 수, 거리 값을 버렸으면 0
+        """
+        if timestamp is None:
+            timestamp = self.timer()
+        with self._lock:
+            reason = self._check_order(key, station, sequence, timestamp)
+            readings = self._readings.get(key)
+            if reason is None and readings and \
+                    timestamp < max(reading_timestamp for _, reading_timestamp in readings.values()) - self.window:
+                reason = "stale"
+            if reason is not None:
+                RANGING_DROPPED.inc(station=station, reason=reason)
+                return 0
+            self._last.setdefault(key, {})[station] = (sequence, timestamp)
+            readings = self._readings.setdefault(key, {})
+            readings[station] = (distance, timestamp)
+            # 새 거리 값보다 window 초 넘게 먼저 측정된 다른 기지국의 거리 값은 같은 위치 계산에 쓰지 않는다
+            for expired in [name for name, (_, reading_timestamp) in readings.items()
+                            if reading_timestamp < timestamp - self.window]:
+                del readings[expired]
+                RANGING_DROPPED.inc(station=expired, reason="expired")
+            return len(readings)
+
+    def _check_order(self, key, station, sequence, timestamp):
+        """
+        같은 기지국이 마지막으로 보낸 거리 값과 비교하는 함수 (lock 을 잡고 호출)
+        순번이 있으면 순번으로, 없으면 측정 시각으로 비교한다 (기지국 시계가 뒤로 가도 순번은 믿음)
+        :return: 버려야 하면 이유 ("duplicate", "out_of_order"), 아니면 None
+        """
+        last = self._last.get(key, {}).get(station)
+        if last is None:
+            return None
+        last_sequence, last_timestamp = last
+        if sequence is None or last_sequence is None:
+            return "out_of_order" if timestamp < last_timestamp else None
+        behind = (last_sequence - sequence) % self.SEQUENCE_MODULO
+        if behind == 0:
+            return "duplicate"
+        if behind < self.reorder_limit:
+            return "out_of_order"
+        return None
+
+    def pop_complete(self, key, stations: tuple):
+        """
+        :param key: 환자 ID (의료진 배지는 ("staff", 의료진 ID))
+        :param stations: 병원의 기지국 이름들
+        :return: 모든 기지국의 거리 값이 모였으면 기지국 순서대로의 거리 값 tuple (다음 측정을 위해 비움), 아니면 None
+        """
+        with self._lock:
+            readings = self._readings.get(key)
+            if readings is None or any(station not in readings for station in stations):
+                return None
+            del self._readings[key]
+        return tuple(readings[station][0] for station in stations)
+
+    def pending(self, key) -> dict:
+        """
+        :param key: 환자 ID (의료진 배지는 ("staff", 의료진 ID))
+        :return: 아직 모이는 중인 기지국별 거리 값
+        """
+        with self._lock:
+            return {station: distance for station, (distance, _) in self._readings.get(key, {}).items()}
+
+    def forget(self, key):
+        """
+        모이는 중인 거리 값과 기지국별 마지막 순번, 측정 시각을 모두 지우는 함수 (지운 환자, 의료진)
+        """
+        with self._lock:
+            self._readings.pop(key, None)
+            self._last.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._readings.clear()
+            self._last.clear()
+
+
+ranging_accumulator = RangingAccumulator(
+    window=settings.RANGING_EPOCH["WINDOW"],
+    reorder_limit=settings.RANGING_EPOCH["REORDER_LIMIT"],
+)
+
+
+def process_readings(readings, source) -> list:
+    """
+    여러 환자, 여러 기지국의 거리 값을 한 번에 반영하는 함수
+    측정 시각 순서대로 메모리에 모으고, 모든 기지국의 거리 값이 모인 환자만 병원별로 한 번에 위치를 구해 한 번에 저장
+    :param readings: [{"patient_id": , "station": , "real_distance": (m), "timestamp": (unix time, 초),
+                       "sequence": (기지국별 순번, 없어도 됨)}, ...]
+    :param source: 거리 값을 받은 경로 (지표 label, 예: "http_bulk", "udp")
+    :return: readings 순서대로의 [{"patient_id": , "station": , "status": "not_found" | "dropped" | "stored" | "computed"}, ...]
+             (status 가 "computed" 면 "x", "y" 도 포함, 환자나 환자의 병원의 기지국이 없으면 "not_found")
+    """
+    RANGING_READINGS.inc(len(readings), source=source)
+    # 관련된 환자의 병원의 위치 계산 정보 (캐시에 없는 환자만 한 번의 쿼리로 조회)
+    geometries = calibration_cache.for_patients({reading["patient_id"] for reading in readings})
+
+    results = [None] * len(readings)
+    completed = {}  # HospitalGeometry -> [(결과, 환자 ID, 거리 값), ...]
+    debug_distances = {}
+    # 측정 시각 순서대로 거리 값을 반영
+    for index in sorted(range(len(readings)), key=lambda i: readings[i]["timestamp"]):
+        reading = readings[index]
+        patient_id = reading["patient_id"]
+        result = {"patient_id": patient_id, "station": reading["station"]}
+        results[index] = result
+        geometry = geometries.get(patient_id)
+        if geometry is None or reading["station"] not in geometry.station_names:
+            # 없는 환자, 또는 환자의 병원에 없는 기지국
+            result["status"] = "not_found"
+            continue
+
+        distance = reading["real_distance"] * 10000.0  # 예를 들어, 1.2m 값이 들어오면 12000.0으로 변환
+        count = ranging_accumulator.add(patient_id, reading["station"], distance,
+                                        sequence=reading.get("sequence"), timestamp=reading["timestamp"])
+        if not count:
+            # 중복, 늦게 도착했거나 오래된 거리 값 (데이터베이스에 접근하지 않음)
+            result["status"] = "dropped"
+            continue
+        debug_distances.setdefault(patient_id, {})[reading["station"]] = distance
+        result["status"] = "stored"
+        if count < ranging_accumulator.MIN_STATIONS:
+            continue
+        real_distance = ranging_accumulator.pop_complete(patient_id, geometry.station_names)
+        if real_distance is not None:
+            completed.setdefault(geometry, []).append((result, patient_id, real_distance))
+
+    # 병원의 모든 기지국의 거리 값이 모인 환자만, 병원별로 한 번에 위치 좌표를 구함
+    positions = {}
+    for geometry, group in completed.items():
+        with TRILATERATION_LATENCY.time(mode="batch"):
+            drawing_patient_positions = geometry.drawing_positions(
+                [real_distance for _, _, real_distance in group]
+            ).tolist()
+        for (result, patient_id, _), (drawing_patient_x, drawing_patient_y) in zip(
+                group, drawing_patient_positions):
+            positions[patient_id] = (drawing_patient_x, drawing_patient_y)
+            result.update(status="computed", x=drawing_patient_x, y=drawing_patient_y)
+
+    # 계산된 위치 좌표를 한 번에 저장
+    record_drawing_positions(positions)
+    for patient_id, distances in debug_distances.items():
+        save_debug_distances(patient_id, distances)
+    return results
+
+
+def record_drawing_positions(positions: dict):
+    """
+    새로 계산된 도면 상의 환자 좌표를 저장하고, 실시간 위치 구독자, 구역 출입 검사, 위치 이력에 전달하는 함수
+    :param positions: 환자 ID -> (도면 상에서 환자의 x좌표, y좌표)
+    :return: none
+    """
+    POSITION_FIXES.inc(len(positions))
+    save_drawing_positions(positions)
+    position_broker.publish_fixes(positions)
+    if settings.GEOFENCE["ENABLED"]:
+        geofence_engine.process(positions)
+    if settings.POSITION_HISTORY["ENABLED"] and positions:
+        position_history.append(positions)
+
+
+def save_drawing_positions(positions: dict):
+    """
+    계산된 도면 상의 환자 좌표만 저장하는 함수 (SELECT 없이 UPDATE 1번)
+    :param positions: 환자 ID -> (도면 상에서 환자의 x좌표, y좌표)
+    :return: none
+    """
+    if not positions:
+        return
+    if len(positions) == 1:
+        (patient_id, (drawing_patient_x, drawing_patient_y)), = positions.items()
+        Patient.objects.filter(pk=patient_id).update(
+            drawing_patient_x=drawing_patient_x,
+            drawing_patient_y=drawing_patient_y,
+        )
+        return
+    patients = [
+        Patient(pk=patient_id, drawing_patient_x=drawing_patient_x, drawing_patient_y=drawing_patient_y)
+        for patient_id, (drawing_patient_x, drawing_patient_y) in positions.items()
+    ]
+    Patient.objects.bulk_update(patients, fields=["drawing_patient_x", "drawing_patient_y"])
+
+
+def save_debug_distances(patient_id, distances: dict):
+    """
+    RANGING_STORE_DEBUG_DISTANCES 설정이 켜져 있을 때만 기지국과의 거리 값을 저장하는 함수
+    :param patient_id: 환자 ID
+    :param distances: 기지국 이름 -> 거리 값
+    :return: none
+    """
+    if not settings.RANGING_STORE_DEBUG_DISTANCES:
+        return
+    # 디버그용 필드는 기지국 A, B, C 것만 있다
+    fields = {STATION_DISTANCE_FIELDS[station]: distance
+              for station, distance in distances.items() if station in STATION_DISTANCE_FIELDS}
+    if fields:
+        Patient.objects.filter(pk=patient_id).update(**fields)
@@ -0,0 +1,56 @@
+# users/renderers.py
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson 이 없으면 FastJSONRenderer 는 JSONRenderer 와 같다
+    orjson = None
+
+# datetime, Decimal, UUID 등 JSON / MessagePack 에 없는 값은 DRF JSONEncoder 와 같은 방법으로 바꿈
+_encode_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    orjson 으로 JSON 을 만드는 renderer (orjson 이 없으면 JSONRenderer 로 동작)
+    ?indent 등 들여쓰기를 요청하면 JSONRenderer 로 만든다
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer 처럼 정수 등 문자열이 아닌 dict key 도 문자열로 바꾸고,
+        # datetime 은 JSONEncoder 로 바꿈 (UTC 를 +00:00 이 아닌 Z 로, 마이크로초는 밀리초까지)
+        return orjson.dumps(data, default=_encode_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Accept: application/msgpack 인 요청 (아두이노 기지국, 환자 단말기) 에 MessagePack 으로 응답
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, use_bin_type=True, default=_encode_default)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Content-Type: application/msgpack 인 요청 본문을 읽음
+    """
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as error:
+            raise ParseError(f"MessagePack parse error - {error!r}")
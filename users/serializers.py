@@ -1,4 +1,7 @@
 # users/serializers.py
+import math
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
@@ -100,32 +103,103 @@ class ProfileREADSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Profile
-        fields = ('user', 'hospital', 'name', 'subjects')
+        fields = ('user', 'hospital', 'name', 'subjects', 'on_duty')
 
 
 # 의료진 프로필 수정
 class ProfileUPDATESerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        fields = ('name', 'subjects', 'hospital', 'token')
+        fields = ('name', 'subjects', 'hospital', 'token', 'on_duty')
 
 
 # 환자 1명 생성
 class PatientCREATESerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
-        fields = ('profile', 'name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image')
+        fields = ('profile', 'name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image', 'fall_risk')
+
+
+# 환자 여러 명 생성 (파일 가져오기), 담당 의료진은 URL 로 정해짐
+class PatientIMPORTSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ('name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image', 'fall_risk')
 
 
 # 환자 전체 조회, 환자 1명 조회
 class PatientREADSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
-        fields = ('id', 'name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image', 'ip_address')
+        fields = ('id', 'name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image', 'ip_address',
+                  'fall_risk')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        :param fields: 응답에 포함할 필드 (없으면 Meta.fields 전체)
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+# 환자 전체 조회 (query parameter)
+class PatientListQuerySerializer(serializers.Serializer):
+    fields = serializers.CharField(required=False)  # 응답에 포함할 필드, 쉼표로 구분 (예: id,name,image)
+
+    def validate_fields(self, value):
+        fields = tuple(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+        unknown = set(fields) - set(PatientREADSerializer.Meta.fields)
+        if not fields or unknown:
+            raise serializers.ValidationError(
+                f"choose from {', '.join(PatientREADSerializer.Meta.fields)}"
+            )
+        return fields
 
 
 # 환자 1명 수정
 class PatientUPDATESerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
-        fields = ('name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image')
+        fields = ('name', 'gender', 'age', 'blood_type', 'blood_rh', 'disease', 'extra', 'image', 'fall_risk')
+        # PUT 에서 빠져도 되는 필드 (나중에 추가된 필드)
+        optional_on_put = ('fall_risk',)
+
+
+# nan, inf 를 받지 않는 실수 (측정 시각, 거리 값 비교가 항상 거짓이 되지 않도록)
+class FiniteFloatField(serializers.FloatField):
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not math.isfinite(value):
+            self.fail('invalid')
+        return value
+
+
+# 기지국 거리 값 1개 (환자 / 의료진은 URL 로 정해짐)
+class StationReadingOneSerializer(serializers.Serializer):
+    station = serializers.CharField(max_length=20)  # 기지국 이름
+    real_distance = FiniteFloatField(min_value=0.0)
+    timestamp = FiniteFloatField(required=False)  # 기지국에서 측정한 시각 (unix time, 초), 없으면 받은 시각
+    # 기지국별 순번 (중복, 늦게 도착한 값을 버림), binary frame 과 같은 unsigned 32bit
+    sequence = serializers.IntegerField(min_value=0, max_value=2 ** 32 - 1, required=False)
+
+
+# 기지국 거리 값 여러 개 (한 번에 전송)
+class StationReadingSerializer(StationReadingOneSerializer):
+    patient_id = serializers.IntegerField(min_value=1)
+    timestamp = FiniteFloatField()  # 기지국에서 측정한 시각 (unix time, 초)
+
+
+# 환자 위치 이력 조회 (query parameter)
+class PositionHistoryQuerySerializer(serializers.Serializer):
+    start = serializers.FloatField(required=False)  # 조회 시작 시각 (unix time, 초), 기본값은 end 의 1시간 전
+    end = serializers.FloatField(required=False)  # 조회 끝 시각 (unix time, 초), 기본값은 지금
+    max_points = serializers.IntegerField(required=False, min_value=1)  # 최대 좌표 수
+
+
+# 의료진 -> 환자 여러 명 호출 (환자 단말기 동작)
+class PatientsCallSerializer(serializers.Serializer):
+    patients = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+    action = serializers.ChoiceField(choices=list(settings.TERMINAL_ACTUATION["ACTIONS"]),
+                                     default=settings.TERMINAL_ACTUATION["DEFAULT_ACTION"])
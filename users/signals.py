@@ -0,0 +1,93 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .models import Hospital, Station, Zone, Profile, Patient
+from .calibration import calibration_cache
+from .hospital_cache import hospital_response_cache
+from .authentication import token_user_cache
+from .staff_locator import staff_locator
+from .geofence import geofence_engine
+from .call_debounce import call_debouncer
+from .ranging import ranging_accumulator
+
+
+# 병원이나 기지국의 좌표가 바뀌면 캐시된 병원 위치 계산 정보와 병원 조회 응답을 지운다
+@receiver([post_save, post_delete], sender=Hospital)
+def invalidate_hospital(sender, instance, **kwargs):
+    calibration_cache.invalidate_hospital(instance.pk)
+    hospital_response_cache.invalidate_hospital(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Station)
+def invalidate_station(sender, instance, **kwargs):
+    calibration_cache.invalidate_hospital(instance.hospital_id)
+
+
+# 의료진의 병원이나 환자의 의료진이 바뀌면 캐시된 환자 -> 병원 연결을 지운다
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    calibration_cache.invalidate_profile(instance.pk)
+
+
+# 근무를 마치거나 병원을 옮기거나 삭제된 의료진은 가까운 의료진 찾기에서 뺀다
+@receiver(post_save, sender=Profile)
+def update_staff_locator(sender, instance, **kwargs):
+    if not instance.on_duty or staff_locator.hospital_id_for_profile(instance.pk) not in (None, instance.hospital_id):
+        staff_locator.remove(instance.pk)
+
+
+@receiver(post_delete, sender=Profile)
+def remove_staff_locator(sender, instance, **kwargs):
+    staff_locator.remove(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Patient)
+def invalidate_patient(sender, instance, **kwargs):
+    calibration_cache.invalidate_patient(instance.pk)
+
+
+# 구역이 바뀌면 병원의 구역 격자를, 환자가 바뀌면 낙상 위험 여부를 다시 읽는다
+@receiver([post_save, post_delete], sender=Zone)
+def invalidate_zone(sender, instance, **kwargs):
+    geofence_engine.invalidate_hospital(instance.hospital_id)
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_patient_fall_risk(sender, instance, **kwargs):
+    geofence_engine.invalidate_patient(instance.pk)
+
+
+@receiver(post_delete, sender=Patient)
+def forget_patient_zones(sender, instance, **kwargs):
+    geofence_engine.forget_patient(instance.pk)
+
+
+# 지운 환자의 진행 중인 호출은 버린다 (같은 ID 를 다시 쓰는 DB 도 있음)
+@receiver(post_delete, sender=Patient)
+def forget_patient_call(sender, instance, **kwargs):
+    call_debouncer.discard(instance.pk)
+
+
+# 지운 환자, 의료진의 모이는 중인 거리 값과 기지국별 마지막 순번을 버린다
+@receiver(post_delete, sender=Patient)
+def forget_patient_ranging(sender, instance, **kwargs):
+    ranging_accumulator.forget(instance.pk)
+
+
+@receiver(post_delete, sender=Profile)
+def forget_staff_ranging(sender, instance, **kwargs):
+    ranging_accumulator.forget(("staff", instance.pk))
+
+
+# 토큰이 지워지거나 바뀌면, 유저가 바뀌면 (비활성화, 비밀번호 변경 등) 캐시된 토큰 -> 유저 조회 결과를 지운다
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    token_user_cache.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    token_user_cache.invalidate_user(instance.pk)
@@ -0,0 +1,152 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+
+
+class StaffGrid:
+    """
+    병원 1곳의 의료진 위치를 담는 격자 (도면 좌표, 칸 크기 cell_size)
+    위치 갱신은 O(1), k-최근접 조회는 환자 주변 칸부터 바깥으로 넓혀가며 필요한 칸만 본다
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = {}  # (칸 x, 칸 y) -> 의료진 ID set
+        self._positions = {}  # 의료진 ID -> (x좌표, y좌표, 갱신 시각, 칸)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _cell(self, x, y) -> tuple:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def update(self, profile_id, x, y, timestamp):
+        cell = self._cell(x, y)
+        previous = self._positions.get(profile_id)
+        if previous is not None and previous[3] != cell:
+            self._discard(profile_id, previous[3])
+        self._cells.setdefault(cell, set()).add(profile_id)
+        self._positions[profile_id] = (x, y, timestamp, cell)
+
+    def remove(self, profile_id):
+        previous = self._positions.pop(profile_id, None)
+        if previous is not None:
+            self._discard(profile_id, previous[3])
+
+    def _discard(self, profile_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(profile_id)
+            if not members:
+                del self._cells[cell]
+
+    def nearest(self, x, y, k, since) -> list:
+        """
+        :param x: 도면 상의 x좌표
+        :param y: 도면 상의 y좌표
+        :param k: 찾을 의료진 수
+        :param since: 이 시각 (unix time) 이전에 갱신된 위치는 무시
+        :return: 가까운 순서대로 의료진 ID 최대 k개
+        """
+        if not self._cells or k <= 0:
+            return []
+        center_x, center_y = self._cell(x, y)
+        # 위치가 있는 칸 중 가장 먼 칸까지의 칸 거리 (이보다 넓힐 필요 없음)
+        max_ring = max(max(abs(cell_x - center_x), abs(cell_y - center_y)) for cell_x, cell_y in self._cells)
+        found = []  # (거리 제곱, 의료진 ID)
+        for ring in range(max_ring + 1):
+            for cell in self._ring(center_x, center_y, ring):
+                for profile_id in self._cells.get(cell, ()):
+                    staff_x, staff_y, timestamp, _ = self._positions[profile_id]
+                    if timestamp >= since:
+                        found.append(((staff_x - x) ** 2 + (staff_y - y) ** 2, profile_id))
+            # 다음 칸 줄에 있는 의료진은 적어도 ring * cell_size 만큼 떨어져 있다
+            if len(found) >= k and sorted(found)[k - 1][0] <= (ring * self.cell_size) ** 2:
+                break
+        return [profile_id for _, profile_id in sorted(found)[:k]]
+
+    @staticmethod
+    def _ring(center_x, center_y, ring):
+        if ring == 0:
+            yield center_x, center_y
+            return
+        for cell_x in range(center_x - ring, center_x + ring + 1):
+            yield cell_x, center_y - ring
+            yield cell_x, center_y + ring
+        for cell_y in range(center_y - ring + 1, center_y + ring):
+            yield center_x - ring, cell_y
+            yield center_x + ring, cell_y
+
+
+class StaffLocator:
+    """
+    병원 ID -> StaffGrid, 근무 중인 의료진의 최근 위치 (프로세스 메모리)
+    의료진 배지의 위치 좌표가 계산될 때마다 갱신하고, 환자 호출을 받을 가까운 의료진을 찾는 데 사용
+    근무를 마치거나 병원을 옮긴 의료진은 signals 에서 지운다
+    """
+    def __init__(self, cell_size, max_age):
+        """
+        :param cell_size: 격자 칸 크기 (도면 좌표)
+        :param max_age: 이 시간 (초) 동안 위치가 갱신되지 않은 의료진은 찾지 않음
+        """
+        self.cell_size = cell_size
+        self.max_age = max_age
+        self._grids = {}  # 병원 ID -> StaffGrid
+        self._hospitals = {}  # 의료진 ID -> 병원 ID
+        self._lock = threading.Lock()
+
+    def update(self, hospital_id, profile_id, x, y, timestamp=None):
+        """
+        :param hospital_id: 의료진의 병원 ID
+        :param profile_id: 의료진 ID
+        :param x: 도면 상에서 의료진의 x좌표
+        :param y: 도면 상에서 의료진의 y좌표
+        :param timestamp: 위치를 계산한 시각 (unix time, 초), 없으면 지금
+        :return: none
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            previous_hospital_id = self._hospitals.get(profile_id)
+            if previous_hospital_id is not None and previous_hospital_id != hospital_id:
+                self._grids[previous_hospital_id].remove(profile_id)
+            grid = self._grids.get(hospital_id)
+            if grid is None:
+                grid = self._grids[hospital_id] = StaffGrid(self.cell_size)
+            grid.update(profile_id, x, y, timestamp)
+            self._hospitals[profile_id] = hospital_id
+
+    def remove(self, profile_id):
+        with self._lock:
+            hospital_id = self._hospitals.pop(profile_id, None)
+            if hospital_id is not None:
+                self._grids[hospital_id].remove(profile_id)
+
+    def hospital_id_for_profile(self, profile_id):
+        return self._hospitals.get(profile_id)
+
+    def nearest(self, hospital_id, x, y, k) -> list:
+        """
+        :param hospital_id: 병원 ID
+        :param x: 도면 상의 x좌표
+        :param y: 도면 상의 y좌표
+        :param k: 찾을 의료진 수
+        :return: 최근 max_age 초 안에 위치가 갱신된 의료진 중 가까운 순서대로 의료진 ID 최대 k개
+        """
+        since = time.time() - self.max_age
+        with self._lock:
+            grid = self._grids.get(hospital_id)
+            if grid is None:
+                return []
+            return grid.nearest(x, y, k, since)
+
+    def clear(self):
+        with self._lock:
+            self._grids.clear()
+            self._hospitals.clear()
+
+
+staff_locator = StaffLocator(
+    cell_size=settings.STAFF_LOCATOR["CELL_SIZE"],
+    max_age=settings.STAFF_LOCATOR["MAX_AGE"],
+)
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Q
+
+from .async_db import run_db
+from .calibration import calibration_cache
+from .models import Patient
+
+
+class Subscription:
+    """
+    구독자 1명의 우편함
+    환자별로 가장 최근 위치 좌표 1개만 보관하므로, 느린 구독자는 중간 좌표를 건너뛰고 최신 좌표만 받는다
+    """
+    def __init__(self, broker, topics: tuple, loop):
+        self.broker = broker
+        self.topics = topics
+        self._loop = loop
+        self._latest = {}  # 환자 ID -> 위치 좌표
+        self._event = asyncio.Event()
+        self._lock = threading.Lock()
+        self.dropped = 0  # 덮어써서 버린 중간 좌표 수
+
+    def put(self, fix: dict):
+        """
+        새 위치 좌표를 넣는 함수 (어떤 스레드에서든 호출 가능)
+        """
+        with self._lock:
+            if fix["id"] in self._latest:
+                self.dropped += 1
+            was_empty = not self._latest
+            self._latest[fix["id"]] = fix
+        if was_empty:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def get(self) -> list:
+        """
+        :return: 마지막으로 가져간 뒤에 들어온 환자별 최신 위치 좌표 목록
+        """
+        while True:
+            await self._event.wait()
+            with self._lock:
+                fixes, self._latest = list(self._latest.values()), {}
+                self._event.clear()
+            if fixes:
+                return fixes
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class PositionBroker:
+    """
+    환자 위치 좌표를 병원 / 의료진 단위로 구독자에게 전달하는 프로세스 내 pub/sub
+    다른 프로세스 (manage.py run_ranging_ingest, 다른 gunicorn worker) 가 계산한 위치 좌표는 publish_fixes 로
+    들어오지 않으므로, 구독자가 있는 동안 poll_interval 마다 DB 의 환자 좌표를 읽어 바뀐 좌표도 전달한다
+    """
+    def __init__(self, poll_interval):
+        """
+        :param poll_interval: DB 의 환자 좌표를 다시 읽는 간격 (초), 0 이면 읽지 않음
+        """
+        self.poll_interval = poll_interval
+        self._subscriptions = {}  # 주제 -> 구독자 set
+        self._published = {}  # 환자 ID -> 마지막으로 전달한 (x좌표, y좌표)
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics) -> Subscription:
+        """
+        :param topics: ("hospital", 병원 ID) 또는 ("doctor", 의료진 ID) 목록
+        :return: Subscription (실행 중인 이벤트 루프에서 호출해야 한다)
+        """
+        subscription = Subscription(self, tuple(topics), asyncio.get_running_loop())
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions.setdefault(topic, set()).add(subscription)
+        if self.poll_interval > 0 and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.ensure_future(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[topic]
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def publish_fixes(self, positions: dict):
+        """
+        새로 계산된 위치 좌표를 구독자에게 전달하는 함수
+        :param positions: 환자 ID -> (도면 상에서 환자의 x좌표, y좌표)
+        :return: none
+        """
+        if not self._subscriptions:
+            return
+        for patient_id, position in positions.items():
+            # 위치 좌표를 계산하면서 캐시에 들어간 값이므로 쿼리가 발생하지 않는다
+            self._deliver(patient_id, calibration_cache.hospital_id_for_patient(patient_id),
+                          calibration_cache.profile_id_for_patient(patient_id), position)
+
+    def _deliver(self, patient_id, hospital_id, profile_id, position):
+        drawing_patient_x, drawing_patient_y = position
+        fix = {"id": patient_id, "x": drawing_patient_x, "y": drawing_patient_y, "timestamp": time.time()}
+        with self._lock:
+            self._published[patient_id] = (drawing_patient_x, drawing_patient_y)
+            subscribers = (self._subscriptions.get(("hospital", hospital_id), set())
+                           | self._subscriptions.get(("doctor", profile_id), set()))
+        for subscription in subscribers:
+            subscription.put(fix)
+
+    async def _poll(self):
+        """
+        구독자가 없어질 때까지 poll_interval 마다 구독 중인 병원 / 의료진의 환자 좌표를 읽어 바뀐 좌표를 전달하는 작업
+        처음 읽은 환자의 좌표는 기준으로만 기록하고 전달하지 않는다
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                with self._lock:
+                    topics = list(self._subscriptions)
+                if not topics:
+                    return
+                for patient_id, profile_id, hospital_id, x, y in await run_db(self._read_positions, topics):
+                    with self._lock:
+                        published = self._published.get(patient_id)
+                        if published is None:
+                            self._published[patient_id] = (x, y)
+                            continue
+                    if published != (x, y):
+                        self._deliver(patient_id, hospital_id, profile_id, (x, y))
+        finally:
+            with self._lock:
+                self._published.clear()
+
+    @staticmethod
+    def _read_positions(topics) -> list:
+        """
+        :param topics: 구독 중인 주제 목록
+        :return: [(환자 ID, 의료진 ID, 병원 ID, x좌표, y좌표), ...]
+        """
+        hospitals = [topic_id for kind, topic_id in topics if kind == "hospital"]
+        doctors = [topic_id for kind, topic_id in topics if kind == "doctor"]
+        return list(
+            Patient.objects
+            .filter(Q(profile__hospital_id__in=hospitals) | Q(profile_id__in=doctors))
+            .values_list("id", "profile_id", "profile__hospital_id", "drawing_patient_x", "drawing_patient_y")
+        )
+
+
+position_broker = PositionBroker(poll_interval=settings.POSITION_STREAM_POLL_INTERVAL)
+
+
+# users/stream/hospital/<int:hospital_id>/, users/stream/doctor/<int:profile_id>/
+STREAM_PATH = re.compile(r"^/users/stream/(?P<kind>hospital|doctor)/(?P<id>\d+)/$")
+
+
+def stream_application(django_application):
+    """
+    위치 좌표 스트리밍 경로는 직접 처리하고 나머지는 Django 로 넘기는 ASGI 애플리케이션
+    http 요청은 Server-Sent Events, websocket 요청은 WebSocket 으로 응답한다
+    :param django_application: get_asgi_application()
+    :return: ASGI 애플리케이션
+    """
+    async def application(scope, receive, send):
+        match = STREAM_PATH.match(scope.get("path", "")) if scope["type"] in ("http", "websocket") else None
+        if match is None:
+            if scope["type"] == "websocket":
+                await receive()
+                await send({"type": "websocket.close", "code": 4404})
+                return
+            await django_application(scope, receive, send)
+            return
+
+        topic = (match["kind"], int(match["id"]))
+        if scope["type"] == "http":
+            await _serve_sse(topic, receive, send)
+        else:
+            await _serve_websocket(topic, receive, send)
+
+    return application
+
+
+async def _serve_sse(topic, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+
+    async def wait_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def send_fixes(fixes):
+        body = "".join(f"event: position\ndata: {json.dumps(fix)}\n\n" for fix in fixes)
+        await send({"type": "http.response.body", "body": body.encode(), "more_body": True})
+
+    async def send_keepalive():
+        await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+
+    await _pump(topic, wait_disconnect(), send_fixes, send_keepalive)
+
+
+async def _serve_websocket(topic, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+
+    async def wait_disconnect():
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    async def send_fixes(fixes):
+        await send({"type": "websocket.send", "text": json.dumps(fixes)})
+
+    async def send_keepalive():
+        await send({"type": "websocket.send", "text": "[]"})
+
+    await _pump(topic, wait_disconnect(), send_fixes, send_keepalive)
+
+
+async def _pump(topic, disconnected, send_fixes, send_keepalive):
+    """
+    연결이 끊길 때까지 구독한 위치 좌표를 보내는 함수
+    """
+    subscription = position_broker.subscribe([topic])
+    disconnected = asyncio.ensure_future(disconnected)
+    try:
+        while not disconnected.done():
+            receiving = asyncio.ensure_future(subscription.get())
+            await asyncio.wait({receiving, disconnected}, timeout=settings.POSITION_STREAM_KEEPALIVE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if receiving.done():
+                await send_fixes(receiving.result())
+            else:
+                receiving.cancel()
+                if not disconnected.done():
+                    await send_keepalive()
+    finally:
+        disconnected.cancel()
+        subscription.close()
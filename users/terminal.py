@@ -0,0 +1,218 @@
+import ipaddress
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+from cachetools import TTLCache
+from django.conf import settings
+
+from .logs import log_event
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_ACTUATIONS = REGISTRY.counter(
+    "igo_terminal_actuations_total", "Patient terminal actuation requests by result",
+    labelnames=("action", "result"),
+)
+TERMINAL_LATENCY = REGISTRY.histogram(
+    "igo_terminal_actuation_duration_seconds", "Patient terminal actuation request latency",
+)
+
+# 동작 결과
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+PENDING = "pending"
+
+
+class TerminalClient:
+    """
+    환자 단말기 (아두이노) 의 부저 / LED / 진동을 켜는 HTTP client
+    단말기 주소마다 keep-alive 연결 1개를 가진 urllib3 pool 을 두고 (같은 단말기로 가는 요청은 순서대로),
+    요청은 워커 스레드에서 보내므로 API 요청은 기다리지 않는다
+    주소 수가 max_terminals 를 넘으면 가장 오래 안 쓴 단말기의 pool 부터 닫는다
+    단말기 주소는 환자 앱이 보낸 값이므로 allowed_networks 안의 ip 로만 요청을 보낸다
+    """
+    def __init__(self, connect_timeout, read_timeout, workers, max_terminals, actions, allowed_networks):
+        """
+        :param connect_timeout: 연결 timeout (초)
+        :param read_timeout: 응답 timeout (초)
+        :param workers: 요청을 보내는 워커 스레드 수 (동시에 동작시킬 수 있는 단말기 수)
+        :param max_terminals: pool 을 유지할 최대 단말기 수
+        :param actions: 동작 이름 -> 단말기 URL 경로
+        :param allowed_networks: 단말기가 있을 수 있는 네트워크 목록 (예: "192.168.0.0/16")
+        """
+        self.timeout = urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+        # 같은 단말기로 가는 앞 요청이 끝나기를 기다리는 최대 시간 (초)
+        self.pool_timeout = connect_timeout + read_timeout
+        self.workers = workers
+        self.max_terminals = max_terminals
+        self.actions = actions
+        self.allowed_networks = [ipaddress.ip_network(network) for network in allowed_networks]
+
+        self._pools = OrderedDict()  # 단말기 주소 -> HTTPConnectionPool
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def pool_for(self, address: str) -> urllib3.HTTPConnectionPool:
+        """
+        :param address: 단말기 주소 (ip 또는 ip:port)
+        :return: 단말기의 connection pool
+        """
+        with self._lock:
+            pool = self._pools.get(address)
+            if pool is not None:
+                self._pools.move_to_end(address)
+                return pool
+            host, port = self.check_address(address)
+            pool = self._pools[address] = urllib3.HTTPConnectionPool(
+                host, port, maxsize=1, block=True, timeout=self.timeout, retries=False,
+            )
+            while len(self._pools) > self.max_terminals:
+                _, evicted = self._pools.popitem(last=False)
+                evicted.close()
+            return pool
+
+    def check_address(self, address: str) -> tuple:
+        """
+        :param address: 단말기 주소 (ip 또는 ip:port)
+        :return: (ip, port)
+        :raise ValueError: ip 가 아니거나 (host 이름은 받지 않음) allowed_networks 밖의 주소
+        """
+        url = urllib3.util.parse_url(f"http://{address}")
+        if url.host is None:
+            raise ValueError(f"invalid terminal address: {address!r}")
+        ip = ipaddress.ip_address(url.host.strip("[]"))
+        if not any(ip in network for network in self.allowed_networks):
+            raise ValueError(f"terminal address not allowed: {address!r}")
+        return str(ip), url.port or 80
+
+    def actuate(self, address: str, action: str) -> dict:
+        """
+        단말기에 동작 요청 1번을 보내는 함수 (워커 스레드에서 실행, 예외를 던지지 않음)
+        :param address: 단말기 주소
+        :param action: 동작 이름 (settings.TERMINAL_ACTUATION["ACTIONS"])
+        :return: {"result": OK / ERROR / TIMEOUT, "status": HTTP 상태 코드 또는 None, "elapsed": 걸린 시간 (초)}
+        """
+        started = time.perf_counter()
+        status = None
+        try:
+            response = self.pool_for(address).urlopen("GET", self.actions[action], pool_timeout=self.pool_timeout)
+            status = response.status
+            result = OK if 200 <= status < 300 else ERROR
+        except urllib3.exceptions.NewConnectionError as error:
+            # 연결 거부 등 (urllib3 에서 ConnectTimeoutError 의 하위 클래스이므로 먼저 검사)
+            log_event(logger, logging.WARNING, "terminal actuation failed", address=address, error=repr(error))
+            result = ERROR
+        except (urllib3.exceptions.TimeoutError, urllib3.exceptions.EmptyPoolError):
+            result = TIMEOUT
+        except (urllib3.exceptions.HTTPError, OSError, ValueError) as error:
+            # 잘못된 주소, 연결이 끊김 등
+            log_event(logger, logging.WARNING, "terminal actuation failed", address=address, error=repr(error))
+            result = ERROR
+        elapsed = time.perf_counter() - started
+        TERMINAL_LATENCY.observe(elapsed)
+        TERMINAL_ACTUATIONS.inc(action=action, result=result)
+        return {"result": result, "status": status, "elapsed": elapsed}
+
+    def submit(self, address: str, action: str, on_result=None):
+        """
+        :param address: 단말기 주소
+        :param action: 동작 이름
+        :param on_result: actuate() 의 결과를 받을 함수, 워커 스레드에서 호출된다
+        :return: actuate() 의 결과가 담길 Future
+        """
+        future = self._get_executor().submit(self.actuate, address, action)
+        if on_result is not None:
+            future.add_done_callback(lambda done: on_result(done.result()))
+        return future
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="terminal")
+        return self._executor
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+
+class ActuationResults:
+    """
+    환자 여러 명 호출 1번 (task) 의 단말기별 결과를 저장하는 TTL 캐시 (프로세스 메모리)
+    결과는 워커 스레드에서 채워지고, 의료진 앱은 task ID 로 조회한다
+    """
+    def __init__(self, maxsize, ttl):
+        self._tasks = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def create(self, patient_ids) -> str:
+        """
+        :param patient_ids: 단말기를 동작시킬 환자 ID 들
+        :return: task ID
+        """
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self._tasks[task_id] = {patient_id: {"result": PENDING} for patient_id in patient_ids}
+        return task_id
+
+    def record(self, task_id, patient_id, result: dict):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task[patient_id] = result
+
+    def get(self, task_id):
+        """
+        :return: 환자 ID -> 결과, 없거나 만료된 task 면 None
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return None if task is None else dict(task)
+
+
+def actuate_patients(patients, action) -> tuple:
+    """
+    환자 여러 명의 단말기를 동시에 동작시키는 함수 (요청을 워커 스레드에 넘기고 바로 반환)
+    :param patients: (환자 ID, 단말기 주소) 목록, 없는 환자는 주소가 None
+    :param action: 동작 이름
+    :return: (task ID, 환자 ID -> 지금까지의 결과), 없는 환자나 주소를 모르는 환자는 바로 ERROR
+    """
+    task_id = actuation_results.create(patient_id for patient_id, _ in patients)
+    for patient_id, address in patients:
+        if not address:
+            actuation_results.record(task_id, patient_id, {
+                "result": ERROR, "status": None, "elapsed": 0.0,
+                "detail": "patient not found" if address is None else "no ip_address",
+            })
+            continue
+        terminal_client.submit(address, action, on_result=lambda result, patient_id=patient_id:
+                               actuation_results.record(task_id, patient_id, result))
+    return task_id, actuation_results.get(task_id)
+
+
+terminal_client = TerminalClient(
+    connect_timeout=settings.TERMINAL_ACTUATION["CONNECT_TIMEOUT"],
+    read_timeout=settings.TERMINAL_ACTUATION["READ_TIMEOUT"],
+    workers=settings.TERMINAL_ACTUATION["WORKERS"],
+    max_terminals=settings.TERMINAL_ACTUATION["MAX_TERMINALS"],
+    actions=settings.TERMINAL_ACTUATION["ACTIONS"],
+    allowed_networks=settings.TERMINAL_ACTUATION["ALLOWED_NETWORKS"],
+)
+actuation_results = ActuationResults(
+    maxsize=settings.TERMINAL_ACTUATION["MAX_TASKS"],
+    ttl=settings.TERMINAL_ACTUATION["RESULT_TTL"],
+)
@@ -1,3 +1,1814 @@
-from django.test import TestCase
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+import numpy as np
+import orjson
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from firebase_admin import exceptions, messaging
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .calibration import calibration_cache
+from .care_team import prune_unregistered_tokens
+from .call_debounce import MERGED, OPENED, CallDebouncer, call_debouncer
+from .ingest import FRAME, INGEST_DROPPED, RangingIngestServer, decode_frames, encode_frame
+from .geofence import ENTER, EXIT, GeofenceEngine, ZoneIndex, compile_zone, geofence_engine
+from .geofence import send_zone_alert_by_fcm
+from .async_db import run_db
+from .authentication import CachedTokenAuthentication, token_user_cache
+from .metrics import FCM_MESSAGES, FCM_RETRIES, RANGING_DROPPED, REQUEST_DB_QUERIES, serve_metrics
+from .fcm import FCMDispatcher, SendResult, StubTransport
+from .logs import JSONFormatter
+from .history import POINT, PositionHistoryWriter
+from .hospital_cache import hospital_response_cache
+from .multilateration import MultilaterationSolver
+from .models import Hospital, Patient, PositionChunk, Profile, Station, Zone
+from .renderers import FastJSONRenderer, MessagePackRenderer
+from .serializers import PatientREADSerializer
+from .profiling import RECORDS_FILE, request_profiler
+from .staff_locator import StaffLocator
+from .streaming import position_broker, stream_application
+from .ranging import RangingAccumulator, ranging_accumulator
+from .terminal import ERROR, OK, PENDING, TIMEOUT, TerminalClient, terminal_client
+
+
+def asgi_request(method, path, query_string=b"", headers=(), body=b"", application=None):
+    """
+    IGO/asgi.py 의 application 에 ASGI 요청 1개를 직접 보내는 함수 (uvicorn 으로 배포한 것과 같은 경로)
+    :param application: 요청을 보낼 ASGI application, 없으면 IGO.asgi.application
+    :return: (상태 코드, header dict, 응답 body)
+    """
+    if application is None:
+        from IGO.asgi import application
+
+    response = {"status": None, "headers": {}, "body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode().lower(): value.decode() for key, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query_string, "root_path": "",
+        "headers": [(b"host", b"testserver"), *headers], "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+    asyncio.run(application(scope, receive, send))
+    return response["status"], response["headers"], response["body"]
+
+
+# 위치 이력은 백그라운드 스레드에서 저장하므로 쿼리 수 검사에서 뺀다
+@override_settings(POSITION_HISTORY={
+    "ENABLED": False, "BUCKET_SECONDS": 60, "FLUSH_SIZE": 1000, "FLUSH_INTERVAL": 1.0,
+    "MAX_POINTS": 2000, "RETENTION_DAYS": 30,
+})
+class PatientWriteQueryCountTest(TestCase):
+    """
+    환자 정보를 쓰는 경로마다 실행되는 SQL 문 수 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = Hospital.objects.create(
+            name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000,
+            real_station1_x=0, real_station1_y=0,
+            real_station2_x=1000000, real_station2_y=0,
+            real_station3_x=0, real_station3_y=500000,
+        )
+        user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+        cls.profile = user.profile
+        cls.profile.hospital = cls.hospital
+        cls.profile.save()
+        cls.patient = Patient.objects.create(profile=cls.profile, name="환자", disease="감기", extra="없음")
+
+    def setUp(self):
+        self.client = APIClient()
+        calibration_cache.clear()
+        ranging_accumulator.clear()
+        geofence_engine.clear()
+
+    def patient_url(self, patient_id=None):
+        return f"/users/doctor/{self.profile.pk}/patient/{patient_id or self.patient.pk}/"
+
+    def send_station(self, station, real_distance, patient_id=None):
+        return self.client.post(f"/users/send/station/{patient_id or self.patient.pk}/",
+                                {"station": station, "real_distance": real_distance}, format="json")
+
+    def test_ip_address_is_one_update(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(f"/users/send/ip_address/{self.patient.pk}/",
+                                        {"ip_address": "10.0.0.7"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.ip_address, "10.0.0.7")
+        self.assertEqual(self.patient.disease, "감기")
+
+    def test_ip_address_outside_hospital_network(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(f"/users/send/ip_address/{self.patient.pk}/",
+                                        {"ip_address": "169.254.169.254"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.ip_address, "")
+
+    def test_ip_address_unknown_patient(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/users/send/ip_address/9999/", {"ip_address": "10.0.0.7"}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_station_partial_readings_do_not_touch_database(self):
+        # 기지국 이름을 검사할 병원 위치 계산 정보 조회 1번, 그 다음부터는 캐시
+        with self.assertNumQueries(1):
+            self.assertEqual(self.send_station("A", 30.0).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.send_station("B", 80.0).status_code, 200)
+
+    def test_station_complete_reading(self):
+        self.send_station("A", 30.0)
+        self.send_station("B", 80.0)
+        # 병원 구역 조회 1번 + 좌표 UPDATE 1번
+        with self.assertNumQueries(2):
+            self.assertEqual(self.send_station("C", 40.0).status_code, 200)
+
+        self.send_station("A", 30.0)
+        self.send_station("B", 80.0)
+        # 캐시에 있으면 좌표 UPDATE 1번
+        with self.assertNumQueries(1):
+            self.assertEqual(self.send_station("C", 40.0).status_code, 200)
+
+        self.patient.refresh_from_db()
+        self.assertNotEqual((self.patient.drawing_patient_x, self.patient.drawing_patient_y), (0.0, 0.0))
+        self.assertEqual(self.patient.disease, "감기")
+
+    def test_station_unknown_patient(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.send_station("A", 30.0, patient_id=9999).status_code, 404)
+        self.assertEqual(ranging_accumulator.pending(9999), {})
+
+    def test_station_duplicate_sequence_is_dropped(self):
+        url = f"/users/send/station/{self.patient.pk}/"
+        reading = {"station": "A", "real_distance": 30.0, "sequence": 7, "timestamp": 100.0}
+        self.client.post(url, reading, format="json")
+        # 다시 보낸 거리 값은 데이터베이스에 접근하지 않고 버림
+        with self.assertNumQueries(0):
+            response = self.client.post(url, dict(reading, real_distance=40.0), format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ranging_accumulator.pending(self.patient.pk), {"A": 300000.0})
+
+    def test_station_invalid_order_fields(self):
+        url = f"/users/send/station/{self.patient.pk}/"
+        for invalid in ({"sequence": "abc"}, {"sequence": -1}, {"sequence": 2 ** 32}, {"timestamp": "nan"},
+                        {"timestamp": "inf"}, {"real_distance": "nan"}):
+            response = self.client.post(url, dict({"station": "A", "real_distance": 30.0}, **invalid), format="json")
+            self.assertEqual(response.status_code, 400, invalid)
+            self.assertIn(next(iter(invalid)), response.data)
+        self.assertEqual(self.client.post(url, {"real_distance": 30.0}, format="json").status_code, 400)
+        self.assertEqual(ranging_accumulator.pending(self.patient.pk), {})
+
+    def test_bulk_invalid_timestamp(self):
+        readings = [{"patient_id": self.patient.pk, "station": "A", "real_distance": 30.0, "timestamp": "nan"}]
+        self.assertEqual(self.client.post("/users/send/station/bulk/", readings, format="json").status_code, 400)
+
+    def test_station_unknown_name(self):
+        # 병원에 없는 기지국의 거리 값은 모아두지 않는다
+        self.assertEqual(self.send_station("Z", 30.0).status_code, 400)
+        self.assertEqual(self.send_station("A", 30.0).status_code, 200)
+        self.assertEqual(ranging_accumulator.pending(self.patient.pk), {"A": 300000.0})
+
+    def test_bulk_unknown_station_is_not_found(self):
+        readings = [
+            {"patient_id": self.patient.pk, "station": "A", "real_distance": 30.0, "timestamp": 100.0},
+            {"patient_id": self.patient.pk, "station": "Z", "real_distance": 30.0, "timestamp": 100.1},
+            {"patient_id": 9999, "station": "A", "real_distance": 30.0, "timestamp": 100.2},
+        ]
+        response = self.client.post("/users/send/station/bulk/", readings, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.data], ["stored", "not_found", "not_found"])
+        self.assertEqual(ranging_accumulator.pending(self.patient.pk), {"A": 300000.0})
+
+    def test_bulk_mixed_batch(self):
+        second = Patient.objects.create(profile=self.profile, name="환자2")
+        third = Patient.objects.create(profile=self.profile, name="환자3")
+        patient_id = self.patient.pk
+        # 측정 시각 순서와 다르게 보내도 측정 시각 순서대로 반영하고, 결과는 보낸 순서대로
+        readings = [
+            {"patient_id": patient_id, "station": "C", "real_distance": 40.0, "timestamp": 100.6},
+            {"patient_id": patient_id, "station": "A", "real_distance": 30.0, "timestamp": 100.0, "sequence": 1},
+            {"patient_id": second.pk, "station": "A", "real_distance": 20.0, "timestamp": 100.3},
+            {"patient_id": patient_id, "station": "A", "real_distance": 35.0, "timestamp": 100.1, "sequence": 1},
+            {"patient_id": patient_id, "station": "B", "real_distance": 80.0, "timestamp": 100.2},
+            {"patient_id": 9999, "station": "A", "real_distance": 30.0, "timestamp": 100.4},
+            {"patient_id": second.pk, "station": "Z", "real_distance": 30.0, "timestamp": 100.5},
+            {"patient_id": third.pk, "station": "A", "real_distance": 50.0, "timestamp": 100.7},
+            {"patient_id": third.pk, "station": "B", "real_distance": 60.0, "timestamp": 100.8},
+            {"patient_id": third.pk, "station": "C", "real_distance": 70.0, "timestamp": 100.9},
+        ]
+        # 환자 3명의 병원 위치 계산 정보 1번 + 병원 구역 1번 + 좌표 bulk UPDATE 1번
+        with self.assertNumQueries(3):
+            response = self.client.post("/users/send/station/bulk/", readings, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(result["patient_id"], result["station"], result["status"]) for result in response.data], [
+            (patient_id, "C", "computed"),
+            (patient_id, "A", "stored"),
+            (second.pk, "A", "stored"),
+            # 같은 순번으로 다시 보낸 거리 값
+            (patient_id, "A", "dropped"),
+            (patient_id, "B", "stored"),
+            (9999, "A", "not_found"),
+            (second.pk, "Z", "not_found"),
+            (third.pk, "A", "stored"),
+            (third.pk, "B", "stored"),
+            (third.pk, "C", "computed"),
+        ])
+        computed = {result["patient_id"]: (result["x"], result["y"]) for result in response.data
+                    if result["status"] == "computed"}
+        self.assertEqual(set(computed), {patient_id, third.pk})
+        for patient in Patient.objects.filter(pk__in=computed):
+            self.assertAlmostEqual(patient.drawing_patient_x, computed[patient.pk][0])
+            self.assertAlmostEqual(patient.drawing_patient_y, computed[patient.pk][1])
+        self.assertEqual(ranging_accumulator.pending(second.pk), {"A": 200000.0})
+
+        # 캐시에 있으면 좌표 UPDATE 1번 (없는 환자는 나중에 등록될 수 있으므로 다시 조회 1번)
+        readings = [dict(reading, timestamp=reading["timestamp"] + 10, sequence=2) for reading in readings]
+        with self.assertNumQueries(2):
+            response = self.client.post("/users/send/station/bulk/", readings, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_put_is_one_update(self):
+        Patient.objects.filter(pk=self.patient.pk).update(ip_address="10.0.0.7", drawing_patient_x=12.5)
+        data = {"name": "새 이름", "gender": False, "age": 70, "blood_type": 2, "blood_rh": False,
+                "disease": "폐렴", "extra": "입원", "image": 3}
+        with self.assertNumQueries(1):
+            response = self.client.put(self.patient_url(), data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.patient.refresh_from_db()
+        self.assertEqual((self.patient.name, self.patient.age, self.patient.disease), ("새 이름", 70, "폐렴"))
+        # 수정하지 않는 필드는 그대로
+        self.assertEqual((self.patient.ip_address, self.patient.drawing_patient_x), ("10.0.0.7", 12.5))
+
+    def test_put_requires_every_field(self):
+        with self.assertNumQueries(0):
+            response = self.client.put(self.patient_url(), {"name": "새 이름"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("disease", response.data)
+
+    def test_put_unknown_patient(self):
+        data = {"name": "새 이름", "gender": False, "age": 70, "blood_type": 2, "blood_rh": False,
+                "disease": "폐렴", "extra": "입원", "image": 3}
+        with self.assertNumQueries(1):
+            response = self.client.put(self.patient_url(9999), data, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_patch_updates_only_sent_fields(self):
+        with self.assertNumQueries(1) as context:
+            response = self.client.patch(self.patient_url(), {"age": 41}, format="json")
+        self.assertEqual(response.status_code, 200)
+        sql = context.captured_queries[0]["sql"]
+        self.assertIn('"age"', sql)
+        self.assertNotIn('"disease"', sql)
+        self.patient.refresh_from_db()
+        self.assertEqual((self.patient.age, self.patient.name, self.patient.disease), (41, "환자", "감기"))
+
+    def test_fall_risk_update_refreshes_cached_value(self):
+        # 구역 알림은 캐시된 낙상 위험 여부를 쓰므로, update() 로 저장해도 캐시를 지워야 한다
+        self.assertEqual(geofence_engine.fall_risk_for_patients([self.patient.pk]), {self.patient.pk: False})
+        response = self.client.patch(self.patient_url(), {"fall_risk": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(geofence_engine.fall_risk_for_patients([self.patient.pk]), {self.patient.pk: True})
+
+        data = {"name": "환자", "gender": False, "age": 70, "blood_type": 2, "blood_rh": False,
+                "disease": "감기", "extra": "없음", "image": 3, "fall_risk": False}
+        self.assertEqual(self.client.put(self.patient_url(), data, format="json").status_code, 200)
+        self.assertEqual(geofence_engine.fall_risk_for_patients([self.patient.pk]), {self.patient.pk: False})
+
+    def test_patch_unknown_patient(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.patch(self.patient_url(9999), {"age": 41}, format="json").status_code, 404)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.patch(self.patient_url(9999), {}, format="json").status_code, 404)
+
+
+class FakeTerminalServer:
+    """
+    환자 단말기를 흉내 내는 로컬 HTTP 서버
+    keep-alive (HTTP/1.1) 로 응답하고, 받은 요청 경로와 새로 맺은 연결 수를 기록한다
+    """
+    def __init__(self, delay=0.0, status=200):
+        """
+        :param delay: 응답하기 전에 기다리는 시간 (초)
+        :param status: 응답 상태 코드
+        """
+        self.delay = delay
+        self.status = status
+        self.paths = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.paths.append(self.path)
+                if fake.delay:
+                    time.sleep(fake.delay)
+                body = b"OK"
+                try:
+                    self.send_response(fake.status)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except ConnectionError:
+                    # timeout 으로 client 가 먼저 끊은 경우
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        """
+        :return: 환자 ip_address 에 넣을 주소 (127.0.0.1:port)
+        """
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-terminal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class TerminalClientTest(SimpleTestCase):
+    """
+    환자 단말기 client 검사 (FakeTerminalServer 사용)
+    """
+    def setUp(self):
+        self.client = TerminalClient(connect_timeout=0.5, read_timeout=0.2, workers=8, max_terminals=10,
+                                     actions={"buzzer": "/gpio1/1", "led": "/gpio2/1"},
+                                     allowed_networks=["127.0.0.0/8"])
+        self.servers = []
+
+    def tearDown(self):
+        self.client.close()
+        for server in self.servers:
+            server.stop()
+
+    def start_server(self, **kwargs) -> FakeTerminalServer:
+        server = FakeTerminalServer(**kwargs).start()
+        self.servers.append(server)
+        return server
+
+    def test_reuses_keep_alive_connection(self):
+        server = self.start_server()
+        self.assertEqual(self.client.actuate(server.address, "buzzer")["result"], OK)
+        self.assertEqual(self.client.actuate(server.address, "led")["result"], OK)
+        self.assertEqual(server.paths, ["/gpio1/1", "/gpio2/1"])
+        self.assertEqual(server.connections, 1)
+
+    def test_error_status(self):
+        server = self.start_server(status=500)
+        result = self.client.actuate(server.address, "buzzer")
+        self.assertEqual((result["result"], result["status"]), (ERROR, 500))
+
+    def test_read_timeout(self):
+        server = self.start_server(delay=1.0)
+        result = self.client.actuate(server.address, "buzzer")
+        self.assertEqual(result["result"], TIMEOUT)
+        self.assertLess(result["elapsed"], 0.8)
+
+    def test_connection_refused(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.assertEqual(self.client.actuate(f"127.0.0.1:{port}", "buzzer")["result"], ERROR)
+
+    def test_address_outside_allowed_networks(self):
+        server = self.start_server()
+        self.client.allowed_networks = [ipaddress.ip_network("10.0.0.0/8")]
+        for address in (server.address, "169.254.169.254", "localhost", "10.0.0.7@127.0.0.1", "[::1]:80"):
+            with self.assertRaises(ValueError):
+                self.client.check_address(address)
+        self.assertEqual(self.client.check_address("10.0.0.7:8080"), ("10.0.0.7", 8080))
+        # 요청을 보내지 않고 ERROR
+        self.assertEqual(self.client.actuate(server.address, "buzzer")["result"], ERROR)
+        self.assertEqual(server.paths, [])
+
+    def test_fan_out_is_concurrent(self):
+        servers = [self.start_server(delay=0.15) for _ in range(5)]
+        started = time.perf_counter()
+        futures = [self.client.submit(server.address, "buzzer") for server in servers]
+        # 제출은 기다리지 않는다
+        self.assertLess(time.perf_counter() - started, 0.1)
+        self.assertEqual([future.result(timeout=5)["result"] for future in futures], [OK] * 5)
+        # 하나씩 보냈다면 0.75초
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+class PatientsCallTest(TestCase):
+    """
+    의료진 -> 환자 여러 명 호출 (call/doctor/patients/)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+        profile = user.profile
+        profile.hospital = hospital
+        profile.save()
+        cls.patients = [Patient.objects.create(profile=profile, name=f"환자{index}") for index in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        # FakeTerminalServer 는 127.0.0.1 에서 받는다
+        patcher = mock.patch.object(terminal_client, "allowed_networks", [ipaddress.ip_network("127.0.0.0/8")])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.servers = [FakeTerminalServer().start() for _ in range(2)]
+        for patient, server in zip(self.patients, self.servers):
+            Patient.objects.filter(pk=patient.pk).update(ip_address=server.address)
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def test_call_patients(self):
+        ids = [patient.pk for patient in self.patients] + [9999]
+        with self.assertNumQueries(1):
+            response = self.client.post("/users/call/doctor/patients/", {"patients": ids, "action": "led"},
+                                        format="json")
+        self.assertEqual(response.status_code, 202)
+        task = response.data["task"]
+
+        deadline = time.monotonic() + 5
+        while True:
+            results = self.client.get(f"/users/call/doctor/patients/{task}/").data["results"]
+            if all(result["result"] != PENDING for result in results.values()) or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual([results[patient.pk]["result"] for patient in self.patients], [OK, OK, ERROR])
+        self.assertEqual(results[self.patients[2].pk]["detail"], "no ip_address")
+        self.assertEqual(results[9999]["detail"], "patient not found")
+        self.assertEqual([server.paths for server in self.servers], [["/gpio2/1"], ["/gpio2/1"]])
+
+    def test_invalid_action(self):
+        response = self.client.post("/users/call/doctor/patients/",
+                                    {"patients": [self.patients[0].pk], "action": "siren"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_task(self):
+        self.assertEqual(self.client.get("/users/call/doctor/patients/unknown/").status_code, 404)
+
+
+class PatientImportTest(TestCase):
+    """
+    환자 가져오기 (doctor/<int:profile_id>/patient/import/) 의 잘못된 파일 처리
+    """
+    @classmethod
+    def setUpTestData(cls):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+        cls.profile = user.profile
+        cls.profile.hospital = hospital
+        cls.profile.save()
+
+    def upload(self, content: bytes, name="patients.csv"):
+        return APIClient().post(f"/users/doctor/{self.profile.pk}/patient/import/",
+                                {"file": SimpleUploadedFile(name, content)}, format="multipart")
+
+    def test_import_csv(self):
+        response = self.upload("name,disease\n환자1,감기\n환자2,\n".encode())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {"created": 2, "errors": []})
+
+    @override_settings(PATIENT_IMPORT_CHUNK_SIZE=500)
+    def test_non_utf8_file_is_rejected_before_insert(self):
+        # 엑셀에서 저장한 CP949 CSV, 첫 묶음 (500명) 뒤에 디코딩이 실패하는 위치가 있어도 아무것도 저장하지 않는다
+        content = ("name\n" + "".join(f"patient{index}\n" for index in range(500)) + "환자\n" * 100).encode("cp949")
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.data["file"][0])
+        self.assertEqual(Patient.objects.count(), 0)
+
+    def test_invalid_csv_row_is_reported(self):
+        response = self.upload(b"name\n\xed\x99\x98\xec\x9e\x901\nbad\0row\npatient3\n")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3])
+
+
+class PatientExportASGITest(TransactionTestCase):
+    """
+    환자 내보내기 스트리밍을 ASGI (배포 환경) 로 받는 검사
+    응답 body 는 이벤트 루프 스레드에서 만들어지고 DB 는 다른 스레드에서 읽으므로 TransactionTestCase 를 쓴다
+    """
+    # Profile.hospital 의 기본값이 1 이므로 테스트마다 ID 를 1부터
+    reset_sequences = True
+
+    def setUp(self):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+        self.profile = user.profile
+        self.profile.hospital = hospital
+        self.profile.save()
+        Patient.objects.bulk_create([Patient(profile=self.profile, name=f"환자{index}") for index in range(5)])
+
+    @override_settings(PATIENT_IMPORT_CHUNK_SIZE=2)
+    def test_export_csv(self):
+        status, headers, body = asgi_request("GET", f"/users/doctor/{self.profile.pk}/patient/export/")
+        self.assertEqual(status, 200)
+        self.assertIn("attachment", headers["content-disposition"])
+        lines = body.decode().splitlines()
+        # header 1줄 + 환자 5명 (2명씩 3번에 나눠 읽음)
+        self.assertEqual(len(lines), 6)
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], [f"환자{index}" for index in range(5)])
+
+    def test_export_ndjson(self):
+        status, _, body = asgi_request("GET", f"/users/doctor/{self.profile.pk}/patient/export/",
+                                       query_string=b"file_format=ndjson")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.decode().splitlines()), 5)
+
+
+class ASGIRequestMeasurementTest(TransactionTestCase):
+    """
+    ASGI (배포 환경) 에서 동기 view 의 쿼리 수 지표와 요청 프로파일링 검사
+    """
+    reset_sequences = True
+    route = "users/doctor/<int:profile_id>/patient/<int:patient_id>/"
+
+    def setUp(self):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+        self.profile = user.profile
+        self.profile.hospital = hospital
+        self.profile.save()
+        self.patient = Patient.objects.create(profile=self.profile, name="환자")
+        self.path = f"/users/doctor/{self.profile.pk}/patient/{self.patient.pk}/"
+
+    def test_db_query_metric_counts_sync_view_queries(self):
+        count, total = REQUEST_DB_QUERIES.count(route=self.route), REQUEST_DB_QUERIES.sum(route=self.route)
+        status, _, _ = asgi_request("GET", self.path)
+        self.assertEqual(status, 200)
+        self.assertEqual(REQUEST_DB_QUERIES.count(route=self.route), count + 1)
+        # 의료진 1번, 환자 1번
+        self.assertEqual(REQUEST_DB_QUERIES.sum(route=self.route), total + 2)
+
+    def test_profiling_captures_sync_view(self):
+        directory = tempfile.mkdtemp(prefix="profiles")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(REQUEST_PROFILING=dict(settings.REQUEST_PROFILING, ENABLED=True)), \
+                mock.patch.multiple(request_profiler, directory=Path(directory), token="secret", sample_rate=0.0):
+            application = ASGIHandler()
+            with self.assertLogs("users.profiling", "INFO") as logs:
+                status, headers, _ = asgi_request("GET", self.path, headers=[(b"x-profile", b"secret")],
+                                                  application=application)
+            # header 가 없으면 프로파일링하지 않음
+            _, unselected_headers, _ = asgi_request("GET", self.path, application=application)
+        self.assertEqual(status, 200)
+        self.assertIn('desc="2 queries, 0 duplicate"', headers["server-timing"])
+        self.assertNotIn("server-timing", unselected_headers)
+
+        with open(os.path.join(directory, RECORDS_FILE)) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]["route"], records[0]["queries"]), (self.route, 2))
+        self.assertIsNotNone(records[0]["cpu_ms"])
+        self.assertTrue(os.path.exists(os.path.join(directory, records[0]["profile"])))
+        # 로그 줄의 시각을 기록의 값으로 덮어쓰지 않는다
+        line = json.loads(JSONFormatter().format(logs.records[-1]))
+        self.assertIsInstance(line["time"], str)
+        self.assertEqual(line["wall_ms"], records[0]["wall_ms"])
+
+
+class PositionStreamTest(SimpleTestCase):
+    """
+    환자 위치 좌표 스트리밍 (users/stream/...) 의 SSE / WebSocket 응답 검사 (ASGI application 을 직접 호출)
+    """
+    def setUp(self):
+        # 위치 계산 정보 조회 대신 모든 환자를 병원 1, 의료진 2 로
+        for name, value in (("hospital_id_for_patient", 1), ("profile_id_for_patient", 2)):
+            patcher = mock.patch.object(calibration_cache, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # DB 에서 위치 좌표를 다시 읽는 작업은 PositionStreamPollTest 에서
+        patcher = mock.patch.object(position_broker, "poll_interval", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, scope_type, path, messages, on_subscribed):
+        """
+        :param messages: 연결 직후 application 이 받을 메시지 목록
+        :param on_subscribed: 연결이 위치 좌표를 구독하면 호출할 함수, 첫 응답 body 를 보내면 연결을 끊는다
+        :return: application 이 보낸 메시지 목록
+        """
+        async def run():
+            inbox = asyncio.Queue()
+            for message in messages:
+                inbox.put_nowait(message)
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+                if message["type"] in ("http.response.body", "websocket.send"):
+                    inbox.put_nowait({"type": f"{scope_type}.disconnect"})
+
+            async def publish():
+                while not position_broker.has_subscribers():
+                    await asyncio.sleep(0.001)
+                on_subscribed()
+
+            publisher = asyncio.ensure_future(publish())
+            scope = {"type": scope_type, "path": path, "headers": []}
+            try:
+                await asyncio.wait_for(stream_application(None)(scope, inbox.get, send), timeout=5)
+            finally:
+                publisher.cancel()
+            return sent
+
+        return asyncio.run(run())
+
+    def test_sse_sends_fix_of_subscribed_hospital(self):
+        sent = self.stream("http", "/users/stream/hospital/1/", [], lambda: position_broker.publish_fixes({7: (1.5, 2.5)}))
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), sent[0]["headers"])
+        event, data = sent[1]["body"].decode().strip().split("\n")
+        self.assertEqual(event, "event: position")
+        fix = json.loads(data[len("data: "):])
+        self.assertEqual((fix["id"], fix["x"], fix["y"]), (7, 1.5, 2.5))
+        # 연결이 끊기면 구독을 해제한다
+        self.assertFalse(position_broker.has_subscribers())
+
+    def test_websocket_sends_fix_of_subscribed_doctor(self):
+        sent = self.stream("websocket", "/users/stream/doctor/2/", [{"type": "websocket.connect"}],
+                           lambda: position_broker.publish_fixes({7: (1.5, 2.5)}))
+        self.assertEqual(sent[0]["type"], "websocket.accept")
+        self.assertEqual([(fix["id"], fix["x"], fix["y"]) for fix in json.loads(sent[1]["text"])], [(7, 1.5, 2.5)])
+        self.assertFalse(position_broker.has_subscribers())
+
+    def test_slow_subscriber_gets_latest_fix_only(self):
+        async def run():
+            subscription = position_broker.subscribe([("hospital", 1)])
+            try:
+                position_broker.publish_fixes({7: (1.0, 1.0)})
+                position_broker.publish_fixes({7: (2.0, 2.0), 8: (3.0, 3.0)})
+                return await asyncio.wait_for(subscription.get(), timeout=1), subscription.dropped
+            finally:
+                subscription.close()
+
+        fixes, dropped = asyncio.run(run())
+        self.assertEqual(sorted((fix["id"], fix["x"]) for fix in fixes), [(7, 2.0), (8, 3.0)])
+        self.assertEqual(dropped, 1)
+
+    def test_unknown_websocket_path_is_closed(self):
+        sent = self.stream("websocket", "/users/unknown/", [{"type": "websocket.connect"}], lambda: None)
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 4404}])
+
+
+class PositionStreamPollTest(TransactionTestCase):
+    """
+    다른 프로세스 (run_ranging_ingest 등) 가 DB 에 저장한 위치 좌표도 구독자에게 전달되는지 검사
+    """
+    reset_sequences = True
+
+    def setUp(self):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        profile.hospital = hospital
+        profile.save()
+        self.moved = Patient.objects.create(profile=profile, name="환자1", drawing_patient_x=1.0, drawing_patient_y=1.0)
+        self.still = Patient.objects.create(profile=profile, name="환자2", drawing_patient_x=5.0, drawing_patient_y=5.0)
+
+    @mock.patch.object(position_broker, "poll_interval", 0.01)
+    def test_fix_saved_by_other_process_is_delivered(self):
+        async def run():
+            subscription = position_broker.subscribe([("hospital", 1)])
+            try:
+                # 첫 번째로 읽은 좌표는 기준으로만 기록
+                while len(position_broker._published) < 2:
+                    await asyncio.sleep(0.01)
+                await run_db(Patient.objects.filter(pk=self.moved.pk).update,
+                             drawing_patient_x=2.0, drawing_patient_y=3.0)
+                return await asyncio.wait_for(subscription.get(), timeout=5)
+            finally:
+                subscription.close()
+
+        fixes = asyncio.run(run())
+        self.assertEqual([(fix["id"], fix["x"], fix["y"]) for fix in fixes], [(self.moved.pk, 2.0, 3.0)])
+
+
+class MetricsExporterTest(SimpleTestCase):
+    """
+    Django 밖의 프로세스 (run_ranging_ingest) 가 지표를 내보내는 HTTP 서버 검사
+    """
+    def test_serves_registry(self):
+        server = serve_metrics("127.0.0.1", 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            self.assertEqual(response.status, 200)
+            self.assertIn("igo_ranging_dropped_total", response.read().decode())
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        self.assertEqual(error.exception.code, 404)
+
+
+class PositionHistoryWriterTest(TestCase):
+    """
+    위치 이력 저장 중 다른 프로세스가 같은 (환자, 구간) 을 먼저 만든 경우 검사
+    """
+    def setUp(self):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        profile.hospital = hospital
+        profile.save()
+        self.patient = Patient.objects.create(profile=profile, name="환자")
+        self.writer = PositionHistoryWriter(bucket_seconds=60)
+        # 백그라운드 스레드 없이 flush() 를 직접 호출
+        patcher = mock.patch.object(self.writer, "_start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush_appends_to_chunk_created_concurrently(self):
+        bucket_start = datetime.fromtimestamp(600, tz=timezone.utc)
+        # 다른 프로세스가 먼저 저장한 구간
+        PositionChunk.objects.create(patient=self.patient, bucket_start=bucket_start, count=1,
+                                     data=POINT.pack(1000, 1.0, 1.0))
+        self.writer.append({self.patient.pk: (2.0, 2.0)}, timestamp=602.0)
+
+        select_for_update = PositionChunk.objects.select_for_update
+        calls = []
+
+        def racing_select_for_update():
+            # 첫 번째 조회에서는 아직 없던 구간처럼 보이게 한다
+            calls.append(None)
+            return PositionChunk.objects.none() if len(calls) == 1 else select_for_update()
+
+        with mock.patch.object(PositionChunk.objects, "select_for_update", side_effect=racing_select_for_update):
+            self.writer.flush()
+
+        chunk = PositionChunk.objects.get(patient=self.patient, bucket_start=bucket_start)
+        self.assertEqual(chunk.count, 2)
+        self.assertEqual([(point[0], point[1]) for point in POINT.iter_unpack(bytes(chunk.data))],
+                         [(1000, 1.0), (2000, 2.0)])
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_flush_keeps_points(self):
+        self.writer.append({self.patient.pk: (1.0, 1.0)}, timestamp=601.0)
+        with mock.patch.object(PositionChunk.objects, "bulk_create",
+                               side_effect=IntegrityError("duplicate key")):
+            with self.assertRaises(IntegrityError):
+                self.writer.flush()
+        # 그 사이에 모인 좌표보다 앞에 다시 넣는다
+        self.writer.append({self.patient.pk: (2.0, 2.0)}, timestamp=602.0)
+        self.writer.flush()
+
+        chunk = PositionChunk.objects.get(patient=self.patient)
+        self.assertEqual([point[1] for point in POINT.iter_unpack(bytes(chunk.data))], [1.0, 2.0])
+
+    def test_database_error_keeps_points(self):
+        self.writer.append({self.patient.pk: (1.0, 1.0)}, timestamp=601.0)
+        with mock.patch.object(PositionChunk.objects, "select_for_update",
+                               side_effect=OperationalError("server closed the connection unexpectedly")):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        self.writer.flush()
+        self.assertEqual(PositionChunk.objects.get(patient=self.patient).count, 1)
+
+    def test_writer_thread_refreshes_connection(self):
+        self.writer.flush_interval = 0.01
+
+        def flush():
+            # 한 번 저장하면 스레드를 끝낸다
+            raise SystemExit
+
+        with mock.patch("users.history.close_old_connections") as close_old_connections, \
+                mock.patch.object(self.writer, "flush", side_effect=flush):
+            thread = threading.Thread(target=self.writer._run, daemon=True)
+            thread.start()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+        close_old_connections.assert_called_once_with()
+
+
+class HospitalResponseCacheTest(TestCase):
+    """
+    병원 조회 (hospital/, hospital/<int:hospital_id>/) 의 캐시된 응답, ETag / 304 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500,
+                                               real_x=1000000, real_y=500000)
+
+    def setUp(self):
+        self.client = APIClient()
+        hospital_response_cache.clear()
+
+    def test_cached_response_skips_database(self):
+        url = f"/users/hospital/{self.hospital.pk}/"
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(json.loads(first.content)["name"], "병원")
+
+    def test_if_none_match_returns_304(self):
+        for url in ("/users/hospital/", f"/users/hospital/{self.hospital.pk}/"):
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+            # GZipMiddleware 를 거쳐 weak ETag 로 돌아온 경우
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since_returns_304(self):
+        url = f"/users/hospital/{self.hospital.pk}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE="Thu, 01 Jan 1970 00:00:00 GMT").status_code, 200)
+
+    def test_saving_hospital_invalidates_cache(self):
+        one, all_ = f"/users/hospital/{self.hospital.pk}/", "/users/hospital/"
+        etags = {url: self.client.get(url)["ETag"] for url in (one, all_)}
+        self.hospital.name = "새 병원"
+        self.hospital.save()
+        for url in (one, all_):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etags[url])
+            self.assertIn("새 병원", response.content.decode())
+
+    def test_deleting_hospital_changes_list(self):
+        other = Hospital.objects.create(name="다른 병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        response = self.client.get("/users/hospital/")
+        # 목록은 Last-Modified 로 판단하지 않는다 (병원을 지워도 max(updated_at) 은 그대로)
+        self.assertFalse(response.has_header("Last-Modified"))
+        other.delete()
+        response = self.client.get("/users/hospital/", HTTP_IF_NONE_MATCH=response["ETag"],
+                                   HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("다른 병원", response.content.decode())
+        self.assertEqual(self.client.get("/users/hospital/", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+                         .status_code, 200)
+
+    def test_unknown_hospital(self):
+        self.assertEqual(self.client.get("/users/hospital/9999/").status_code, 404)
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """
+    토큰 -> 유저 조회 캐시 (CachedTokenAuthentication) 의 쿼리 수와 무효화 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        cls.user = User.objects.create_user("doctor", "doctor@igo.test", "password")
+
+    def setUp(self):
+        token_user_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_cached_lookup_skips_database(self):
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, cached_user.pk, cached_token.key), (self.user.pk, self.user.pk, self.token.key))
+        # 요청마다 다른 유저 객체
+        self.assertIsNot(user, cached_user)
+        self.assertEqual((token_user_cache.hits, token_user_cache.misses), (1, 1))
+
+    def test_unknown_token_is_not_cached(self):
+        for _ in range(2):
+            with self.assertNumQueries(1), self.assertRaises(AuthenticationFailed):
+                self.authentication.authenticate_credentials("unknown")
+        self.assertEqual((token_user_cache.hits, token_user_cache.misses), (0, 2))
+
+    def test_rotated_token_is_rejected(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        self.token.delete()
+        new_token = Token.objects.create(user=self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(self.authentication.authenticate_credentials(new_token.key)[0].pk, self.user.pk)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_request_with_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(client.get("/users/hospital/").status_code, 200)
+        self.assertEqual(client.get("/users/hospital/").status_code, 200)
+        self.assertEqual((token_user_cache.hits, token_user_cache.misses), (1, 1))
+        client.credentials(HTTP_AUTHORIZATION="Token unknown")
+        self.assertEqual(client.get("/users/hospital/").status_code, 401)
+
+
+class CallDebouncerTest(SimpleTestCase):
+    """
+    환자 호출 합치기 (CallDebouncer) 의 창 검사 (가짜 시계 사용)
+    """
+    def setUp(self):
+        self.now = 0.0
+        self.debouncer = CallDebouncer(window=30, maxsize=10, timer=lambda: self.now)
+
+    def test_calls_within_window_are_merged(self):
+        result, call = self.debouncer.register(1, 1.0, 1.0)
+        self.assertEqual((result, call.count), (OPENED, 1))
+        self.now = 29.0
+        result, merged = self.debouncer.register(1, 2.0, 3.0)
+        # 위치 좌표는 마지막 호출의 값, 호출을 연 시각은 그대로
+        self.assertEqual((result, merged.count, merged.drawing_patient_x, merged.drawing_patient_y),
+                         (MERGED, 2, 2.0, 3.0))
+        self.assertEqual(merged.opened_at, call.opened_at)
+        # 다른 환자는 따로
+        self.assertEqual(self.debouncer.register(2, 0.0, 0.0)[0], OPENED)
+
+    def test_window_starts_at_first_call(self):
+        self.debouncer.register(1, 1.0, 1.0)
+        self.now = 20.0
+        self.debouncer.register(1, 1.0, 1.0)
+        # 합친 호출이 창을 늘리지 않는다
+        self.now = 31.0
+        result, call = self.debouncer.register(1, 1.0, 1.0)
+        self.assertEqual((result, call.count), (OPENED, 1))
+
+    def test_zero_window_never_merges(self):
+        debouncer = CallDebouncer(window=0, maxsize=10, timer=lambda: self.now)
+        self.assertEqual([debouncer.register(1, 1.0, 1.0)[0] for _ in range(3)], [OPENED] * 3)
+
+    def test_discard(self):
+        self.debouncer.register(1, 1.0, 1.0)
+        self.debouncer.discard(1)
+        self.assertEqual(self.debouncer.register(1, 1.0, 1.0)[0], OPENED)
+
+
+class PatientCallDebounceTest(TestCase):
+    """
+    환자 -> 의료진 호출 (call/patient/<int:patient_id>/) 을 창 안에서 합쳐 push 를 1번만 보내는지 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        profile.hospital = hospital
+        profile.save()
+        cls.patient = Patient.objects.create(profile=profile, name="환자", drawing_patient_x=1.0, drawing_patient_y=2.0)
+
+    def setUp(self):
+        self.client = APIClient()
+        call_debouncer.clear()
+        patcher = mock.patch("users.views.send_from_patient_to_care_team_by_fcm")
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_calls_send_one_push(self):
+        url = f"/users/call/patient/{self.patient.pk}/"
+        first = self.client.get(url)
+        Patient.objects.filter(pk=self.patient.pk).update(drawing_patient_x=5.0, drawing_patient_y=6.0)
+        second = self.client.get(url)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual((first.data["call"], first.data["count"]), (OPENED, 1))
+        self.assertEqual((second.data["call"], second.data["count"], second.data["x"], second.data["y"]),
+                         (MERGED, 2, 5.0, 6.0))
+        self.assertEqual(second.data["opened_at"], first.data["opened_at"])
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_deleted_patient_call_is_discarded(self):
+        patient_id = self.patient.pk
+        self.client.get(f"/users/call/patient/{patient_id}/")
+        self.patient.delete()
+        self.assertEqual(call_debouncer.register(patient_id, 0.0, 0.0)[0], OPENED)
+
+    def test_unknown_patient(self):
+        self.assertEqual(self.client.get("/users/call/patient/9999/").status_code, 404)
+        self.send.assert_not_called()
+
+
+class RangingAccumulatorTest(SimpleTestCase):
+    """
+    측정 시각 window, 기지국 순번으로 거리 값을 버리는 RangingAccumulator 검사
+    """
+    def setUp(self):
+        self.now = 1000.0
+        self.accumulator = RangingAccumulator(window=1.0, reorder_limit=100, timer=lambda: self.now)
+
+    def dropped(self, station, reason):
+        return RANGING_DROPPED.value(station=station, reason=reason)
+
+    def assertDrops(self, station, reason, add):
+        before = self.dropped(station, reason)
+        self.assertEqual(add(), 0)
+        self.assertEqual(self.dropped(station, reason), before + 1)
+
+    def test_complete_within_window(self):
+        self.assertEqual(self.accumulator.add(1, "A", 10.0, sequence=1, timestamp=100.0), 1)
+        self.assertEqual(self.accumulator.add(1, "B", 20.0, sequence=1, timestamp=100.4), 2)
+        self.assertIsNone(self.accumulator.pop_complete(1, ("A", "B", "C")))
+        self.assertEqual(self.accumulator.add(1, "C", 30.0, sequence=1, timestamp=100.8), 3)
+        # 기지국 순서대로, 꺼낸 뒤에는 비움
+        self.assertEqual(self.accumulator.pop_complete(1, ("C", "A", "B")), (30.0, 10.0, 20.0))
+        self.assertEqual(self.accumulator.pending(1), {})
+
+    def test_duplicate_and_out_of_order_sequence(self):
+        self.accumulator.add(1, "A", 10.0, sequence=10, timestamp=100.0)
+        self.assertDrops("A", "duplicate", lambda: self.accumulator.add(1, "A", 11.0, sequence=10, timestamp=100.1))
+        self.assertDrops("A", "out_of_order", lambda: self.accumulator.add(1, "A", 11.0, sequence=9, timestamp=100.2))
+        # 순번은 기지국마다, 환자마다 따로
+        self.assertEqual(self.accumulator.add(1, "B", 20.0, sequence=10, timestamp=100.1), 2)
+        self.assertEqual(self.accumulator.add(2, "A", 20.0, sequence=10, timestamp=100.1), 1)
+        self.assertEqual(self.accumulator.pending(1), {"A": 10.0, "B": 20.0})
+
+    def test_sequence_kept_after_fix(self):
+        for station in ("A", "B", "C"):
+            self.accumulator.add(1, station, 10.0, sequence=5, timestamp=100.0)
+        self.accumulator.pop_complete(1, ("A", "B", "C"))
+        # 위치를 계산한 뒤에 다시 온 같은 거리 값도 버린다
+        self.assertDrops("A", "duplicate", lambda: self.accumulator.add(1, "A", 10.0, sequence=5, timestamp=100.0))
+        # 지운 환자는 순번도 잊는다
+        self.accumulator.forget(1)
+        self.assertEqual(self.accumulator.add(1, "A", 10.0, sequence=5, timestamp=100.0), 1)
+
+    def test_sequence_restart_and_wrap(self):
+        self.accumulator.add(1, "A", 10.0, sequence=5000, timestamp=100.0)
+        # reorder_limit 보다 많이 줄어들면 기지국이 다시 시작된 것으로 보고 받는다
+        self.assertEqual(self.accumulator.add(1, "A", 11.0, sequence=1, timestamp=100.1), 1)
+        self.accumulator.add(1, "B", 10.0, sequence=RangingAccumulator.SEQUENCE_MODULO - 1, timestamp=100.1)
+        # unsigned 32bit 순번이 한 바퀴 돈 경우
+        self.assertEqual(self.accumulator.add(1, "B", 12.0, sequence=0, timestamp=100.2), 2)
+        self.assertEqual(self.accumulator.pending(1), {"A": 11.0, "B": 12.0})
+
+    def test_timestamp_order_without_sequence(self):
+        self.accumulator.add(1, "A", 10.0, timestamp=100.0)
+        self.assertDrops("A", "out_of_order", lambda: self.accumulator.add(1, "A", 11.0, timestamp=99.9))
+        # 측정 시각이 없으면 받은 시각
+        self.now = 100.5
+        self.assertEqual(self.accumulator.add(1, "B", 20.0), 2)
+
+    def test_stale_reading_is_dropped(self):
+        self.accumulator.add(1, "A", 10.0, timestamp=100.0)
+        self.assertDrops("B", "stale", lambda: self.accumulator.add(1, "B", 20.0, timestamp=98.5))
+        self.assertEqual(self.accumulator.pending(1), {"A": 10.0})
+
+    def test_expired_readings_are_evicted(self):
+        self.accumulator.add(1, "A", 10.0, timestamp=100.0)
+        self.accumulator.add(1, "B", 20.0, timestamp=100.9)
+        before = self.dropped("A", "expired")
+        # A 는 새 거리 값보다 window 초 넘게 먼저 측정되어 같은 위치 계산에 쓰지 않는다
+        self.assertEqual(self.accumulator.add(1, "C", 30.0, timestamp=101.5), 2)
+        self.assertEqual(self.dropped("A", "expired"), before + 1)
+        self.assertEqual(self.accumulator.pending(1), {"B": 20.0, "C": 30.0})
+        self.assertIsNone(self.accumulator.pop_complete(1, ("A", "B", "C")))
+
+
+class PruneUnregisteredTokensTest(TestCase):
+    """
+    FCM 이 등록되지 않은 기기라고 알려준 토큰을 지우는지 검사 (발송기 워커 스레드에서 호출됨)
+    """
+    def setUp(self):
+        Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        self.profiles = [User.objects.create_user(f"doctor{index}", f"doctor{index}@igo.test", "password").profile
+                         for index in range(2)]
+        for profile, token in zip(self.profiles, ("gone", "alive")):
+            profile.token = token
+            profile.save()
+
+    def test_unregistered_tokens_are_cleared(self):
+        results = {
+            "gone": SendResult(False, None, messaging.UnregisteredError("unregistered")),
+            "alive": SendResult(True, "message", None),
+        }
+        with mock.patch("users.care_team.close_old_connections") as close_old_connections:
+            prune_unregistered_tokens(results)
+        # 끊어진 DB 연결로 쿼리하지 않도록 먼저 정리
+        close_old_connections.assert_called_once_with()
+        self.assertEqual([profile.token for profile in Profile.objects.order_by("pk")], ["", "alive"])
+
+
+class StaffLocatorTest(SimpleTestCase):
+    """
+    격자로 찾은 가까운 의료진 (StaffLocator.nearest) 을 모든 의료진과의 거리를 정렬한 결과와 비교
+    """
+    def setUp(self):
+        self.locator = StaffLocator(cell_size=50.0, max_age=60)
+        self.now = time.time()
+
+    def brute_force(self, positions, x, y, k) -> list:
+        return sorted(positions, key=lambda profile_id: math.dist(positions[profile_id], (x, y)))[:k]
+
+    def assertNearest(self, positions, x, y, k, hospital_id=1):
+        found = self.locator.nearest(hospital_id, x, y, k)
+        expected = self.brute_force(positions, x, y, k)
+        # 거리가 같은 의료진은 순서가 다를 수 있으므로 거리로 비교
+        self.assertEqual([math.dist(positions[profile_id], (x, y)) for profile_id in found],
+                         [math.dist(positions[profile_id], (x, y)) for profile_id in expected])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        positions = {}
+        for profile_id in range(1, 301):
+            positions[profile_id] = (generator.uniform(0, 1000), generator.uniform(0, 500))
+            self.locator.update(1, profile_id, *positions[profile_id], timestamp=self.now)
+        for _ in range(200):
+            x, y = generator.uniform(-200, 1200), generator.uniform(-200, 700)
+            for k in (1, 3, 10):
+                self.assertNearest(positions, x, y, k)
+
+    def test_empty_cells_and_far_query(self):
+        # 듬성듬성 놓여서 환자 주변 칸이 비어 있는 경우
+        positions = {1: (0.0, 0.0), 2: (990.0, 10.0), 3: (500.0, 490.0)}
+        for profile_id, position in positions.items():
+            self.locator.update(1, profile_id, *position, timestamp=self.now)
+        for x, y in ((510.0, 20.0), (5000.0, -3000.0), (251.0, 251.0)):
+            self.assertNearest(positions, x, y, 2)
+        # 찾을 수보다 의료진이 적으면 모두
+        self.assertEqual(len(self.locator.nearest(1, 0.0, 0.0, 10)), 3)
+        self.assertEqual(self.locator.nearest(2, 0.0, 0.0, 3), [])
+
+    def test_nearer_staff_in_outer_ring(self):
+        # 같은 칸의 의료진보다 바로 옆 칸 경계 너머의 의료진이 더 가까운 경우 (칸 거리로 멈추는 조건)
+        positions = {1: (49.0, 49.0), 2: (51.0, 1.0)}
+        for profile_id, position in positions.items():
+            self.locator.update(1, profile_id, *position, timestamp=self.now)
+        self.assertEqual(self.locator.nearest(1, 48.0, 1.0, 1), [2])
+        self.assertNearest(positions, 48.0, 1.0, 2)
+
+    def test_stale_moved_and_removed_staff(self):
+        self.locator.update(1, 1, 10.0, 10.0, timestamp=self.now - 120)
+        self.locator.update(1, 2, 400.0, 400.0, timestamp=self.now)
+        self.locator.update(1, 3, 20.0, 20.0, timestamp=self.now)
+        # max_age 보다 오래된 위치는 찾지 않음
+        self.assertEqual(self.locator.nearest(1, 0.0, 0.0, 3), [3, 2])
+        # 다른 칸으로 옮기거나, 다른 병원으로 옮기거나, 지운 의료진
+        self.locator.update(1, 2, 5.0, 5.0, timestamp=self.now)
+        self.assertEqual(self.locator.nearest(1, 0.0, 0.0, 1), [2])
+        self.locator.update(2, 2, 5.0, 5.0, timestamp=self.now)
+        self.assertEqual(self.locator.nearest(1, 0.0, 0.0, 3), [3])
+        self.assertEqual(self.locator.nearest(2, 0.0, 0.0, 3), [2])
+        self.locator.remove(3)
+        self.assertEqual(self.locator.nearest(1, 0.0, 0.0, 3), [])
+
+
+class ZoneIndexTest(SimpleTestCase):
+    """
+    구역 격자 (ZoneIndex) 의 다각형 포함 검사
+    """
+    def test_zones_at(self):
+        ward = compile_zone(1, "병동", [[0, 0], [200, 0], [200, 100], [0, 100]], False, True)
+        # 오목한 (ㄷ 모양) 구역, 격자 칸 여러 개에 걸침
+        stairs = compile_zone(2, "계단", [[100, 50], [300, 50], [300, 250], [100, 250], [100, 200], [250, 200],
+                                         [250, 100], [100, 100]], True, False)
+        index = ZoneIndex([ward, stairs], cell_size=50)
+        self.assertEqual(index.zones_at(10, 10), {1})
+        self.assertEqual(index.zones_at(150, 75), {1, 2})
+        self.assertEqual(index.zones_at(280, 150), {2})
+        # ㄷ 의 안쪽 빈 곳, 격자 밖
+        self.assertEqual(index.zones_at(150, 150), frozenset())
+        self.assertEqual(index.zones_at(-10, 10), frozenset())
+        self.assertEqual(index.zones_at(1000, 1000), frozenset())
+
+    def test_invalid_polygon(self):
+        for polygon in ([[0, 0], [1, 1]], [[0, 0], [1], [2, 2]], [[0, 0], ["a", 1], [2, 2]], None,
+                        [[0, 0], [float("nan"), 1], [2, 2]]):
+            with self.assertRaises(ValueError):
+                compile_zone(1, "구역", polygon, True, False)
+
+
+class GeofenceEngineTest(TestCase):
+    """
+    위치 좌표에 따른 구역 출입과 낙상 위험 환자 알림 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500,
+                                               real_x=1000000, real_y=500000)
+        profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        profile.hospital = cls.hospital
+        profile.token = "doctor-token"
+        profile.save()
+        cls.patient = Patient.objects.create(profile=profile, name="환자", fall_risk=True)
+        cls.other = Patient.objects.create(profile=profile, name="다른 환자", fall_risk=False)
+        cls.stairs = Zone.objects.create(hospital=cls.hospital, name="계단", alert_on_enter=True,
+                                         polygon=[[0, 0], [100, 0], [100, 100], [0, 100]])
+        cls.ward = Zone.objects.create(hospital=cls.hospital, name="병동", alert_on_exit=True,
+                                       polygon=[[200, 0], [400, 0], [400, 200], [200, 200]])
+
+    def setUp(self):
+        self.engine = GeofenceEngine(cell_size=50)
+        patcher = mock.patch.object(calibration_cache, "hospital_id_for_patient", return_value=self.hospital.pk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("users.geofence.send_zone_alert_by_fcm")
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def events(self, transitions) -> list:
+        return [(patient_id, zone.name, event) for patient_id, zone, event in transitions]
+
+    def test_enter_and_exit_transitions(self):
+        # 처음 위치는 기억만 하고 알리지 않는다
+        self.assertEqual(self.engine.process({self.patient.pk: (300.0, 100.0)}), [])
+        self.assertEqual(self.engine.process({self.patient.pk: (310.0, 110.0)}), [])
+        self.assertEqual(self.events(self.engine.process({self.patient.pk: (50.0, 50.0)})),
+                         [(self.patient.pk, "계단", ENTER), (self.patient.pk, "병동", EXIT)])
+        self.assertEqual(self.events(self.engine.process({self.patient.pk: (150.0, 50.0)})),
+                         [(self.patient.pk, "계단", EXIT)])
+
+    def test_alerts_only_fall_risk_patients_on_alerting_events(self):
+        self.engine.process({self.patient.pk: (300.0, 100.0), self.other.pk: (300.0, 100.0)})
+        self.engine.process({self.patient.pk: (50.0, 50.0), self.other.pk: (50.0, 50.0)})
+        # 낙상 위험 환자의 병동에서 나옴 (alert_on_exit), 계단에 들어감 (alert_on_enter) 만 알림
+        self.assertEqual(sorted((call.args[0], call.args[1].name, call.args[2]) for call in self.send.call_args_list),
+                         sorted([(self.patient.pk, "병동", EXIT), (self.patient.pk, "계단", ENTER)]))
+        self.send.reset_mock()
+        # 계단에서 나오는 것은 알리지 않는 구역
+        self.engine.process({self.patient.pk: (150.0, 50.0)})
+        self.send.assert_not_called()
+
+    def test_invalid_zone_is_skipped(self):
+        # Zone.clean 을 거치지 않고 저장된 구역
+        Zone.objects.bulk_create([Zone(hospital=self.hospital, name="잘못된 구역", polygon=[[0, 0], [1]])])
+        with self.assertLogs("users.geofence", "WARNING"):
+            index = self.engine.index_for_hospital(self.hospital.pk)
+        self.assertEqual(set(index.zones), {self.stairs.pk, self.ward.pk})
+        self.engine.process({self.patient.pk: (300.0, 100.0)})
+        self.assertIn((self.patient.pk, "계단", ENTER), self.events(self.engine.process({self.patient.pk: (50.0, 50.0)})))
+
+    def test_alert_message(self):
+        dispatcher = mock.Mock()
+        with mock.patch("users.geofence.get_fcm_dispatcher", return_value=dispatcher):
+            send_zone_alert_by_fcm(self.patient.pk, compile_zone(self.stairs.pk, "계단", self.stairs.polygon,
+                                                                 True, False), ENTER, 50.0, 60.0)
+        multicast = dispatcher.enqueue_multicast.call_args.args[0]
+        self.assertEqual(multicast.tokens, ["doctor-token"])
+        self.assertEqual(multicast.notification.body, "환자 환자가 계단에 들어갔습니다")
+        self.assertEqual((multicast.data["event"], multicast.data["x"], multicast.data["y"]), (ENTER, "50.0", "60.0"))
+
+
+class MultilaterationSolverTest(SimpleTestCase):
+    """
+    기지국 N개 최소제곱 다변측량
+    """
+    stations = {"A": (0, 0), "B": (1000, 0), "C": (0, 800), "D": (1000, 800), "E": (400, 300)}
+
+    def distances(self, x, y) -> list:
+        return [math.hypot(x - station_x, y - station_y) for station_x, station_y in self.stations.values()]
+
+    def test_exact_distances(self):
+        solver = MultilaterationSolver(self.stations)
+        patients = [(120.0, 340.0), (999.0, 1.0), (500.0, 400.0), (-50.0, 900.0)]
+        for x, y in patients:
+            solved_x, solved_y = solver.solve(self.distances(x, y))
+            self.assertAlmostEqual(solved_x, x, places=6)
+            self.assertAlmostEqual(solved_y, y, places=6)
+        np.testing.assert_allclose(solver.solve_batch([self.distances(x, y) for x, y in patients]), patients,
+                                   atol=1e-6)
+
+    def test_least_squares_residual(self):
+        solver = MultilaterationSolver(self.stations)
+        rng = random.Random(4)
+        coordinates = np.array(list(self.stations.values()), dtype=np.float64)
+        for _ in range(20):
+            distance = [value + rng.uniform(-20, 20) for value in self.distances(rng.uniform(0, 1000),
+                                                                                   rng.uniform(0, 800))]
+            # 첫 번째 기지국의 원의 방정식을 뺀 선형 방정식 A·p = b 의 최소제곱 해와 같아야 한다
+            A = 2.0 * (coordinates[1:] - coordinates[0])
+            b = (distance[0] ** 2 - np.square(distance[1:]) + np.sum(np.square(coordinates[1:]), axis=1)
+                 - np.sum(np.square(coordinates[0])))
+            expected, residuals, _, _ = np.linalg.lstsq(A, b, rcond=None)
+            solved = np.array(solver.solve(distance))
+            np.testing.assert_allclose(solved, expected, atol=1e-6)
+            np.testing.assert_allclose(solver.solve_batch([distance])[0], expected, atol=1e-6)
+            # 잡음이 있으면 해가 모든 방정식을 만족하지는 않지만, 잔차는 최소
+            self.assertAlmostEqual(float(np.sum(np.square(A @ solved - b))), float(residuals[0]), delta=1e-3)
+            for step in ((1, 0), (0, 1), (-1, 0), (0, -1)):
+                self.assertGreater(np.sum(np.square(A @ (solved + step) - b)), residuals[0])
+
+    def test_three_stations(self):
+        solver = MultilaterationSolver({"A": (0, 0), "B": (1000, 0), "C": (0, 500)})
+        x, y = solver.solve([math.hypot(300, 200), math.hypot(700, 200), math.hypot(300, 300)])
+        self.assertAlmostEqual(x, 300)
+        self.assertAlmostEqual(y, 200)
+
+    def test_collinear_stations(self):
+        for stations in ({"A": (0, 0), "B": (500, 0), "C": (1000, 0), "D": (2000, 0)},
+                         {"A": (0, 0), "B": (100, 100), "C": (300, 300)},
+                         {"A": (10, 10), "B": (10, 10), "C": (10, 10)}):
+            solver = MultilaterationSolver(stations)
+            with self.assertLogs("users.multilateration", "WARNING"):
+                self.assertEqual(solver.solve([100.0] * len(stations)), (0, 0))
+            with self.assertLogs("users.multilateration", "WARNING"):
+                np.testing.assert_array_equal(solver.solve_batch([[100.0] * len(stations)] * 2), np.zeros((2, 2)))
+
+    def test_too_few_stations(self):
+        with self.assertRaises(ValueError):
+            MultilaterationSolver({"A": (0, 0), "B": (1000, 0)})
+
+
+class FailingTransport(StubTransport):
+    """
+    정해진 횟수만큼 실패한 뒤 StubTransport 처럼 보내는 transport
+    """
+    def __init__(self, error, failures):
+        """
+        :param error: 메시지마다 돌려줄 오류, BaseException 클래스면 요청 전체가 이 오류로 실패
+        :param failures: 실패할 요청 수
+        """
+        super().__init__()
+        self.error = error
+        self.failures = failures
+        self.calls = []  # 요청마다 보낸 메시지 수
+
+    def send_each(self, messages: list) -> list:
+        self.calls.append(len(messages))
+        return self._fail(len(messages)) or super().send_each(messages)
+
+    def _fail(self, count):
+        if len(self.calls) > self.failures:
+            return None
+        if isinstance(self.error, type):
+            raise self.error("send failed")
+        return [SendResult(False, None, self.error)] * count
+
+
+class FCMDispatcherTest(SimpleTestCase):
+    """
+    FCM 백그라운드 발송기의 묶음 발송, 재시도, flush 검사
+    """
+    def dispatcher(self, transport, **options) -> FCMDispatcher:
+        options = {"workers": 1, "batch_size": 500, "max_retries": 3, "retry_backoff": 0.01, "linger": 0.01,
+                   **options}
+        dispatcher = FCMDispatcher(transport, **options)
+        self.addCleanup(dispatcher.stop, 5)
+        return dispatcher
+
+    def message(self, index=0) -> messaging.Message:
+        return messaging.Message(data={"id": f"{index}"}, token=f"token{index}")
+
+    def delays(self, timer) -> list:
+        return [call.args[0] for call in timer.call_args_list]
+
+    def test_batches_by_size(self):
+        transport = FailingTransport(None, failures=0)
+        dispatcher = self.dispatcher(transport, batch_size=3, linger=0.5)
+        futures = [dispatcher.enqueue(self.message(index)) for index in range(7)]
+        self.assertTrue(dispatcher.flush(timeout=5))
+        # batch_size 가 차면 linger 를 기다리지 않고 보낸다
+        self.assertEqual(transport.calls, [3, 3, 1])
+        self.assertEqual([message.token for message in transport.sent], [f"token{index}" for index in range(7)])
+        self.assertTrue(all(future.result().success for future in futures))
+
+    def test_linger_groups_messages(self):
+        transport = FailingTransport(None, failures=0)
+        dispatcher = self.dispatcher(transport, linger=0.5)
+        dispatcher.enqueue(self.message(0))
+        time.sleep(0.05)
+        dispatcher.enqueue(self.message(1))
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(transport.calls, [2])
+
+        transport.calls.clear()
+        dispatcher.linger = 0
+        dispatcher.enqueue(self.message(2))
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.enqueue(self.message(3))
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(transport.calls, [1, 1])
+
+    def test_retry_with_exponential_backoff(self):
+        transport = FailingTransport(exceptions.UnavailableError("unavailable"), failures=2)
+        dispatcher = self.dispatcher(transport)
+        retries = FCM_RETRIES.value()
+        with mock.patch.object(threading, "Timer", wraps=threading.Timer) as timer:
+            future = dispatcher.enqueue(self.message())
+            self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertTrue(future.result().success)
+        self.assertEqual(transport.calls, [1, 1, 1])
+        self.assertEqual(self.delays(timer), [0.01, 0.02])
+        self.assertEqual(FCM_RETRIES.value() - retries, 2)
+
+    def test_gives_up_after_max_retries(self):
+        error = exceptions.UnavailableError("unavailable")
+        transport = FailingTransport(error, failures=10)
+        dispatcher = self.dispatcher(transport, max_retries=3)
+        failures = FCM_MESSAGES.value(result="failure")
+        with mock.patch.object(threading, "Timer", wraps=threading.Timer) as timer:
+            future = dispatcher.enqueue(self.message())
+            self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(future.result(), SendResult(False, None, error))
+        self.assertEqual(transport.calls, [1, 1, 1, 1])
+        self.assertEqual(self.delays(timer), [0.01, 0.02, 0.04])
+        self.assertEqual(FCM_MESSAGES.value(result="failure") - failures, 1)
+
+    def test_non_retryable_error_finishes_immediately(self):
+        error = messaging.UnregisteredError("unregistered")
+        transport = FailingTransport(error, failures=10)
+        dispatcher = self.dispatcher(transport)
+        on_result = mock.Mock()
+        with mock.patch.object(threading, "Timer", wraps=threading.Timer) as timer:
+            future = dispatcher.enqueue(self.message(), on_result=on_result)
+            self.assertTrue(dispatcher.flush(timeout=5))
+        timer.assert_not_called()
+        self.assertEqual(transport.calls, [1])
+        self.assertIs(future.result().exception, error)
+        on_result.assert_called_once_with(future.result())
+
+    def test_failed_request_is_retried(self):
+        # 네트워크 오류 등으로 묶음 전체가 실패
+        transport = FailingTransport(ConnectionError, failures=1)
+        dispatcher = self.dispatcher(transport, linger=0.2)
+        futures = [dispatcher.enqueue(self.message(index)) for index in range(2)]
+        self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertTrue(all(future.result().success for future in futures))
+        self.assertEqual(len(transport.sent), 2)
+
+    def test_multicast_retries_failed_tokens_only(self):
+        unavailable = exceptions.UnavailableError("unavailable")
+        unregistered = messaging.UnregisteredError("unregistered")
+        responses = iter([[SendResult(True, "a", None), SendResult(False, None, unavailable),
+                           SendResult(False, None, unregistered)]])
+        calls = []
+
+        def send_each_for_multicast(multicast):
+            calls.append(list(multicast.tokens))
+            return next(responses, None) or [SendResult(True, token, None) for token in multicast.tokens]
+
+        transport = StubTransport()
+        transport.send_each_for_multicast = send_each_for_multicast
+        dispatcher = self.dispatcher(transport)
+        future = dispatcher.enqueue_multicast(messaging.MulticastMessage(tokens=["a", "b", "c"], data={"id": "1"}))
+        self.assertTrue(dispatcher.flush(timeout=5))
+        # 다시 보낼 만한 오류가 난 토큰에게만 다시 보낸다
+        self.assertEqual(calls, [["a", "b", "c"], ["b"]])
+        results = future.result()
+        self.assertEqual(set(results), {"a", "b", "c"})
+        self.assertTrue(results["a"].success and results["b"].success)
+        self.assertIs(results["c"].exception, unregistered)
+
+    def test_flush_waits_for_pending(self):
+        transport = StubTransport()
+        release = threading.Event()
+        send_each = transport.send_each
+        transport.send_each = lambda messages: release.wait(5) and send_each(messages)
+        dispatcher = self.dispatcher(transport)
+        # 결과 callback 이 실패해도 _pending 은 줄어든다
+        futures = [dispatcher.enqueue(self.message(index), on_result=mock.Mock(side_effect=ValueError))
+                   for index in range(2)]
+        self.assertEqual(dispatcher._pending, 2)
+        self.assertFalse(dispatcher.flush(timeout=0.05))
+        self.assertEqual(dispatcher._pending, 2)
+        release.set()
+        with self.assertLogs("users.fcm", "ERROR"):
+            self.assertTrue(dispatcher.flush(timeout=5))
+        self.assertEqual(dispatcher._pending, 0)
+        self.assertTrue(all(future.done() for future in futures))
+        # 보낼 메시지가 없으면 바로 True
+        self.assertTrue(dispatcher.flush(timeout=0))
+
+
+class IngestDecodeTest(SimpleTestCase):
+    """
+    기지국 binary frame 을 읽으면서 잘못된 frame 을 버리는지 검사
+    """
+    def setUp(self):
+        self.server = RangingIngestServer(max_pending=3)
+        self.addCleanup(self.server._executor.shutdown)
+
+    def frame(self, station=b"A", real_distance=1.5, patient_id=7) -> bytes:
+        return FRAME.pack(station, patient_id, real_distance, 3, 1700000000123)
+
+    def test_valid_frames(self):
+        data = encode_frame("A", 7, 1.5, 3, 1700000000123) + encode_frame("ABCD", 8, 0.0, 4, 1700000000456)
+        self.assertEqual(decode_frames(data), [
+            {"patient_id": 7, "station": "A", "real_distance": 1.5, "sequence": 3, "timestamp": 1700000000.123},
+            {"patient_id": 8, "station": "ABCD", "real_distance": 0.0, "sequence": 4, "timestamp": 1700000000.456},
+        ])
+
+    def test_invalid_frames_are_dropped(self):
+        invalid = [
+            self.frame(real_distance=-1.0),
+            self.frame(real_distance=float("nan")),
+            # float32 로 보내면 inf 가 되는 값
+            self.frame(real_distance=float("inf")),
+            self.frame(real_distance=float("-inf")),
+            self.frame(station=b""),
+            # 어긋나게 읽은 frame, 망가진 기지국 이름
+            self.frame(station=b"\xff\xfe\x01\x02"),
+            self.frame(station=b"A\0B"),
+        ]
+        dropped = INGEST_DROPPED.value(reason="invalid")
+        readings = decode_frames(b"".join(invalid[:3] + [self.frame()] + invalid[3:]))
+        self.assertEqual([(reading["station"], reading["real_distance"]) for reading in readings], [("A", 1.5)])
+        self.assertEqual(INGEST_DROPPED.value(reason="invalid") - dropped, len(invalid))
+
+    def test_truncated_datagram_is_dropped(self):
+        dropped = INGEST_DROPPED.value(reason="malformed")
+        for data in (self.frame()[:-1], self.frame() + self.frame()[:5], b"\0"):
+            self.server.submit(data, "udp")
+        self.assertEqual(self.server._pending["udp"], [])
+        self.assertEqual(INGEST_DROPPED.value(reason="malformed") - dropped, 3)
+
+    def test_backlog_is_dropped(self):
+        dropped = INGEST_DROPPED.value(reason="backlog")
+        self.server.submit(self.frame() * 2, "udp")
+        self.server.submit(self.frame() * 2, "udp")
+        self.assertEqual(len(self.server._pending["udp"]), 2)
+        self.assertEqual(INGEST_DROPPED.value(reason="backlog") - dropped, 2)
+
+    def test_stream_drops_truncated_tail(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            # frame 이 두 번에 나뉘어 도착해도 이어붙이고, 끊긴 연결에 남은 조각은 버린다
+            data = self.frame(patient_id=1) + self.frame(patient_id=2)
+            reader.feed_data(data[:30])
+            handler = asyncio.create_task(self.server._handle_stream(reader, mock.Mock()))
+            await asyncio.sleep(0)
+            self.assertEqual(len(self.server._pending["tcp"]), 1)
+            reader.feed_data(data[30:] + self.frame(patient_id=3)[:10])
+            reader.feed_eof()
+            await handler
+
+        dropped = INGEST_DROPPED.value(reason="malformed")
+        asyncio.run(run())
+        self.assertEqual([reading["patient_id"] for reading in self.server._pending["tcp"]], [1, 2])
+        self.assertEqual(INGEST_DROPPED.value(reason="malformed") - dropped, 1)
+
+
+class PatientListTest(TestCase):
+    """
+    환자 전체 조회 (doctor/<int:profile_id>/patient/) 의 cursor 페이지네이션과 ?fields=
+    """
+    @classmethod
+    def setUpTestData(cls):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        cls.profile, other = [User.objects.create_user(f"doctor{index}", f"doctor{index}@igo.test", "password").profile
+                              for index in range(2)]
+        for profile in (cls.profile, other):
+            profile.hospital = hospital
+            profile.save()
+        # 다른 의료진의 환자가 사이사이에 있어도 id 순서로 이어서 읽는다
+        cls.patient_ids = []
+        for index in range(7):
+            cls.patient_ids.append(Patient.objects.create(profile=cls.profile, name=f"환자{index}",
+                                                          disease="감기").pk)
+            Patient.objects.create(profile=other, name=f"다른 환자{index}")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = f"/users/doctor/{self.profile.pk}/patient/"
+
+    def ids(self, response) -> list:
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        return [patient["id"] for patient in (body["results"] if isinstance(body, dict) else body)]
+
+    def test_without_pagination(self):
+        self.assertEqual(self.ids(self.client.get(self.url)), self.patient_ids)
+
+    def test_cursor_pages(self):
+        first = self.client.get(self.url, {"page_size": 3})
+        self.assertEqual(self.ids(first), self.patient_ids[:3])
+        self.assertIsNone(first.json()["previous"])
+
+        second = self.client.get(first.json()["next"])
+        self.assertEqual(self.ids(second), self.patient_ids[3:6])
+        # 페이지 사이에 추가된 환자는 중복이나 누락 없이 마지막 페이지에 나온다
+        added = Patient.objects.create(profile=self.profile, name="새 환자").pk
+        third = self.client.get(second.json()["next"])
+        self.assertEqual(self.ids(third), self.patient_ids[6:] + [added])
+        self.assertIsNone(third.json()["next"])
+
+        # 이전 페이지도 같은 순서
+        self.assertEqual(self.ids(self.client.get(third.json()["previous"])), self.patient_ids[3:6])
+        self.assertEqual(self.ids(self.client.get(second.json()["previous"])), self.patient_ids[:3])
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"fields": "id,name,name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0], {"id": self.patient_ids[0], "name": "환자0"})
+        # 요청한 컬럼만 읽는다
+        select = next(query["sql"] for query in queries.captured_queries if 'FROM "users_patient"' in query["sql"])
+        self.assertIn('"users_patient"."name"', select)
+        self.assertNotIn('"users_patient"."disease"', select)
+
+        response = self.client.get(self.url, {"fields": "id,disease", "page_size": 2})
+        self.assertEqual(response.json()["results"], [{"id": patient_id, "disease": "감기"}
+                                                      for patient_id in self.patient_ids[:2]])
+
+    def test_unknown_fields(self):
+        for fields in ("id,password", "profile", ","):
+            response = self.client.get(self.url, {"fields": fields})
+            self.assertEqual(response.status_code, 400, fields)
+            self.assertIn("fields", response.json())
+        # 빈 값은 ?fields 가 없는 것과 같다
+        response = self.client.get(self.url, {"fields": ""})
+        self.assertEqual(set(response.json()[0]), set(PatientREADSerializer.Meta.fields))
+
+
+class ContentNegotiationTest(TestCase):
+    """
+    Accept / Content-Type 에 따른 JSON (orjson), MessagePack 선택
+    """
+    @classmethod
+    def setUpTestData(cls):
+        hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000, real_y=500000)
+        cls.profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        cls.profile.hospital = hospital
+        cls.profile.save()
+        for index in range(2):
+            Patient.objects.create(profile=cls.profile, name=f"환자{index}", age=70 + index, fall_risk=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = f"/users/doctor/{self.profile.pk}/patient/"
+
+    def test_json_by_default(self):
+        with mock.patch("users.renderers.orjson.dumps", wraps=orjson.dumps) as dumps:
+            for accept in ({}, {"HTTP_ACCEPT": "application/json"}, {"HTTP_ACCEPT": "*/*"}):
+                response = self.client.get(self.url, **accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertEqual([patient["name"] for patient in json.loads(response.content)], ["환자0", "환자1"])
+        self.assertEqual(dumps.call_count, 3)
+
+    def test_msgpack(self):
+        expected = json.loads(self.client.get(self.url).content)
+        response = self.client.get(self.url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), expected)
+
+    def test_json_without_orjson(self):
+        expected = self.client.get(self.url).content
+        with mock.patch("users.renderers.orjson", None):
+            response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content), json.loads(expected))
+
+    def test_unsupported_accept(self):
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="application/xml").status_code, 406)
+
+    def test_renderers_match_json_renderer(self):
+        data = {1: datetime(2022, 9, 1, 12, 30, 0, 123456, tzinfo=timezone.utc), "decimal": Decimal("1.50"),
+                "uuid": uuid.UUID(int=1), "list": [1.5, None, True, "환자"]}
+        expected = json.loads(JSONRenderer().render(data))
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), expected)
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(data), raw=False, strict_map_key=False),
+                         {1 if key == "1" else key: value for key, value in expected.items()})
+        # 들여쓰기를 요청하면 JSONRenderer 와 같은 결과
+        self.assertEqual(FastJSONRenderer().render(data, "application/json; indent=2"),
+                         JSONRenderer().render(data, "application/json; indent=2"))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+        self.assertEqual(MessagePackRenderer().render(None), b"")
+
+    def test_msgpack_request(self):
+        url = "/users/send/station/999999/"
+        response = self.client.post(url, msgpack.packb({"station": "A", "real_distance": -1.0}),
+                                    content_type="application/msgpack")
+        # MessagePack 본문을 읽어서 검사한 결과
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()), ["real_distance"])
+
+        response = self.client.post(url, b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("MessagePack parse error", response.json()["detail"])
+
+
+class CalibrationCacheInvalidationTest(TestCase):
+    """
+    병원, 기지국, 의료진, 환자를 수정하면 캐시된 위치 계산 정보를 다시 읽는지 검사
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.hospital = Hospital.objects.create(name="병원", drawing_x=1000, drawing_y=500, real_x=1000000,
+                                               real_y=500000)
+        cls.stations = [Station.objects.create(hospital=cls.hospital, name=name, real_x=x, real_y=y)
+                        for name, x, y in (("A", 0, 0), ("B", 1000000, 0), ("C", 0, 500000))]
+        cls.other = Hospital.objects.create(name="다른 병원", drawing_x=100, drawing_y=100, real_x=100000,
+                                            real_y=100000, real_station2_x=100000, real_station3_y=100000)
+        cls.profile = User.objects.create_user("doctor", "doctor@igo.test", "password").profile
+        cls.profile.hospital = cls.hospital
+        cls.profile.save()
+        cls.other_profile = User.objects.create_user("other", "other@igo.test", "password").profile
+        cls.other_profile.hospital = cls.other
+        cls.other_profile.save()
+        cls.patient = Patient.objects.create(profile=cls.profile, name="환자")
+
+    def setUp(self):
+        calibration_cache.clear()
+        self.addCleanup(calibration_cache.clear)
+
+    def cached(self):
+        """
+        :return: 환자의 병원의 HospitalGeometry (캐시에서, 쿼리 0번)
+        """
+        with self.assertNumQueries(0):
+            return calibration_cache.for_patient(self.patient.pk)
+
+    def reload(self):
+        """
+        :return: 환자의 병원의 HospitalGeometry (캐시가 지워져서 다시 읽음, 쿼리 1번)
+        """
+        with self.assertNumQueries(1):
+            return calibration_cache.for_patient(self.patient.pk)
+
+    def test_station_edit(self):
+        self.assertEqual(self.reload().station_names, ("A", "B", "C"))
+        station = self.stations[1]
+        station.real_x = 500000
+        station.save()
+        # B 와의 거리가 같아도 B 가 옮겨졌으므로 다른 좌표
+        x, _ = self.reload().drawing_position((300000.0, 700000.0, 500000.0))
+        self.assertNotAlmostEqual(x, 300.0)
+
+        Station.objects.create(hospital=self.hospital, name="D", real_x=1000000, real_y=500000)
+        self.assertEqual(self.reload().station_names, ("A", "B", "C", "D"))
+        self.assertIs(self.cached(), self.cached())
+        self.stations[0].delete()
+        self.assertEqual(self.reload().station_names, ("B", "C", "D"))
+
+    def test_hospital_edit(self):
+        self.assertEqual(self.reload().drawing_x, 1000)
+        self.hospital.drawing_x = 2000
+        self.hospital.save()
+        geometry = self.reload()
+        self.assertEqual(geometry.drawing_x, 2000)
+        self.assertIs(self.cached(), geometry)
+        # 다른 병원의 수정은 캐시를 지우지 않는다
+        self.other.save()
+        self.assertIs(self.cached(), geometry)
+
+    def test_profile_edit(self):
+        self.assertEqual(self.reload().hospital_id, self.hospital.pk)
+        # 의료진이 병원을 옮기면 그 의료진의 환자도 옮긴 병원의 기지국으로 계산
+        self.profile.hospital = self.other
+        self.profile.save()
+        self.assertEqual(self.reload().hospital_id, self.other.pk)
+        self.assertEqual(self.cached().station_names, ("A", "B", "C"))
+
+    def test_patient_edit(self):
+        self.assertEqual(self.reload().hospital_id, self.hospital.pk)
+        self.patient.profile = self.other_profile
+        self.patient.save()
+        self.assertEqual(self.reload().hospital_id, self.other.pk)
+        self.assertEqual(calibration_cache.profile_id_for_patient(self.patient.pk), self.other_profile.pk)
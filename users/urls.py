@@ -2,16 +2,22 @@
 from django.urls import path
 
 from .views import RegisterView, LoginView, ProfileAPIView
-from .views import PatientsAPIView, PatientAPIView
+from .views import PatientsAPIView, PatientAPIView, PatientPositionHistoryAPIView
+from .views import PatientImportAPIView, PatientExportAPIView, HospitalPatientExportAPIView
 from .views import HospitalREADAllAPIView, HospitalREADOneAPIView
 from .views import FromPatientToServerIPAddressAPIView, FromStationToServerAPIView
+from .views import FromStationToServerBulkAPIView, FromStationToServerStaffAPIView
 from .views import FromPatientToDoctorAPIView, FromDoctorToPatientAPIView
+from .views import FromPatientToDoctorAsyncView, FromDoctorToPatientAsyncView
+from .views import FromDoctorToPatientsAPIView, FromDoctorToPatientsResultAPIView
 
 urlpatterns = [
     # 병원 전체 조회
     path('hospital/', HospitalREADAllAPIView.as_view()),
     # 병원 1개 조회
     path('hospital/<int:hospital_id>/', HospitalREADOneAPIView.as_view()),
+    # 병원의 환자 전체 내보내기 (CSV / NDJSON)
+    path('hospital/<int:hospital_id>/patient/export/', HospitalPatientExportAPIView.as_view()),
 
     # 의료진 회원가입
     path('register/', RegisterView.as_view()),
@@ -22,16 +28,34 @@ urlpatterns = [
 
     # 환자 1명 생성, 환자 전체 조회
     path('doctor/<int:profile_id>/patient/', PatientsAPIView.as_view()),
+    # 환자 여러 명 생성 (CSV / NDJSON 파일)
+    path('doctor/<int:profile_id>/patient/import/', PatientImportAPIView.as_view()),
+    # 의료진의 환자 전체 내보내기 (CSV / NDJSON)
+    path('doctor/<int:profile_id>/patient/export/', PatientExportAPIView.as_view()),
     # 환자 1명 조회, 환자 1명 수정, 환자 1명 삭제
     path('doctor/<int:profile_id>/patient/<int:patient_id>/', PatientAPIView.as_view()),
+    # 환자 1명의 위치 이력 조회
+    path('doctor/<int:profile_id>/patient/<int:patient_id>/history/', PatientPositionHistoryAPIView.as_view()),
 
     # 환자 -> 서버 (wifi ip 주소 보내기)
     path('send/ip_address/<int:patient_id>/', FromPatientToServerIPAddressAPIView.as_view()),
     # 기지국 -> 서버 (거리 값)
     path('send/station/<int:patient_id>/', FromStationToServerAPIView.as_view()),
+    # 기지국 -> 서버 (의료진 배지와의 거리 값)
+    path('send/station/staff/<int:profile_id>/', FromStationToServerStaffAPIView.as_view()),
+    # 기지국 -> 서버 (여러 환자, 여러 기지국의 거리 값을 한 번에)
+    path('send/station/bulk/', FromStationToServerBulkAPIView.as_view()),
 
     # 환자 -> 서버 (의료진 호출)
     path('call/patient/<int:patient_id>/', FromPatientToDoctorAPIView.as_view()),
     # 의료진 -> 서버 (환자 호출)
     path('call/doctor/patient/<int:patient_id>/', FromDoctorToPatientAPIView.as_view()),
+    # 의료진 -> 서버 (환자 여러 명 호출, 환자 단말기 동작)
+    path('call/doctor/patients/', FromDoctorToPatientsAPIView.as_view()),
+    # 의료진 -> 서버 (환자 여러 명 호출 결과 조회)
+    path('call/doctor/patients/<str:task_id>/', FromDoctorToPatientsResultAPIView.as_view()),
+    # 환자 -> 서버 (의료진 호출, async view, FCM 발송 결과까지 응답)
+    path('call/async/patient/<int:patient_id>/', FromPatientToDoctorAsyncView.as_view()),
+    # 의료진 -> 서버 (환자 호출, async view, FCM 발송 결과까지 응답)
+    path('call/async/doctor/patient/<int:patient_id>/', FromDoctorToPatientAsyncView.as_view()),
 ]
@@ -1,5 +1,8 @@
 # users/views.py
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 
 from rest_framework import generics, status
 from rest_framework.response import Response
@@ -8,17 +11,37 @@ from rest_framework.views import APIView
 
 from .models import Hospital, Profile, Patient
 
-from .serializers import HospitalREADOneSerializer, HospitalREADAllSerializer
 from .serializers import RegisterSerializer, LoginSerializer
 from .serializers import ProfileREADSerializer, ProfileUPDATESerializer
 from .serializers import PatientCREATESerializer, PatientREADSerializer, PatientUPDATESerializer
+from .serializers import PatientListQuerySerializer
+from .serializers import StationReadingOneSerializer, StationReadingSerializer, PositionHistoryQuerySerializer
+from .serializers import PatientsCallSerializer
 
-from .utils import get_drawing_patient_position
-from .utils import send_from_patient_to_doctor_by_fcm_notification
 from .utils import send_from_doctor_to_patient_by_fcm_notification
 from .utils import send_from_patient_to_doctor_by_fcm_data
 
-import webbrowser
+from .pagination import PatientCursorPagination
+from .hospital_cache import hospital_response_cache
+from .patient_io import CONTENT_TYPES, CSV, FILE_FORMATS
+from .patient_io import check_encoding, export_patients, guess_file_format, import_patients, iter_rows
+from .calibration import calibration_cache
+from .history import get_position_history
+from .care_team import send_from_patient_to_care_team_by_fcm, get_call_tokens, enqueue_care_team_call
+from .fcm import wait_for_results
+from .async_db import run_db
+from .terminal import actuate_patients, actuation_results, terminal_client
+from .call_debounce import MERGED, OPENED, call_debouncer
+from .staff_locator import staff_locator
+from .geofence import geofence_engine
+from .ranging import ranging_accumulator, record_drawing_positions, save_debug_distances, process_readings
+from .logs import log_event, log_sampled
+from .metrics import REGISTRY, RANGING_READINGS, TRILATERATION_LATENCY
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class HospitalREADAllAPIView(APIView):
@@ -26,10 +49,9 @@ class HospitalREADAllAPIView(APIView):
     병원 전체 조회
     hospital/
     """
+    # 캐시된 본문 + ETag, 바뀌지 않았으면 304
     def get(self, request):
-        hospitals = Hospital.objects.all()
-        serializer = HospitalREADAllSerializer(hospitals, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return hospital_response_cache.for_all().response(request)
 
 
 class HospitalREADOneAPIView(APIView):
@@ -37,10 +59,12 @@ class HospitalREADOneAPIView(APIView):
     병원 1개 조회
     hospital/<int:hospital_id>/
     """
+    # 캐시된 본문 + ETag, 바뀌지 않았으면 304
     def get(self, request, hospital_id):
-        hospital = get_object_or_404(Hospital, pk=hospital_id)
-        serializer = HospitalREADOneSerializer(hospital)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        cached = hospital_response_cache.for_hospital(hospital_id)
+        if cached is None:
+            raise Http404
+        return cached.response(request)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -109,22 +133,100 @@ class PatientsAPIView(APIView):
                           blood_rh=request.data["blood_rh"],
                           disease=request.data["disease"],
                           extra=request.data["extra"],
-                          image=request.data["image"]
+                          image=request.data["image"],
+                          fall_risk=serializer.validated_data.get("fall_risk", False)
                           )
         patient.save()
         return Response(data=request.data, status=status.HTTP_201_CREATED)
 
     # 환자 전체 조회
+    # ?fields=id,name,image 로 필요한 필드만, ?page_size= / ?cursor= 로 페이지 단위로 조회
     def get(self, request, profile_id):
+        query = PatientListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        fields = query.validated_data.get("fields", PatientREADSerializer.Meta.fields)
+
+        profile = get_object_or_404(Profile.objects.only("pk"), pk=profile_id)
+        # 응답에 필요한 컬럼만 읽음 (profile.patient_set 은 지연 로딩된 profile_id 를 환자마다 다시 읽으므로 쓰지 않음)
+        patients = Patient.objects.filter(profile_id=profile.pk).only(*fields).order_by("id")
+        paginator = PatientCursorPagination()
+        if not paginator.is_requested(request):
+            serializer = PatientREADSerializer(patients, many=True, fields=fields)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        page = paginator.paginate_queryset(patients, request, view=self)
+        serializer = PatientREADSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class PatientImportAPIView(APIView):
+    """
+    환자 여러 명 생성 (CSV / NDJSON 파일 업로드)
+    doctor/<int:profile_id>/patient/import/
+    """
+    # multipart/form-data 의 file, 형식은 file_format (csv, ndjson) 또는 파일 확장자
+    def post(self, request, profile_id):
         profile = get_object_or_404(Profile, pk=profile_id)
-        patients = profile.patient_set.all()
-        serializer = PatientREADSerializer(patients, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        uploaded_file = request.FILES.get("file")
+        if uploaded_file is None:
+            return Response({"file": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get("file_format") or guess_file_format(uploaded_file.name)
+        if file_format not in FILE_FORMATS:
+            return Response({"file_format": [f"choose from {', '.join(FILE_FORMATS)}"]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        encoding_error = check_encoding(uploaded_file)
+        if encoding_error is not None:
+            return Response({"file": [encoding_error]}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_patients(profile, iter_rows(uploaded_file, file_format))
+        log_event(logger, logging.INFO, "patients imported", profile_id=profile.pk,
+                  created=result["created"], errors=len(result["errors"]))
+        return Response(result, status=status.HTTP_201_CREATED if result["created"] else status.HTTP_400_BAD_REQUEST)
+
+
+class PatientExportAPIView(APIView):
+    """
+    의료진의 환자 전체 내보내기 (CSV / NDJSON 스트리밍)
+    doctor/<int:profile_id>/patient/export/
+    """
+    # ?file_format=csv (기본값) 또는 ndjson
+    def get(self, request, profile_id):
+        profile = get_object_or_404(Profile.objects.only("pk"), pk=profile_id)
+        return export_response(request, Patient.objects.filter(profile_id=profile.pk), f"doctor-{profile.pk}-patients")
+
+
+class HospitalPatientExportAPIView(APIView):
+    """
+    병원의 환자 전체 내보내기 (CSV / NDJSON 스트리밍)
+    hospital/<int:hospital_id>/patient/export/
+    """
+    # ?file_format=csv (기본값) 또는 ndjson
+    def get(self, request, hospital_id):
+        hospital = get_object_or_404(Hospital.objects.only("pk"), pk=hospital_id)
+        return export_response(request, Patient.objects.filter(profile__hospital_id=hospital.pk),
+                               f"hospital-{hospital.pk}-patients")
+
+
+def export_response(request, patients, file_name):
+    """
+    :param request: ?file_format= 가 있을 수 있는 요청
+    :param patients: 내보낼 환자 queryset
+    :param file_name: 내려받을 파일 이름 (확장자 제외)
+    :return: StreamingHttpResponse
+    """
+    file_format = request.query_params.get("file_format", CSV)
+    if file_format not in FILE_FORMATS:
+        return Response({"file_format": [f"choose from {', '.join(FILE_FORMATS)}"]},
+                        status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(export_patients(patients, file_format), content_type=CONTENT_TYPES[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{file_name}.{file_format}"'
+    return response
 
 
 class PatientAPIView(APIView):
     """
-    환자 1명 조회, 환자 1명 수정, 환자 1명 삭제
+    환자 1명 조회, 환자 1명 수정 (PUT 모든 필드, PATCH 보낸 필드만), 환자 1명 삭제
     doctor/<int:profile_id>/patient/<int:patient_id>/
     """
     # 환자 1명 조회
@@ -134,23 +236,35 @@ class PatientAPIView(APIView):
         serializer = PatientREADSerializer(patient)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    # 환자 1명 수정
+    # 환자 1명 수정 (모든 필드)
     def put(self, request, profile_id, patient_id):
-        profile = get_object_or_404(Profile, pk=profile_id)
-        patient = get_object_or_404(Patient, pk=patient_id)
         serializer = PatientUPDATESerializer(data=request.data)
         if not serializer.is_valid():  # request 유효성 검사
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        missing = (set(PatientUPDATESerializer.Meta.fields) - set(PatientUPDATESerializer.Meta.optional_on_put)
+                   - set(serializer.validated_data))
+        if missing:
+            return Response({field: ["This field is required."] for field in sorted(missing)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # SELECT 없이 수정할 필드만 UPDATE 1번 (위치 좌표, ip 주소 등 다른 필드는 건드리지 않음)
+        if not Patient.objects.filter(pk=patient_id).update(**serializer.validated_data):
+            raise Http404
+        invalidate_patient_caches(patient_id, serializer.validated_data)
+        return Response(request.data, status=status.HTTP_200_OK)
 
-        patient.name = request.data["name"]
-        patient.gender = request.data["gender"]
-        patient.age = request.data["age"]
-        patient.blood_type = request.data["blood_type"]
-        patient.blood_rh = request.data["blood_rh"]
-        patient.disease = request.data["disease"]
-        patient.extra = request.data["extra"]
-        patient.image = request.data["image"]
-        patient.save()
+    # 환자 1명 수정 (보낸 필드만)
+    def patch(self, request, profile_id, patient_id):
+        serializer = PatientUPDATESerializer(data=request.data, partial=True)
+        if not serializer.is_valid():  # request 유효성 검사
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        patients = Patient.objects.filter(pk=patient_id)
+        # SELECT 없이 보낸 필드만 UPDATE 1번
+        found = patients.update(**serializer.validated_data) if serializer.validated_data else patients.exists()
+        if not found:
+            raise Http404
+        invalidate_patient_caches(patient_id, serializer.validated_data)
         return Response(request.data, status=status.HTTP_200_OK)
 
     # 환자 1명 삭제
@@ -161,20 +275,54 @@ class PatientAPIView(APIView):
         return Response(request.data, status=status.HTTP_200_OK)
 
 
+def invalidate_patient_caches(patient_id, fields: dict):
+    """
+    queryset.update() 는 post_save signal 을 보내지 않으므로, 캐시된 환자 값을 signals.py 대신 직접 지우는 함수
+    :param patient_id: 수정한 환자 ID
+    :param fields: 수정한 필드 -> 값
+    :return: none
+    """
+    if "fall_risk" in fields:
+        geofence_engine.invalidate_patient(patient_id)
+
+
+class PatientPositionHistoryAPIView(APIView):
+    """
+    환자 1명의 위치 이력 조회
+    doctor/<int:profile_id>/patient/<int:patient_id>/history/
+    """
+    def get(self, request, profile_id, patient_id):
+        serializer = PositionHistoryQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():  # request 유효성 검사
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(Patient, pk=patient_id)
+
+        end = serializer.validated_data.get("end", time.time())
+        start = serializer.validated_data.get("start", end - 3600)
+        max_points = min(serializer.validated_data.get("max_points", settings.POSITION_HISTORY["MAX_POINTS"]),
+                         settings.POSITION_HISTORY["MAX_POINTS"])
+        positions = get_position_history(patient_id, start=start, end=end, max_points=max_points)
+        return Response({"id": patient_id, "start": start, "end": end, "positions": positions},
+                        status=status.HTTP_200_OK)
+
+
 class FromPatientToServerIPAddressAPIView(APIView):
     """
     환자 -> 서버 (wifi ip 주소 보내기)
     send/ip_address/<int:patient_id>/
     """
     def post(self, request, patient_id):
-        ip_address = request.data["ip_address"]
-        patient = get_object_or_404(Patient, pk=patient_id)
-        print(f"ip_address: {ip_address}")
-        print(f"환자 ID: {patient_id}")
-        print(f"환자 이름: {patient.name}")
-
-        patient.ip_address = ip_address
-        patient.save()
+        ip_address = str(request.data["ip_address"])
+        try:
+            # 호출할 때 이 주소로 요청을 보내므로 병원 내부망의 ip 만 저장
+            terminal_client.check_address(ip_address)
+        except ValueError:
+            log_event(logger, logging.WARNING, "invalid ip address", patient_id=patient_id, ip_address=ip_address)
+            return Response("invalid ip address", status=status.HTTP_400_BAD_REQUEST)
+        # SELECT 없이 ip 주소만 UPDATE 1번
+        if not Patient.objects.filter(pk=patient_id).update(ip_address=ip_address):
+            raise Http404
+        log_event(logger, logging.INFO, "patient ip address", patient_id=patient_id, ip_address=ip_address)
         return Response(request.data, status=status.HTTP_200_OK)
 
 
@@ -184,97 +332,142 @@ class FromStationToServerAPIView(APIView):
     call/station/<int:patient_id>/
     """
     def post(self, request, patient_id):
-        station = request.data["station"]  # 기지국 이름
-        distance = float(request.data["real_distance"])  # 거리값
+        serializer = StationReadingOneSerializer(data=request.data)
+        if not serializer.is_valid():  # request 유효성 검사
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        station = serializer.validated_data["station"]  # 기지국 이름
+        distance = serializer.validated_data["real_distance"]  # 거리값
         distance = distance * 10000.0  # 예를 들어, 1.2m 값이 들어오면 12000.0으로 변환
+        # 기지국별 순번, 측정 시각 (없어도 됨)
+        sequence = serializer.validated_data.get("sequence")
+        timestamp = serializer.validated_data.get("timestamp")
+
+        # 환자의 의료진의 병원의 위치 계산 정보 (캐시에 있으면 쿼리 0번, 없으면 1번)
+        geometry = calibration_cache.for_patient(patient_id)
+        if geometry is None:
+            return Response("patient not found", status=status.HTTP_404_NOT_FOUND)
+        # 병원에 없는 기지국의 거리 값은 모아두지 않는다
+        if station not in geometry.station_names:
+            log_event(logger, logging.WARNING, "invalid station name", patient_id=patient_id, station=station)
+            return Response("invalid station name", status=status.HTTP_400_BAD_REQUEST)
+        RANGING_READINGS.inc(source="http")
+        log_sampled(logger, logging.DEBUG, "station reading", patient_id=patient_id, station=station, distance=distance)
 
-        # 환자 조회
-        patient = get_object_or_404(Patient, pk=patient_id)
-        print(f"환자 ID: {patient_id}")
-        print(f"환자 이름: {patient.name}")
-
-        if station == "A":
-            print(f"기지국 A가 값을 보냈습니다 : {distance}")
-            patient.real_distance1 = distance
-            patient.save()
-        elif station == "B":
-            print(f"기지국 B가 값을 보냈습니다 : {distance}")
-            patient.real_distance2 = distance
-            patient.save()
-        elif station == "C":
-            print(f"기지국 C가 값을 보냈습니다 : {distance}")
-            patient.real_distance3 = distance
-            patient.save()
-        else:
-            print("invalid station name")
+        # 거리 값은 메모리에 모아두고, 기지국 3개 이상의 거리 값이 모였을 때만 데이터베이스에 쓴다
+        count = ranging_accumulator.add(patient_id, station, distance, sequence=sequence, timestamp=timestamp)
+        if not count:
+            # 중복, 늦게 도착했거나 오래된 거리 값은 데이터베이스에 접근하지 않고 버림
+            return Response(request.data, status=status.HTTP_200_OK)
+        save_debug_distances(patient_id, {station: distance})
+        if count < ranging_accumulator.MIN_STATIONS:
+            # 아직 모든 기지국이 거리값을 보내지 않았음
+            return Response(request.data, status=status.HTTP_200_OK)
+
+        # 병원의 모든 기지국의 거리 값이 모였는지 확인
+        real_distance = ranging_accumulator.pop_complete(patient_id, geometry.station_names)
+        if real_distance is None:
+            # 아직 모든 기지국이 거리값을 보내지 않았음
+            return Response(request.data, status=status.HTTP_200_OK)
+
+        # 도면 상에서 환자의 위치 좌표를 구하고 저장
+        with TRILATERATION_LATENCY.time(mode="single"):
+            drawing_patient_x, drawing_patient_y = geometry.drawing_position(real_distance)
+        log_sampled(logger, logging.DEBUG, "patient position", patient_id=patient_id,
+                    x=drawing_patient_x, y=drawing_patient_y)
+        record_drawing_positions({patient_id: (drawing_patient_x, drawing_patient_y)})
+        return Response(request.data, status=status.HTTP_200_OK)
+
+
+class FromStationToServerStaffAPIView(APIView):
+    """
+    기지국 -> 서버 (의료진 배지와의 거리 값)
+    send/station/staff/<int:profile_id>/
+    """
+    def post(self, request, profile_id):
+        serializer = StationReadingOneSerializer(data=request.data)
+        if not serializer.is_valid():  # request 유효성 검사
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        station = serializer.validated_data["station"]  # 기지국 이름
+        distance = serializer.validated_data["real_distance"] * 10000.0  # 거리값 (m -> 0.1mm)
+        sequence = serializer.validated_data.get("sequence")
+        timestamp = serializer.validated_data.get("timestamp")
+        # 의료진의 병원의 위치 계산 정보 (캐시에 있으면 쿼리 0번, 없으면 1번)
+        geometry = calibration_cache.for_profile(profile_id)
+        if geometry is None:
+            return Response("profile not found", status=status.HTTP_404_NOT_FOUND)
+        if station not in geometry.station_names:
             return Response("invalid station name", status=status.HTTP_400_BAD_REQUEST)
+        RANGING_READINGS.inc(source="staff")
 
-        if (patient.real_distance1 > 0) and (patient.real_distance2 > 0) and (patient.real_distance3 > 0):
-            print("모든 기지국이 거리값을 보냈습니다.")
-            # 환자의 의료진
-            profile = patient.profile
-            # 의료진의 병원
-            hospital = profile.hospital
-            # 도면 상에서 환자의 위치 좌표를 구하고 저장
-            drawing_patient_x, drawing_patient_y = get_drawing_patient_position(
-                hospital=hospital,
-                real_distance=(patient.real_distance1, patient.real_distance2, patient.real_distance3)
-            )
-            print(f"도면 상에서 환자의 x좌표 : {drawing_patient_x}")
-            print(f"도면 상에서 환자의 y좌표 : {drawing_patient_y}")
-            patient.drawing_patient_x = drawing_patient_x
-            patient.drawing_patient_y = drawing_patient_y
-
-            # 환자의 실제 거리값 0으로 초기화
-            patient.real_distance1 = 0.0
-            patient.real_distance2 = 0.0
-            patient.real_distance3 = 0.0
-            patient.save()
-        else:
-            print("아직 모든 기지국이 거리값을 보내지 않았습니다.")
+        # 환자와 같은 방법으로 메모리에 모아두고, 모든 기지국의 거리 값이 모였을 때만 위치 계산
+        key = ("staff", profile_id)
+        count = ranging_accumulator.add(key, station, distance, sequence=sequence, timestamp=timestamp)
+        if count < ranging_accumulator.MIN_STATIONS:
+            return Response(request.data, status=status.HTTP_200_OK)
+        real_distance = ranging_accumulator.pop_complete(key, geometry.station_names)
+        if real_distance is None:
             return Response(request.data, status=status.HTTP_200_OK)
 
+        with TRILATERATION_LATENCY.time(mode="single"):
+            drawing_staff_x, drawing_staff_y = geometry.drawing_position(real_distance)
+        # 데이터베이스에는 저장하지 않고 가까운 의료진 찾기에만 사용
+        staff_locator.update(geometry.hospital_id, profile_id, drawing_staff_x, drawing_staff_y)
         return Response(request.data, status=status.HTTP_200_OK)
 
 
+class FromStationToServerBulkAPIView(APIView):
+    """
+    기지국 -> 서버 (여러 환자, 여러 기지국의 거리 값을 한 번에)
+    send/station/bulk/
+    """
+    def post(self, request):
+        serializer = StationReadingSerializer(data=request.data, many=True)
+        if not serializer.is_valid():  # request 유효성 검사 (전체 기록을 함께 검사)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results = process_readings(serializer.validated_data, source="http_bulk")
+        return Response(results, status=status.HTTP_200_OK)
+
+
 class FromPatientToDoctorAPIView(APIView):
     """
     환자 -> 서버 (의료진 호출)
     call/patient/<int:patient_id>/
+    CALL_DEBOUNCE["WINDOW"] 초 안에 다시 호출하면 push 를 보내지 않고 진행 중인 호출에 합친다
     """
     def get(self, request, patient_id):
         # 환자 조회
         patient = get_object_or_404(Patient, pk=patient_id)
-        # 환자의 의료진
-        profile = patient.profile
-        # 의료진의 병원
-        hospital = profile.hospital
-        print(f"환자 ID: {patient_id}")
-        print(f"환자 이름: {patient.name}")
-        print(f"의료진 이름: {profile.name}")
-        print(f"병원 이름: {hospital.name}")
 
         # 도면에서 환자의 위치 좌표를 의료진 스마트폰 앱에 보냄 (FCM push message)
         drawing_patient_x = patient.drawing_patient_x
         drawing_patient_y = patient.drawing_patient_y
-        print("FCM에 보낼 값")
-        print(f"drawing_patient_x: {drawing_patient_x}")
-        print(f"drawing_patient_y: {drawing_patient_y}")
+        result, call = call_debouncer.register(patient_id, drawing_patient_x, drawing_patient_y)
+        log_event(logger, logging.INFO, "patient call", patient_id=patient_id, profile_id=patient.profile_id,
+                  x=drawing_patient_x, y=drawing_patient_y, call=result, count=call.count)
+
+        # FCM에 push 메시지 요청 보내기 (담당 의료진과 가장 가까운 의료진, 위치를 모르면 같은 병원의 근무 중인 의료진 전체)
+        if result == OPENED:
+            send_from_patient_to_care_team_by_fcm(
+                patient=patient,
+                drawing_patient_x=drawing_patient_x,
+                drawing_patient_y=drawing_patient_y
+            )
+        return Response(call_response(result, call), status=status.HTTP_200_OK)
 
-        # FCM에 push 메시지 요청 보내기
-        # notification push
-        send_from_patient_to_doctor_by_fcm_notification(
-            patient=patient,
-            doctor=profile
-        )
-        # data push
-        send_from_patient_to_doctor_by_fcm_data(
-            patient=patient,
-            doctor=profile,
-            drawing_patient_x=drawing_patient_x,
-            drawing_patient_y=drawing_patient_y
-        )
-        return Response(request.data, status=status.HTTP_200_OK)
+
+def call_response(result, call) -> dict:
+    """
+    :param result: OPENED 또는 MERGED
+    :param call: PatientCall
+    :return: 환자 호출 API 응답 (새 호출을 열었는지, 진행 중인 호출에 합쳤는지)
+    """
+    return {
+        "call": result,
+        "count": call.count,
+        "opened_at": call.opened_at,
+        "x": call.drawing_patient_x,
+        "y": call.drawing_patient_y,
+    }
 
 
 class FromDoctorToPatientAPIView(APIView):
@@ -284,23 +477,16 @@ class FromDoctorToPatientAPIView(APIView):
     """
     # 의료진이 자신의 id값과 환자의 id값을 보냄
     def get(self, request, patient_id):
-        # 환자 조회
-        patient = get_object_or_404(Patient, pk=patient_id)
+        # 환자 조회 (환자의 의료진도 함께)
+        patient = get_object_or_404(Patient.objects.select_related("profile"), pk=patient_id)
         # 환자의 의료진
         profile = patient.profile
-        # 의료진의 병원
-        hospital = profile.hospital
-        print(f"환자 ID: {patient_id}")
-        print(f"환자 이름: {patient.name}")
-        print(f"의료진 이름: {profile.name}")
-        print(f"병원 이름: {hospital.name}")
 
         # 도면에서 환자의 위치 좌표를 의료진 스마트폰 앱에 보냄 (FCM push message)
         drawing_patient_x = patient.drawing_patient_x
         drawing_patient_y = patient.drawing_patient_y
-        print("FCM에 보낼 값")
-        print(f"drawing_patient_x: {drawing_patient_x}")
-        print(f"drawing_patient_y: {drawing_patient_y}")
+        log_event(logger, logging.INFO, "doctor call", patient_id=patient_id, profile_id=profile.pk,
+                  x=drawing_patient_x, y=drawing_patient_y)
 
         # FCM에 push 메시지 요청 보내기
         # notification push
@@ -313,9 +499,125 @@ class FromDoctorToPatientAPIView(APIView):
             drawing_patient_y=drawing_patient_y,
         )
 
-        # 환자 아두이노에 피드백
-        # ip = patient.ip_address
-        # url = f"http://{ip}/gpio1/1"
-        # webbrowser.open(url)
+        # 환자 아두이노에 피드백 (워커 스레드에서 보내고 바로 반환)
+        if patient.ip_address:
+            terminal_client.submit(patient.ip_address, settings.TERMINAL_ACTUATION["DEFAULT_ACTION"])
 
         return Response(request.data, status=status.HTTP_200_OK)
+
+
+class FromDoctorToPatientsAPIView(APIView):
+    """
+    의료진 -> 서버 (환자 여러 명 호출, 환자 단말기의 부저 / LED / 진동)
+    call/doctor/patients/
+    """
+    def post(self, request):
+        serializer = PatientsCallSerializer(data=request.data)
+        if not serializer.is_valid():  # request 유효성 검사
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        patient_ids = list(dict.fromkeys(serializer.validated_data["patients"]))
+        action = serializer.validated_data["action"]
+
+        # 환자 단말기 주소를 쿼리 1번으로 조회
+        addresses = dict(Patient.objects.filter(pk__in=patient_ids).values_list("pk", "ip_address"))
+        log_event(logger, logging.INFO, "doctor call patients", patients=len(patient_ids), action=action)
+
+        # 단말기마다 워커 스레드에서 동시에 보내고 바로 반환, 결과는 task ID 로 조회
+        task_id, results = actuate_patients(
+            [(patient_id, addresses.get(patient_id)) for patient_id in patient_ids], action,
+        )
+        return Response({"task": task_id, "results": results}, status=status.HTTP_202_ACCEPTED)
+
+
+class FromDoctorToPatientsResultAPIView(APIView):
+    """
+    의료진 -> 서버 (환자 여러 명 호출 결과 조회)
+    call/doctor/patients/<str:task_id>/
+    """
+    def get(self, request, task_id):
+        results = actuation_results.get(task_id)
+        if results is None:
+            raise Http404
+        return Response({"task": task_id, "results": results}, status=status.HTTP_200_OK)
+
+
+class FromPatientToDoctorAsyncView(View):
+    """
+    환자 -> 서버 (의료진 호출, async view)
+    call/async/patient/<int:patient_id>/
+    ASGI 에서는 FCM 발송 결과를 기다리는 동안 스레드를 붙잡지 않으므로, 발송 결과까지 응답에 담는다
+    CALL_DEBOUNCE["WINDOW"] 초 안에 다시 호출하면 push 를 보내지 않고 진행 중인 호출에 합친다
+    """
+    async def get(self, request, patient_id):
+        # 환자 조회, 호출 기록, 새 호출이면 호출을 받을 의료진 토큰 조회
+        patient, result, call, tokens = await run_db(self.load, patient_id)
+        if patient is None:
+            raise Http404
+
+        log_event(logger, logging.INFO, "patient call", patient_id=patient_id, profile_id=patient.profile_id,
+                  x=call.drawing_patient_x, y=call.drawing_patient_y, call=result, count=call.count)
+        if result == MERGED:
+            return JsonResponse({"tokens": 0, "success": 0, "failure": 0, "pending": 0, **call_response(result, call)})
+
+        # notification, data push 를 함께 발송 큐에 넣고 결과를 함께 기다림
+        futures = enqueue_care_team_call(patient, tokens, call.drawing_patient_x, call.drawing_patient_y)
+        results = await wait_for_results(futures, timeout=settings.CALL_FCM_TIMEOUT)
+        return JsonResponse({"tokens": len(tokens), **results, **call_response(result, call)})
+
+    @staticmethod
+    def load(patient_id) -> tuple:
+        """
+        :return: (환자, OPENED 또는 MERGED, PatientCall, 호출을 받을 토큰 목록), 환자가 없으면 (None, None, None, [])
+        """
+        patient = Patient.objects.only(
+            "id", "name", "image", "profile_id", "drawing_patient_x", "drawing_patient_y",
+        ).filter(pk=patient_id).first()
+        if patient is None:
+            return None, None, None, []
+        result, call = call_debouncer.register(patient_id, patient.drawing_patient_x, patient.drawing_patient_y)
+        if result == MERGED:
+            return patient, result, call, []
+        return patient, result, call, get_call_tokens(patient, patient.drawing_patient_x, patient.drawing_patient_y)
+
+
+class FromDoctorToPatientAsyncView(View):
+    """
+    의료진 -> 서버 (환자 호출, async view)
+    call/async/doctor/patient/<int:patient_id>/
+    """
+    async def get(self, request, patient_id):
+        # 환자 조회 (환자의 의료진도 함께)
+        patient = await run_db(Patient.objects.select_related("profile").filter(pk=patient_id).first)
+        if patient is None:
+            raise Http404
+        profile = patient.profile
+
+        drawing_patient_x = patient.drawing_patient_x
+        drawing_patient_y = patient.drawing_patient_y
+        log_event(logger, logging.INFO, "doctor call", patient_id=patient_id, profile_id=profile.pk,
+                  x=drawing_patient_x, y=drawing_patient_y)
+
+        # notification, data push 를 함께 발송 큐에 넣고 결과를 함께 기다림
+        futures = [
+            send_from_doctor_to_patient_by_fcm_notification(doctor=profile),
+            send_from_patient_to_doctor_by_fcm_data(
+                patient=patient,
+                doctor=profile,
+                drawing_patient_x=drawing_patient_x,
+                drawing_patient_y=drawing_patient_y,
+            ),
+        ]
+        # 환자 아두이노에 피드백 (워커 스레드에서 보내고 기다리지 않음)
+        if patient.ip_address:
+            terminal_client.submit(patient.ip_address, settings.TERMINAL_ACTUATION["DEFAULT_ACTION"])
+        results = await wait_for_results(futures, timeout=settings.CALL_FCM_TIMEOUT)
+        return JsonResponse({"tokens": 1, **results})
+
+
+class MetricsAPIView(APIView):
+    """
+    서버 지표 조회 (Prometheus text format)
+    metrics
+    """
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")